@@ -22,6 +22,112 @@ REDDIT_CLIENT_ID = os.environ.get('REDDIT_CLIENT_ID', '')
 REDDIT_CLIENT_SECRET = os.environ.get('REDDIT_CLIENT_SECRET', '')
 REDDIT_USER_AGENT = os.environ.get('REDDIT_USER_AGENT', '')
 
+#Outbound HTTP
+# Shared keep-alive pool used for TikTok, PRAW and IP geolocation requests
+OUTBOUND_HTTP_POOL_HOSTS = 10
+OUTBOUND_HTTP_POOL_SIZE = int(os.environ.get('OUTBOUND_HTTP_POOL_SIZE', '10'))
+OUTBOUND_HTTP_RETRIES = 2
+OUTBOUND_HTTP_TIMEOUT = 5
+OUTBOUND_HTTP_TIMEOUTS = {
+    'freeipapi.com': 3,
+    'oauth.reddit.com': 8,
+    'vm.tiktok.com': 5,
+    'vt.tiktok.com': 5,
+}
+# Send every outbound call to this stand-in server instead, for load tests
+# (see `manage.py upstream_stubs`)
+OUTBOUND_HTTP_STUB_URL = os.environ.get('OUTBOUND_HTTP_STUB_URL', '')
+
+#IP geolocation
+# Tried in order until one knows the address
+GEOIP_PROVIDERS = [
+    'myapp.geoip.CIDRDatabase',
+    'myapp.geoip.RemoteAPI',
+]
+# Offline CSV files with network, latitude and longitude columns (such as
+# GeoLite2-City-Blocks-IPv4.csv and -IPv6.csv), comma-separated
+GEOIP_DATABASES = [path for path in os.environ.get('GEOIP_DATABASES', '').split(',') if path]
+# Remote fallback: 60 requests/minute (~2.59M/month), shared by all workers
+GEOIP_REMOTE_URL = 'https://freeipapi.com/api/json/{ip}'
+GEOIP_REMOTE_RATE = 60
+GEOIP_REMOTE_CACHE_TTL = 24 * 3600
+# In-process cache of lookups, and how long found and unknown addresses are
+# trusted (seconds)
+GEOIP_CACHE_SIZE = 10000
+GEOIP_CACHE_TTL = 24 * 3600
+GEOIP_FAILURE_TTL = 5 * 60
+
+#Link resolution
+# Threads per worker process resolving short links in the background; with 0,
+# pending pins are only resolved by `manage.py resolve_pending_pins`
+PIN_RESOLVER_WORKERS = int(os.environ.get('PIN_RESOLVER_WORKERS', '4'))
+# Short link -> canonical URL cache: in-process entries, and how long resolved
+# and failed lookups are trusted (seconds)
+RESOLVED_LINK_CACHE_SIZE = 10000
+RESOLVED_LINK_TTL = 30 * 24 * 3600
+RESOLVED_LINK_FAILURE_TTL = 10 * 60
+
+#Pin clustering
+# Below this zoom level pins_in_bounds returns grid clusters instead of pins
+PIN_CLUSTER_MAX_ZOOM = int(os.environ.get('PIN_CLUSTER_MAX_ZOOM', '6'))
+# Grid cells per 256px map tile edge (4 => roughly one cluster per 64px)
+PIN_CLUSTER_CELLS_PER_TILE = int(os.environ.get('PIN_CLUSTER_CELLS_PER_TILE', '4'))
+# Max geohash cells used to cover a viewport before falling back to coarser cells
+GEOHASH_MAX_CELLS = int(os.environ.get('GEOHASH_MAX_CELLS', '32'))
+# Also filter bounds queries on geohash ranges. Off by default: on SQLite the
+# latitude/longitude index alone is as fast or faster at every zoom
+# (see `manage.py benchmark spatial`)
+PIN_BOUNDS_GEOHASH = os.getenv("PIN_BOUNDS_GEOHASH", "False") == "True"
+
+#Rate limiting
+# Requests per client IP by endpoint group ("<count>/<n><s|m|h|d>"), counted
+# in sliding windows shared by all workers; groups set to None are not limited
+RATE_LIMITS = {
+    'create_pin': '10/m',
+    # The read API (in_bounds, tiles, random, by id), e.g. '600/m'; off unless
+    # set, since each counted request costs a round trip to the counter store
+    'read': os.environ.get('RATE_LIMIT_READS') or None,
+}
+# Where the counters live: the cache when it is Redis (atomic increments
+# seen by every worker), else a database table. Run
+# `manage.py prune_rate_limits` daily to trim the table
+RATE_LIMIT_COUNTERS = (
+    'myapp.ratelimit.CacheCounters' if os.getenv('REDIS_URL') else 'myapp.ratelimit.DatabaseCounters'
+)
+
+#Load testing
+# Append every API request to this JSONL file, for `manage.py replay`
+REQUEST_LOG_PATH = os.environ.get('REQUEST_LOG_PATH', '')
+
+#Pin result limits
+# Most pins one pins_in_bounds response (or pin tile) returns; larger results
+# are paged (flat lists) or sampled (sample=1, zoomed views and tiles)
+PIN_BOUNDS_MAX_ROWS = int(os.environ.get('PIN_BOUNDS_MAX_ROWS', '2000'))
+# Sampling keeps the newest pins of each cell of a grid this many cells wide
+PIN_SAMPLE_GRID = 8
+
+#Pin streaming
+# Rows read from the database per batch when pins_in_bounds streams (stream=1)
+PIN_STREAM_CHUNK_SIZE = 2000
+
+#Pin delta sync
+# Changes before a client's cursor that are sent again, to cover transactions
+# that committed out of order
+PIN_SYNC_OVERLAP = 100
+# Days of change log kept by `manage.py prune_pin_changes`; older cursors reload
+PIN_SYNC_RETENTION_DAYS = 7
+
+#Pin tiles
+# Tiles are requested this many zoom levels above the map zoom, so one tile
+# spans 2**offset screen tiles in each direction (must match map.js)
+PIN_TILE_ZOOM_OFFSET = 2
+PIN_TILE_MAX_ZOOM = 18 - PIN_TILE_ZOOM_OFFSET
+# Browser/CDN freshness for tile responses; 0 revalidates with ETag every time
+PIN_TILE_MAX_AGE = int(os.environ.get('PIN_TILE_MAX_AGE', '0'))
+# Seconds to keep rendered tile responses server-side; 0 disables the cache,
+# as does a cache that is not shared (see PIN_TILE_CACHE_SHARED)
+PIN_TILE_CACHE_TIMEOUT = int(os.environ.get('PIN_TILE_CACHE_TIMEOUT', '3600'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -36,6 +142,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings include every other middleware
+    'myapp.metrics.MetricsMiddleware',
+    'myapp.loadtest.RequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +191,37 @@ elif len(sys.argv) > 0 and sys.argv[1] != 'collectstatic':
         "default": dj_database_url.parse(os.environ.get("DATABASE_URL")),
     }
 
+# Cache
+# Tile versions and rendered tiles live here. REDIS_URL shares them between
+# Gunicorn workers (needs the redis package); CACHE_DIR shares them through the
+# filesystem; otherwise each worker keeps its own local-memory cache.
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+elif os.getenv("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Tile versions (ETags) and rendered tiles are only used when every worker
+# shares the cache; otherwise tiles are rendered on each request and get an
+# ETag hashed from the body
+PIN_TILE_CACHE_SHARED = bool(os.getenv("REDIS_URL") or os.getenv("CACHE_DIR"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
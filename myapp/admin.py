@@ -4,8 +4,8 @@ from .models import Pin, YouTubePin, TikTokPin
 # Register the Pin model
 @admin.register(Pin)
 class PinAdmin(admin.ModelAdmin):
-    list_display = ('id', 'latitude', 'longitude', 'created_at', 'is_active')
-    list_filter = ('is_active', 'created_at')
+    list_display = ('id', 'platform', 'latitude', 'longitude', 'created_at', 'is_active')
+    list_filter = ('is_active', 'platform', 'created_at')
     search_fields = ('id',)
     readonly_fields = ('created_at',)
 
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'myapp'
+
+    def ready(self):
+        from .metrics import install_db_wrapper
+
+        # Every database connection reports its queries to the request metrics
+        connection_created.connect(install_db_wrapper)
@@ -0,0 +1,192 @@
+"""
+Async variants of the pin API for ASGI servers (uvicorn, daphne).
+
+They answer the same requests as the views in `views` with the same
+response bodies, but use Django's async ORM so one worker can hold many
+requests in flight. Short links are never resolved while the client waits
+(see `resolution`), so creating a pin does not make outbound requests here
+either; the few blocking calls left (rate limit counters, clustering,
+model saves in a transaction) run in a thread.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.utils.encoders import JSONEncoder
+
+from .geo import pins_in_bbox, sample_pins
+from .models import Pin, PinStatus
+from .ratelimit import rate_limited
+from .renderers import CompactJSONRenderer
+from .resolution import enqueue_pin
+from .serializers import COMPACT_PIN_FIELDS, PIN_VALUE_FIELDS, astream_pin_values, serialize_pin_values
+from .sync import latest_change_id
+from .views import (
+    PLATFORM_NAMES,
+    check_pin_link,
+    compact_pins_data,
+    create_resolved_pin,
+    created_pin_data,
+    next_page_link,
+    parse_bounds,
+    parse_page,
+    parse_zoom,
+    pending_pin_data,
+    pin_changes_data,
+    requested_format,
+    requested_location,
+    zoomed_pins_data,
+)
+
+
+def json_response(data, status=200, compact=False):
+    # DRF's encoder, so dates and decimals render exactly as in the sync API
+    response = JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+    if compact:
+        response["Content-Type"] = CompactJSONRenderer.media_type
+    return response
+
+def request_data(request):
+    """The submitted fields, from a JSON or form-encoded body"""
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+# ----------------------------
+# API Endpoints
+# ----------------------------
+
+@require_GET
+@rate_limited("read")
+async def pins_in_bounds(request):
+    bounds = parse_bounds(request.GET)
+    if bounds is None:
+        return json_response({"error": "Invalid bounds"}, status=400)
+
+    pins = pins_in_bbox(Pin.objects.filter(is_active=True), *bounds)
+
+    compact = requested_format(request) == CompactJSONRenderer.format
+
+    # With a cursor, only what changed in the box since then
+    since = request.GET.get("since")
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return json_response({"error": "Invalid cursor"}, status=400)
+        data = await sync_to_async(pin_changes_data)(bounds, since, compact)
+        return json_response(data, compact=compact)
+
+    # Without a zoom level, keep the original flat list of pins, paged as
+    # in the sync view
+    zoom = request.GET.get("zoom")
+    if zoom is None:
+        page = parse_page(request.GET)
+        if page is None:
+            return json_response({"error": "Invalid page"}, status=400)
+        after, limit = page
+        fields = COMPACT_PIN_FIELDS if compact else PIN_VALUE_FIELDS
+        cursor = await sync_to_async(latest_change_id)() if compact else None
+        stream = request.GET.get("stream") and not compact
+
+        if request.GET.get("sample"):
+            rows = [row async for row in sample_pins(pins, *bounds, limit).values(*fields)]
+            next_after = None
+        elif stream:
+            rows = pins.filter(id__gt=after).order_by("id").values(*fields)
+            edge = [pin_id async for pin_id in rows.values_list("id", flat=True)[limit - 1:limit + 1]]
+            next_after = edge[0] if len(edge) == 2 else None
+            rows = rows[:limit]
+        else:
+            rows = pins.filter(id__gt=after).order_by("id").values(*fields)
+            rows = [row async for row in rows[:limit + 1]]
+            next_after = rows[limit - 1]["id"] if len(rows) > limit else None
+            rows = rows[:limit]
+
+        if compact:
+            response = json_response({"cursor": cursor, **compact_pins_data(rows)}, compact=True)
+        elif stream:
+            response = StreamingHttpResponse(
+                astream_pin_values(rows, settings.PIN_STREAM_CHUNK_SIZE),
+                content_type="application/json",
+            )
+        else:
+            response = json_response([serialize_pin_values(row) for row in rows])
+
+        if next_after is not None:
+            response["Link"] = next_page_link(request, next_after)
+        return response
+
+    zoom = parse_zoom(zoom)
+    if zoom is None:
+        return json_response({"error": "Invalid zoom"}, status=400)
+
+    data = await sync_to_async(zoomed_pins_data)(pins, zoom, bounds, compact)
+    return json_response(data, compact=compact)
+
+@require_POST
+# Shares its per-IP budget with the sync endpoint
+@rate_limited("create_pin", "Too many posts. Please try again later.")
+async def create_pin(request):
+    data = request_data(request)
+    if data is None:
+        return json_response({"error": "Invalid request body"}, status=400)
+
+    link = data.get("link")
+    check_only = data.get("check_only", False)
+
+    link_info, error = check_pin_link(link)
+    if error:
+        return json_response({"error": error}, status=400)
+    link_platform, url, content_id = link_info
+
+    if check_only:
+        platform_display = PLATFORM_NAMES.get(link_platform, "Unknown")
+        return json_response({"message": "Valid link", "platform": platform_display})
+
+    location = requested_location(data)
+    if location is None:
+        return json_response({"error": "Location coordinates are required"}, status=400)
+    lat, lon = location
+
+    # Short links are resolved in the background; the rest were classified
+    # with their canonical URL and content ID, with no outbound request
+    if url is None:
+        pin = await Pin.objects.acreate(
+            latitude=lat,
+            longitude=lon,
+            platform=link_platform,
+            url=link,
+            status=PinStatus.PENDING,
+            is_active=False
+        )
+        await sync_to_async(enqueue_pin)(pin.id)
+        return json_response(pending_pin_data(pin), status=202)
+
+    pin = await sync_to_async(create_resolved_pin)(lat, lon, link_platform, url, content_id)
+    return json_response(created_pin_data(pin))
+
+@require_GET
+@rate_limited("read")
+async def random_pin(request):
+    # Get a random active pin
+    row = await sync_to_async(Pin.objects.filter(is_active=True).values(*PIN_VALUE_FIELDS).random)()
+    if not row:
+        return json_response({"error": "No pins available"}, status=404)
+
+    return json_response(serialize_pin_values(row))
+
+@require_GET
+@rate_limited("read")
+async def get_pin_by_id(request, pin_id):
+    row = await Pin.objects.filter(id=pin_id, is_active=True).values(*PIN_VALUE_FIELDS).afirst()
+    if row is None:
+        return json_response({"error": "Pin not found"}, status=404)
+    return json_response(serialize_pin_values(row))
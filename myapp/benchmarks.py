@@ -0,0 +1,730 @@
+"""
+Benchmark scenarios for the pin API, run via `python manage.py benchmark`.
+Every scenario runs against a throwaway test database seeded with
+synthetic pins, so it is safe to point at any configured backend.
+"""
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+
+from .geo import coordinates_in_bbox, geohash_encode, geohash_q
+from . import views
+from .models import Pin
+from .serializers import PIN_VALUE_FIELDS, PinSerializer, serialize_pin_values
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+
+# How synthetic pins are spread over the map: evenly, or around a few
+# hundred "cities" as real pins are
+DISTRIBUTIONS = ("uniform", "clustered")
+
+def _cluster_point(rng, centres):
+    lat, lon = rng.choice(centres)
+    lat = min(85.0, max(-85.0, rng.gauss(lat, 0.5)))
+    lon = (rng.gauss(lon, 0.5) + 180) % 360 - 180
+    return lat, lon
+
+def seed_pins(count, seed=0, batch_size=5000, distribution="uniform"):
+    """Insert `count` active pins spread over the map as `distribution` says"""
+    rng = random.Random(seed)
+    # The same cities whatever the seed, so top-ups land in them too
+    centres_rng = random.Random("cities")
+    centres = [(centres_rng.uniform(-50, 65), centres_rng.uniform(-180, 180)) for _ in range(300)]
+    batch = []
+    for _ in range(count):
+        if distribution == "clustered":
+            lat, lon = _cluster_point(rng, centres)
+        else:
+            lat = rng.uniform(-85, 85)
+            lon = rng.uniform(-180, 180)
+        # bulk_create skips Pin.save, so fill the spatial key here
+        batch.append(Pin(latitude=lat, longitude=lon, geohash=geohash_encode(lat, lon)))
+        if len(batch) >= batch_size:
+            Pin.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Pin.objects.bulk_create(batch)
+
+    # Give the query planner fresh statistics for the new rows
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+def grow_to(size, distribution="uniform"):
+    """Top the pin table up to `size` rows, so sizes can be measured in turn"""
+    current = Pin.objects.count()
+    if size > current:
+        seed_pins(size - current, seed=current, distribution=distribution)
+
+def give_platform_links(pins):
+    """Turn plain pins into TikTok pins with their platform rows, as real pins are"""
+    for pin in pins:
+        pin.platform, pin.url, pin.content_id = "tiktok", f"https://www.tiktok.com/@u/video/{pin.id}", str(pin.id)
+        pin.save(update_fields=["platform", "url", "content_id"])
+        pin.create_platform_pin()
+
+def random_viewport(rng, zoom):
+    """A random bounding box roughly the size of a screen at `zoom`"""
+    width = min(360.0, 360.0 / (2 ** zoom) * 4)
+    height = min(170.0, width / 2)
+    sw_lat = rng.uniform(-85, 85 - height)
+    sw_lng = rng.uniform(-180, 180 - width)
+    return sw_lat, sw_lng, sw_lat + height, sw_lng + width
+
+def time_calls(func, repeat):
+    """Run func `repeat` times and return the durations in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def summarize(durations):
+    ordered = sorted(durations)
+    percentile = lambda q: round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+# ----------------------------
+# Scenarios
+# ----------------------------
+
+def bench_spatial(out, sizes, repeat, zooms=(4, 6, 8, 10)):
+    """
+    Compare bounds queries on the latitude/longitude B-tree alone, on the
+    geohash ranges alone, and with both filters and both indexes for the
+    planner to choose from (what PIN_BOUNDS_GEOHASH serves). Each index is
+    dropped for the pass that must not use it.
+    """
+    for size in sizes:
+        grow_to(size)
+        _bench_spatial_size(out, size, repeat, zooms)
+
+def _bench_spatial_size(out, pins, repeat, zooms):
+    rng = random.Random(1)
+    active = Pin.objects.filter(is_active=True)
+    boxes = {zoom: [random_viewport(rng, zoom) for _ in range(repeat)] for zoom in zooms}
+
+    geohash_index = next(index for index in Pin._meta.indexes if index.fields == ['geohash'])
+    latlng_index = next(index for index in Pin._meta.indexes if index.fields == ['latitude', 'longitude'])
+
+    def legacy(box):
+        sw_lat, sw_lng, ne_lat, ne_lng = box
+        return active.filter(
+            latitude__gte=sw_lat,
+            latitude__lte=ne_lat,
+            longitude__gte=sw_lng,
+            longitude__lte=ne_lng,
+        )
+
+    def geohash(box):
+        return coordinates_in_bbox(active.filter(geohash_q(*box)), *box)
+
+    def run(name, build):
+        for zoom in zooms:
+            queue = iter(boxes[zoom])
+            stats = summarize(time_calls(
+                lambda: list(build(next(queue)).values_list('id', flat=True)),
+                repeat,
+            ))
+            out.write(f"zoom={zoom} {name}: {stats}")
+            out.write(build(boxes[zoom][0]).values_list('id', flat=True).explain())
+
+    out.write(f"backend={connection.vendor} pins={pins} repeat={repeat}")
+
+    with connection.schema_editor() as editor:
+        editor.remove_index(Pin, geohash_index)
+    run("latlng", legacy)
+
+    with connection.schema_editor() as editor:
+        editor.remove_index(Pin, latlng_index)
+        editor.add_index(Pin, geohash_index)
+    run("geohash", geohash)
+
+    with connection.schema_editor() as editor:
+        editor.add_index(Pin, latlng_index)
+    run("both", geohash)
+
+def bench_random(out, sizes, repeat):
+    """Compare ORDER BY RANDOM() with primary key probing for random_pin"""
+    active = Pin.objects.filter(is_active=True)
+    for size in sizes:
+        grow_to(size)
+        order_by = summarize(time_calls(lambda: active.order_by('?').first(), repeat))
+        probing = summarize(time_calls(lambda: active.random(), repeat))
+        out.write(f"pins={size} order_by_random: {order_by}")
+        out.write(f"pins={size} id_probing: {probing}")
+
+# Run in a fresh interpreter, since an import is only slow the first time
+STARTUP_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+import myapp.views
+imported = time.perf_counter()
+from django.conf import settings
+from django.test import Client
+Client(HTTP_HOST=settings.ALLOWED_HOSTS[0]).get("/")
+served = time.perf_counter()
+print(json.dumps({
+    "setup_ms": (setup - start) * 1000,
+    "import_views_ms": (imported - setup) * 1000,
+    "first_request_ms": (served - start) * 1000,
+    "praw_loaded": "praw" in sys.modules,
+}))
+"""
+
+def bench_startup(out, sizes, repeat):
+    """
+    Worker startup: django.setup(), importing myapp.views and serving the
+    first request, each measured in a fresh interpreter. Table sizes do not
+    apply here.
+    """
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE],
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    for key in ("setup_ms", "import_views_ms", "first_request_ms"):
+        out.write(f"{key}: {summarize([run[key] for run in runs])}")
+    out.write(f"praw imported before first Reddit link: {any(run['praw_loaded'] for run in runs)}")
+
+def load_requests(count, rng, pin_ids, prefix="", writes=True):
+    """A mixed workload of pin API requests: (method, url name, args, params)"""
+    plan = []
+    for i in range(count):
+        kind = i % 4 if writes else i % 3
+        if kind == 0:
+            sw_lat, sw_lng, ne_lat, ne_lng = random_viewport(rng, 10)
+            params = {"sw_lat": sw_lat, "sw_lng": sw_lng, "ne_lat": ne_lat, "ne_lng": ne_lng}
+            plan.append(("GET", f"{prefix}pins-in-bounds", [], params))
+        elif kind == 1:
+            plan.append(("GET", f"{prefix}get-pin-by-id", [rng.choice(pin_ids)], {}))
+        elif kind == 2:
+            plan.append(("GET", f"{prefix}random-pin", [], {}))
+        else:
+            params = {
+                "link": f"https://www.youtube.com/shorts/load{i}",
+                "latitude": rng.uniform(-60, 60),
+                "longitude": rng.uniform(-180, 180),
+            }
+            plan.append(("POST", f"{prefix}pin-create", [], params))
+    return plan
+
+def run_sync_load(plan, workers):
+    """Serve the plan with `workers` blocking workers, like Gunicorn sync workers"""
+    queue = list(enumerate(plan))
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def worker():
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0], raise_request_exception=False)
+        while True:
+            with lock:
+                if not queue:
+                    break
+                i, (method, name, args, params) = queue.pop()
+            ip = f"10.0.{i // 250}.{i % 250}"  # One client per request, below the rate limit
+            start = time.perf_counter()
+            if method == "GET":
+                response = client.get(reverse(name, args=args), params, HTTP_X_FORWARDED_FOR=ip)
+            else:
+                response = client.post(reverse(name, args=args), params, HTTP_X_FORWARDED_FOR=ip)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+async def asgi_request(app, method, path, params, ip):
+    """Send one request straight to an ASGI app, as an ASGI server would"""
+    encoded = urlencode(params).encode()
+    headers = [(b"host", settings.ALLOWED_HOSTS[0].encode()), (b"x-forwarded-for", ip.encode())]
+    if method == "POST":
+        headers.append((b"content-type", b"application/x-www-form-urlencoded"))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": encoded if method == "GET" else b"",
+        "headers": headers,
+        "client": (ip, 50000),
+        "server": ("localhost", 80),
+    }
+    body = [{"type": "http.request", "body": b"" if method == "GET" else encoded, "more_body": False}]
+    status = []
+
+    async def receive():
+        if body:
+            return body.pop()
+        # The client never disconnects; Django cancels this wait when done
+        await asyncio.Future()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await app(scope, receive, send)
+    return status[0]
+
+def run_async_load(plan, concurrency):
+    """Serve the plan from one event loop with up to `concurrency` requests in flight"""
+    app = get_asgi_application()
+    latencies, errors = [], []
+
+    async def one(i, method, name, args, params):
+        async with limit:
+            start = time.perf_counter()
+            status = await asgi_request(app, method, reverse(name, args=args), params, f"10.1.{i // 250}.{i % 250}")
+            latencies.append((time.perf_counter() - start) * 1000)
+            if status >= 400:
+                errors.append(status)
+
+    async def main():
+        await asyncio.gather(*(one(i, *request) for i, request in enumerate(plan)))
+
+    limit = asyncio.Semaphore(concurrency)
+    asyncio.run(main())
+    return latencies, errors
+
+def bench_concurrency(out, sizes, repeat, workers=4, concurrency=50, latency=0.05):
+    """
+    Load test of the sync views served by `workers` blocking workers against
+    the async views on a single event loop. Every database query is delayed
+    by `latency` seconds to stand in for a slow upstream (a remote database;
+    link resolution no longer happens inside requests). `repeat` is the
+    number of requests per run.
+    """
+    original = CursorWrapper._execute_with_wrappers
+
+    def slow_execute(self, *args, **kwargs):
+        time.sleep(latency)
+        return original(self, *args, **kwargs)
+
+    # SQLite's shared in-memory test database rejects concurrent writers
+    writes = connection.vendor != "sqlite"
+    if not writes:
+        out.write("sqlite: creates left out of the mix; use PostgreSQL to include them")
+
+    rng = random.Random(2)
+    for size in sizes:
+        grow_to(size)
+        pin_ids = list(Pin.objects.values_list("id", flat=True)[:1000])
+        out.write(f"pins={size} requests={repeat} upstream_latency_ms={latency * 1000:g}")
+
+        # Pins created by the run don't need resolving, and no background
+        # work should outlive the run
+        with override_settings(PIN_RESOLVER_WORKERS=0), \
+                mock.patch.object(CursorWrapper, "_execute_with_wrappers", slow_execute):
+            for mode, run, arg, prefix in (
+                ("sync", run_sync_load, workers, ""),
+                ("async", run_async_load, concurrency, "async-"),
+            ):
+                plan = load_requests(repeat, rng, pin_ids, prefix, writes)
+                start = time.perf_counter()
+                latencies, errors = run(plan, arg)
+                wall = time.perf_counter() - start
+                out.write(
+                    f"{mode} (x{arg}): {repeat / wall:.1f} req/s, "
+                    f"{summarize(latencies)}, errors={len(errors)}"
+                )
+
+def bench_memory(out, sizes, repeat):
+    """
+    Peak Python memory (tracemalloc) while rendering a whole-world
+    pins_in_bounds response, buffered vs streamed, as one page holding
+    every pin. Only one run per size: tracemalloc slows everything down and
+    the peak does not vary.
+    """
+    factory = RequestFactory()
+    world = {"sw_lat": -90, "sw_lng": -180, "ne_lat": 90, "ne_lng": 180}
+
+    def buffered():
+        response = views.pins_in_bounds(factory.get("/", world))
+        return len(response.render().content)
+
+    def streamed():
+        response = views.pins_in_bounds(factory.get("/", {**world, "stream": 1}))
+        return sum(len(chunk) for chunk in response.streaming_content)
+
+    for size in sizes:
+        grow_to(size)
+        for mode, render in (("buffered", buffered), ("streamed", streamed)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            with override_settings(PIN_BOUNDS_MAX_ROWS=size):
+                length = render()
+            elapsed = (time.perf_counter() - start) * 1000
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            out.write(
+                f"pins={size} {mode}: peak={peak / 1024 / 1024:.1f} MiB "
+                f"body={length / 1024 / 1024:.1f} MiB time={elapsed:.0f} ms"
+            )
+
+def bench_payload(out, sizes, repeat):
+    """
+    Size and render time of a whole-world pins_in_bounds response in the
+    full JSON format and the compact columnar one, raw and gzipped, as one
+    page holding every pin.
+    """
+    factory = RequestFactory()
+    world = {"sw_lat": -90, "sw_lng": -180, "ne_lat": 90, "ne_lng": 180}
+
+    def render(params):
+        with override_settings(PIN_BOUNDS_MAX_ROWS=Pin.objects.count()):
+            return views.pins_in_bounds(factory.get("/", {**world, **params})).render().content
+
+    for size in sizes:
+        grow_to(size)
+        # Real pins carry a platform link, which dominates the full format
+        Pin.objects.filter(platform="").update(
+            platform="tiktok",
+            url="https://www.tiktok.com/@someuser/video/7400000000000000000",
+            content_id="7400000000000000000",
+        )
+        results = {}
+        for name, params in (("json", {}), ("compact", {"format": "compact"})):
+            body = render(params)
+            stats = summarize(time_calls(lambda: render(params), repeat))
+            results[name] = (len(body), len(gzip.compress(body)))
+            out.write(f"pins={size} {name}: bytes={results[name][0]} gzip={results[name][1]} {stats}")
+        out.write(
+            f"pins={size} compact is {results['json'][0] / results['compact'][0]:.1f}x smaller "
+            f"({results['json'][1] / results['compact'][1]:.1f}x gzipped)"
+        )
+
+def bench_serializer(out, sizes, repeat, rows=2000):
+    """
+    Rows per second through PinSerializer (joined platform rows, nested
+    serializers) and through the values() fast path, including the query.
+    """
+    for size in sizes:
+        grow_to(size)
+        give_platform_links(Pin.objects.filter(platform="")[:rows])
+        pins = Pin.objects.exclude(platform="").order_by("id")[:rows]
+
+        def serializer():
+            return PinSerializer(pins.with_platform(), many=True).data
+
+        def fast_path():
+            return [serialize_pin_values(row) for row in pins.values(*PIN_VALUE_FIELDS)]
+
+        for name, func in (("PinSerializer", serializer), ("values", fast_path)):
+            stats = summarize(time_calls(func, repeat))
+            out.write(f"pins={size} {name}: {rows / stats['p50_ms'] * 1000:,.0f} rows/s {stats}")
+
+def link_corpus(count, rng):
+    """Submitted links in the shapes users paste them, for every platform"""
+    shapes = (
+        "https://www.tiktok.com/@user{i}/video/74{i:017d}?is_from_webapp=1",
+        "https://vm.tiktok.com/ZM{i}/",
+        "https://www.youtube.com/shorts/v{i}?feature=share",
+        "https://m.youtube.com/shorts/v{i}",
+        "https://www.instagram.com/reel/C{i}/?igsh=abc{i}",
+        "https://instagram.com/p/C{i}/",
+        "https://www.reddit.com/r/pics/comments/p{i}/some_title/",
+        "https://www.reddit.com/r/pics/s/s{i}",
+        "https://example.com/watch?v={i}",
+    )
+    return [rng.choice(shapes).format(i=i) for i in range(count)]
+
+def bench_links(out, sizes, repeat, count=10000):
+    """
+    Classifying submitted links: the platform, canonical URL and content ID
+    alone (links.classify_link), and with URL validation as create_pin does
+    it (views.check_pin_link). Table sizes do not apply here.
+    """
+    from .links import classify_link
+
+    corpus = link_corpus(count, random.Random(3))
+    for name, func in (("classify_link", classify_link), ("check_pin_link", views.check_pin_link)):
+        stats = summarize(time_calls(lambda: [func(link) for link in corpus], repeat))
+        out.write(f"{name}: {stats['p50_ms'] * 1000 / count:.2f} us/link {stats}")
+
+def bench_geoip(out, sizes, repeat, lookups=100000, visitors=5000):
+    """
+    IP geolocation from the offline CIDR database: load time, then lookups
+    per second through geoip.locate with a cold and a warm in-process cache,
+    for `lookups` requests from `visitors` distinct addresses. Sizes are the
+    number of /24 networks in a synthetic database.
+    """
+    import ipaddress
+    import os
+    import tempfile
+
+    from . import geoip
+
+    rng = random.Random(4)
+    for size in sizes:
+        # Every other /24 from 1.0.0.0 up, so half the lookups miss
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("network,latitude,longitude\n")
+            for i in range(size):
+                f.write(f"{ipaddress.IPv4Address((1 << 24) + i * 512)}/24,{rng.uniform(-60, 70):.4f},{rng.uniform(-180, 180):.4f}\n")
+        try:
+            database = geoip.CIDRDatabase([f.name])
+            start = time.perf_counter()
+            database.tables()
+            out.write(f"networks={size} load: {(time.perf_counter() - start) * 1000:.0f} ms")
+        finally:
+            os.remove(f.name)
+
+        pool = [str(ipaddress.IPv4Address((1 << 24) + rng.randrange(size * 512))) for _ in range(visitors)]
+        ips = [rng.choice(pool) for _ in range(lookups)]
+        with mock.patch.object(geoip, "_providers", [database]):
+            for name, clear in (("cold", True), ("warm", False)):
+                def run():
+                    if clear:
+                        geoip._locations.clear()
+                    for ip in ips:
+                        geoip.locate(ip)
+
+                geoip._locations.clear()
+                run()  # Fills the cache for the warm runs
+                stats = summarize(time_calls(run, repeat))
+                out.write(f"networks={size} {name}: {lookups / stats['p50_ms'] * 1000:,.0f} lookups/s {stats}")
+
+def bench_metrics(out, sizes, repeat, calls=20000, queries=2000):
+    """
+    Cost of the request metrics: MetricsMiddleware around a view that does
+    nothing, the database execute wrapper per query, and both in a full
+    get_pin_by_id request through the test client. Table sizes do not apply
+    here.
+    """
+    from django.http import HttpResponse
+    from django.urls import resolve
+
+    from . import metrics
+
+    request = RequestFactory().get("/")
+    request.resolver_match = resolve(reverse("random-pin"))
+    response = HttpResponse()
+    bare = lambda request: response
+    middleware = metrics.MetricsMiddleware(bare)
+
+    results = {}
+    for name, handler in (("bare", bare), ("middleware", middleware)):
+        stats = summarize(time_calls(lambda: [handler(request) for _ in range(calls)], repeat))
+        results[name] = stats["p50_ms"] * 1000 / calls
+        out.write(f"{name}: {results[name]:.2f} us/request {stats}")
+    out.write(f"middleware overhead: {results['middleware'] - results['bare']:.2f} us/request")
+
+    # Queries only go through the wrapper inside a request
+    metrics.install_db_wrapper(None, connection)
+    def run_queries():
+        with connection.cursor() as cursor:
+            for _ in range(queries):
+                cursor.execute("SELECT 1")
+
+    for name, stats in (("outside a request", None), ("in a request", metrics.RequestStats())):
+        token = metrics._current.set(stats)
+        try:
+            timed = summarize(time_calls(run_queries, repeat))
+        finally:
+            metrics._current.reset(token)
+        results[name] = timed["p50_ms"] * 1000 / queries
+        out.write(f"{name} query: {results[name]:.2f} us/query {timed}")
+    out.write(f"execute wrapper overhead: {results['in a request'] - results['outside a request']:.2f} us/query")
+
+    grow_to(max(sizes))
+    pin_id = Pin.objects.values_list("id", flat=True).first()
+    url = reverse("get-pin-by-id", args=[pin_id])
+    without = [path for path in settings.MIDDLEWARE if path != "myapp.metrics.MetricsMiddleware"]
+    for name, middleware_setting in (("without metrics", without), ("with metrics", settings.MIDDLEWARE)):
+        with override_settings(MIDDLEWARE=middleware_setting):
+            client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            client.get(url)
+            stats = summarize(time_calls(lambda: client.get(url), repeat * 50))
+        out.write(f"get_pin_by_id {name}: {stats}")
+
+def measure_requests(make_request, repeat):
+    """
+    Latency percentiles, mean queries, error responses and peak Python
+    memory of `repeat` calls of make_request(i). Memory is traced in one
+    extra call of its own, since tracemalloc slows everything it watches.
+    """
+    queries, errors = 0, 0
+
+    def count(execute, *args):
+        nonlocal queries
+        queries += 1
+        return execute(*args)
+
+    def call(i):
+        nonlocal errors
+        if getattr(make_request(i), "status_code", 200) >= 400:
+            errors += 1
+
+    calls = iter(range(repeat + 1))
+    make_request(next(calls))  # Warm up
+    with connection.execute_wrapper(count):
+        stats = summarize(time_calls(lambda: call(next(calls)), repeat))
+    tracemalloc.start()
+    make_request(repeat + 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {**stats, "queries": round(queries / repeat, 2), "errors": errors, "peak_kib": round(peak / 1024, 1)}
+
+def bench_suite(out, sizes, repeat, distribution="uniform", results=None, zooms=(4, 8, 12), rows=2000):
+    """
+    The pin API hot paths through the full request stack: pins_in_bounds
+    with no zoom and at `zooms`, random_pin, get_pin_by_id, create_pin with
+    a direct and a short link, and serializer throughput. Each case reports
+    latency percentiles, queries per request and peak memory, and is added
+    to `results` for the JSON report. Outbound HTTP is stubbed and counted;
+    no case should make any.
+    """
+    from . import outbound
+
+    upstream = mock.Mock(status_code=200, headers={}, url="https://www.tiktok.com/@u/video/1")
+    upstream.json.return_value = {}
+    results = [] if results is None else results
+
+    def report(size, case, stats, **extra):
+        results.append({"pins": size, "case": case, **stats, **extra})
+        out.write(f"pins={size} {case}: {stats}{''.join(f' {k}={v}' for k, v in extra.items())}")
+
+    rng = random.Random(5)
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    out.write(f"backend={connection.vendor} distribution={distribution} repeat={repeat}")
+    for size in sizes:
+        grow_to(size, distribution)
+        give_platform_links(Pin.objects.filter(platform="")[:rows])
+        pin_ids = list(Pin.objects.filter(is_active=True).values_list("id", flat=True)[:10000])
+        # Viewports where the pins are, so clustered maps are not mostly empty
+        centres = list(Pin.objects.filter(id__in=rng.sample(pin_ids, min(len(pin_ids), 500))).values_list("latitude", "longitude"))
+
+        def viewport(zoom):
+            lat, lng = rng.choice(centres)
+            width = min(360.0, 360.0 / (2 ** zoom) * 4)
+            height = min(170.0, width / 2)
+            return {
+                "sw_lat": max(-90, lat - height / 2), "sw_lng": lng - width / 2,
+                "ne_lat": min(90, lat + height / 2), "ne_lng": lng + width / 2,
+            }
+
+        cases = [("pins_in_bounds", lambda i: client.get(reverse("pins-in-bounds"), viewport(2)))]
+        for zoom in zooms:
+            cases.append((f"pins_in_bounds zoom={zoom}", lambda i, zoom=zoom: client.get(
+                reverse("pins-in-bounds"), {**viewport(zoom), "zoom": zoom},
+            )))
+        cases += [
+            ("random_pin", lambda i: client.get(reverse("random-pin"))),
+            ("get_pin_by_id", lambda i: client.get(reverse("get-pin-by-id", args=[rng.choice(pin_ids)]))),
+        ]
+        for name, link in (
+            ("create_pin direct", "https://www.youtube.com/shorts/suite{size}x{i}"),
+            ("create_pin short", "https://vm.tiktok.com/suite{size}x{i}/"),
+        ):
+            cases.append((name, lambda i, link=link: client.post(
+                reverse("pin-create"),
+                {"link": link.format(size=size, i=i), "latitude": rng.uniform(-60, 60), "longitude": rng.uniform(-180, 180)},
+                # One client per request, below the rate limit
+                HTTP_X_FORWARDED_FOR=f"10.2.{i // 250}.{i % 250}",
+            )))
+
+        # Pending pins stay pending: nothing may run after the measurement
+        with override_settings(PIN_RESOLVER_WORKERS=0), \
+                mock.patch.object(outbound, "get", return_value=upstream) as stub:
+            for case, make_request in cases:
+                stub.reset_mock()
+                report(size, case, measure_requests(make_request, repeat), upstream_calls=stub.call_count)
+
+        pins = Pin.objects.exclude(platform="").order_by("id")[:rows]
+        count = pins.count()
+        for case, func in (
+            ("PinSerializer", lambda: PinSerializer(pins.with_platform(), many=True).data),
+            ("values fast path", lambda: [serialize_pin_values(row) for row in pins.values(*PIN_VALUE_FIELDS)]),
+        ):
+            stats = measure_requests(lambda i: func(), max(1, repeat // 10))
+            report(size, case, stats, rows_per_s=round(count / stats["p50_ms"] * 1000))
+    return results
+
+def bench_ratelimit(out, sizes, repeat, calls=2000):
+    """
+    Cost of one rate limit check with each counter store, for clients under
+    their limit (every call counted in the store) and for clients already
+    over it (answered in-process). Then a rejected create_pin request next
+    to an invalid one, which is the cheapest request that reaches the view.
+    Table sizes do not apply here.
+    """
+    from . import ratelimit
+
+    rate = f"{calls * repeat * 10}/m"
+    for name, counters in (("database", ratelimit.DatabaseCounters()), ("cache", ratelimit.CacheCounters())):
+        with mock.patch.object(ratelimit, "_counters", counters):
+            stats = summarize(time_calls(lambda: [ratelimit.check("bench", name, rate) for _ in range(calls)], repeat))
+            out.write(f"{name} store, under limit: {stats['p50_ms'] * 1000 / calls:.1f} us/check {stats}")
+
+    ratelimit._blocked.clear()
+    ratelimit.check("bench", "flood", "1/m")
+    ratelimit.check("bench", "flood", "1/m")
+    stats = summarize(time_calls(lambda: [ratelimit.check("bench", "flood", "1/m") for _ in range(calls)], repeat))
+    out.write(f"over limit: {stats['p50_ms'] * 1000 / calls:.2f} us/check {stats}")
+
+    client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+    url = reverse("pin-create")
+    for name, ip in (("invalid link", None), ("rate limited", "10.3.0.1")):
+        headers = {"HTTP_X_FORWARDED_FOR": ip} if ip else {}
+        limits = {"create_pin": rate} if ip is None else {"create_pin": "1/m"}
+        with override_settings(RATE_LIMITS=limits):
+            client.post(url, {"link": "nonsense"}, **headers)
+            stats = summarize(time_calls(lambda: client.post(url, {"link": "nonsense"}, **headers), repeat * 10))
+        out.write(f"create_pin {name}: {stats}")
+
+
+SCENARIOS = {
+    "spatial": bench_spatial,
+    "random": bench_random,
+    "concurrency": bench_concurrency,
+    "memory": bench_memory,
+    "payload": bench_payload,
+    "serializer": bench_serializer,
+    "startup": bench_startup,
+    "links": bench_links,
+    "geoip": bench_geoip,
+    "metrics": bench_metrics,
+    "suite": bench_suite,
+    "ratelimit": bench_ratelimit,
+}
@@ -0,0 +1,250 @@
+import math
+
+from django.conf import settings
+from django.db.models import Avg, Case, Count, F, Max, Q, When, Window
+from django.db.models.functions import Floor, RowNumber
+
+
+# ----------------------------
+# Clustering
+# ----------------------------
+
+def cluster_cell_size(zoom):
+    """Size in degrees of one clustering grid cell at the given map zoom"""
+    cells_per_world = (2 ** zoom) * settings.PIN_CLUSTER_CELLS_PER_TILE
+    return 360.0 / cells_per_world
+
+def should_cluster(zoom):
+    """Whether pins should be aggregated server-side at this zoom level"""
+    return zoom < settings.PIN_CLUSTER_MAX_ZOOM
+
+def cluster_pins(pins, zoom):
+    """
+    Aggregate a Pin queryset into grid cells sized for the given zoom.
+    The grouping runs in the database, so the result size scales with the
+    number of cells on screen rather than with the number of pins. Cells
+    holding a single pin carry its id as pin_id (None otherwise), so callers
+    can show that pin itself instead of a cluster of one.
+    """
+    cell = cluster_cell_size(zoom)
+
+    rows = (
+        pins.order_by()
+        .annotate(
+            cell_x=Floor(F('longitude') / cell),
+            cell_y=Floor(F('latitude') / cell),
+        )
+        .values('cell_x', 'cell_y')
+        .annotate(count=Count('id'), avg_lat=Avg('latitude'), avg_lng=Avg('longitude'), max_id=Max('id'))
+    )
+
+    return [
+        {
+            "latitude": row["avg_lat"],
+            "longitude": row["avg_lng"],
+            "count": row["count"],
+            "pin_id": row["max_id"] if row["count"] == 1 else None,
+        }
+        for row in rows
+    ]
+
+
+# ----------------------------
+# Sampling
+# ----------------------------
+
+def sample_pins(pins, sw_lat, sw_lng, ne_lat, ne_lng, limit, grid=None):
+    """
+    At most `limit` pins spread over the box: the box is split into a
+    grid x grid raster and each cell keeps only its newest pins, so a dense
+    city cannot crowd out the rest of the view. Sparse cells keep all of
+    theirs, and the per-cell cutoff runs in the database (ROW_NUMBER()).
+    When the grid has more cells than `limit`, every cell's newest pin comes
+    before any cell's second.
+    """
+    grid = grid or settings.PIN_SAMPLE_GRID
+    per_cell = max(1, limit // (grid * grid))
+    # Degenerate boxes still need a non-zero cell size
+    cell_w = lng_span(sw_lng, ne_lng) / grid or 1.0
+    cell_h = (ne_lat - sw_lat) / grid or 1.0
+
+    # Past the antimeridian, longitudes continue from +180 so the cells of
+    # both sides line up
+    lng_offset = F('longitude') - sw_lng
+    if sw_lng > ne_lng:
+        lng_offset = Case(
+            When(longitude__lt=sw_lng, then=F('longitude') + (360 - sw_lng)),
+            default=lng_offset,
+        )
+
+    return pins.annotate(
+        cell_rank=Window(
+            RowNumber(),
+            partition_by=[
+                Floor(lng_offset / cell_w),
+                Floor((F('latitude') - sw_lat) / cell_h),
+            ],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(cell_rank__lte=per_cell).order_by('cell_rank', '-created_at', '-id')[:limit]
+
+# ----------------------------
+# Bounding boxes
+# ----------------------------
+
+def normalize_bounds(sw_lat, sw_lng, ne_lat, ne_lng):
+    """
+    Canonical form of a map viewport, or None if a coordinate is not finite.
+    Latitudes are ordered and clamped to [-90, 90]; longitudes are wrapped
+    into [-180, 180]. A box crossing the antimeridian, whether sent wrapped
+    (170, -170) or unwrapped (170, 190) as Leaflet does, comes back with
+    sw_lng > ne_lng. Boxes 360 degrees wide or more become the whole world.
+    """
+    if not all(map(math.isfinite, (sw_lat, sw_lng, ne_lat, ne_lng))):
+        return None
+
+    sw_lat, ne_lat = (min(max(lat, -90.0), 90.0) for lat in sorted((sw_lat, ne_lat)))
+
+    span = ne_lng - sw_lng
+    if span >= 360:
+        return sw_lat, -180.0, ne_lat, 180.0
+    span %= 360
+    sw_lng = (sw_lng + 180) % 360 - 180
+    ne_lng = sw_lng + span
+    if ne_lng > 180:
+        ne_lng -= 360
+    return sw_lat, sw_lng, ne_lat, ne_lng
+
+def lng_span(sw_lng, ne_lng):
+    """Width in degrees of a normalized box, across the antimeridian or not"""
+    return ne_lng - sw_lng if sw_lng <= ne_lng else ne_lng - sw_lng + 360
+
+def bbox_parts(sw_lat, sw_lng, ne_lat, ne_lng):
+    """A normalized box as one or two boxes that do not cross the antimeridian"""
+    if sw_lng <= ne_lng:
+        return [(sw_lat, sw_lng, ne_lat, ne_lng)]
+    return [(sw_lat, sw_lng, ne_lat, 180.0), (sw_lat, -180.0, ne_lat, ne_lng)]
+
+# ----------------------------
+# Geohash spatial key
+# ----------------------------
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+
+def _geohash_cell(lat, lng, precision):
+    """Quantize a coordinate to integer (x, y) cell indexes at a precision"""
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+
+    x = int((lng + 180.0) / 360.0 * (1 << lng_bits))
+    y = int((lat + 90.0) / 180.0 * (1 << lat_bits))
+
+    # Clamp so the max longitude/latitude fall in the last cell
+    x = min(max(x, 0), (1 << lng_bits) - 1)
+    y = min(max(y, 0), (1 << lat_bits) - 1)
+    return x, y
+
+def _interleave(x, y, precision):
+    """Interleave cell indexes into a geohash integer (longitude bit first)"""
+    bits = precision * 5
+    value = 0
+    x_shift = (bits + 1) // 2
+    y_shift = bits // 2
+    for position in range(bits):
+        if position % 2 == 0:
+            x_shift -= 1
+            bit = (x >> x_shift) & 1
+        else:
+            y_shift -= 1
+            bit = (y >> y_shift) & 1
+        value = (value << 1) | bit
+    return value
+
+def _geohash_string(value, precision):
+    chars = []
+    for _ in range(precision):
+        chars.append(GEOHASH_BASE32[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def geohash_encode(lat, lng, precision=GEOHASH_PRECISION):
+    """Encode a coordinate as a standard base32 geohash"""
+    x, y = _geohash_cell(lat, lng, precision)
+    return _geohash_string(_interleave(x, y, precision), precision)
+
+def geohash_ranges(sw_lat, sw_lng, ne_lat, ne_lng, max_cells=None):
+    """
+    Cover a bounding box with geohash cells and return them as a short list
+    of (lower, upper) string ranges. `upper` is exclusive and None means the
+    range is open-ended. Adjacent cells are merged so each range is one
+    contiguous index scan.
+    """
+    if max_cells is None:
+        max_cells = settings.GEOHASH_MAX_CELLS
+
+    # Pick the finest precision whose cover stays within max_cells
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        x0, y0 = _geohash_cell(sw_lat, sw_lng, precision)
+        x1, y1 = _geohash_cell(ne_lat, ne_lng, precision)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= max_cells:
+            break
+
+    cells = sorted(
+        _interleave(x, y, precision)
+        for x in range(x0, x1 + 1)
+        for y in range(y0, y1 + 1)
+    )
+
+    merged = []
+    for value in cells:
+        if merged and merged[-1][1] + 1 == value:
+            merged[-1][1] = value
+        else:
+            merged.append([value, value])
+
+    limit = 1 << (precision * 5)
+    return [
+        (
+            _geohash_string(start, precision),
+            _geohash_string(end + 1, precision) if end + 1 < limit else None,
+        )
+        for start, end in merged
+    ]
+
+def geohash_q(sw_lat, sw_lng, ne_lat, ne_lng):
+    """
+    Q object matching the geohash key ranges covering a normalized bounding
+    box; a box across the antimeridian is covered one side at a time
+    """
+    condition = Q()
+    for part in bbox_parts(sw_lat, sw_lng, ne_lat, ne_lng):
+        for lower, upper in geohash_ranges(*part):
+            if upper is None:
+                condition |= Q(geohash__gte=lower)
+            else:
+                condition |= Q(geohash__gte=lower, geohash__lt=upper)
+    return condition
+
+def pins_in_bbox(pins, sw_lat, sw_lng, ne_lat, ne_lng):
+    """
+    Restrict a Pin queryset to a bounding box, which the database answers
+    from the latitude/longitude index. With PIN_BOUNDS_GEOHASH the geohash
+    ranges are added too, so the planner may walk a few tight geohash index
+    ranges instead and let the exact filter trim the cells that overhang.
+    """
+    if settings.PIN_BOUNDS_GEOHASH:
+        pins = pins.filter(geohash_q(sw_lat, sw_lng, ne_lat, ne_lng))
+    return coordinates_in_bbox(pins, sw_lat, sw_lng, ne_lat, ne_lng)
+
+def coordinates_in_bbox(queryset, sw_lat, sw_lng, ne_lat, ne_lng):
+    """
+    Exact filter for a normalized bounding box on any model with
+    latitude/longitude fields
+    """
+    if sw_lng <= ne_lng:
+        longitude = Q(longitude__gte=sw_lng, longitude__lte=ne_lng)
+    else:
+        longitude = Q(longitude__gte=sw_lng) | Q(longitude__lte=ne_lng)
+    return queryset.filter(longitude, latitude__gte=sw_lat, latitude__lte=ne_lat)
@@ -0,0 +1,174 @@
+"""
+IP geolocation.
+
+Lookups go through an in-process LRU, then each provider in GEOIP_PROVIDERS
+in turn: normally an offline CIDR database first, and the remote API only
+for addresses it does not cover. The remote API keeps its answers in the
+Django cache, shared by all workers, and is called at most GEOIP_REMOTE_RATE
+times a minute across them, so a burst of new visitors neither stalls
+requests nor exhausts the quota.
+"""
+import csv
+import ipaddress
+import socket
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from . import metrics, outbound
+from .lru import TTLCache
+
+
+# ----------------------------
+# Providers
+# ----------------------------
+
+class CIDRDatabase:
+    """
+    Offline database of CIDR networks with coordinates, read from CSV files
+    with network, latitude and longitude columns (such as the GeoLite2 City
+    blocks files; other columns are ignored). Networks must not overlap.
+    They are kept as sorted arrays of range starts and ends per IP version,
+    and a lookup is one binary search.
+    """
+
+    def __init__(self, paths=None):
+        self.paths = settings.GEOIP_DATABASES if paths is None else paths
+        self._tables = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rows = {4: [], 6: []}
+        for path in self.paths:
+            with open(path, newline="", encoding="utf-8") as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                columns = [header.index(name) for name in ("network", "latitude", "longitude")]
+                for network, lat, lng in (map(row.__getitem__, columns) for row in reader):
+                    if not lat or not lng:
+                        continue
+                    # inet_pton is several times faster than ipaddress.ip_network,
+                    # which matters for files of millions of networks
+                    address, _, prefix = network.partition("/")
+                    version, family, bits = (6, socket.AF_INET6, 128) if ":" in address else (4, socket.AF_INET, 32)
+                    host_bits = bits - int(prefix or bits)
+                    start = int.from_bytes(socket.inet_pton(family, address), "big") >> host_bits << host_bits
+                    rows[version].append((start, start | ((1 << host_bits) - 1), float(lat), float(lng)))
+
+        tables = {}
+        for version, ranges in rows.items():
+            ranges.sort()
+            # IPv4 bounds fit in machine words; IPv6 ones stay Python ints
+            bounds = (lambda values: array("L", values)) if version == 4 else list
+            tables[version] = (
+                bounds(r[0] for r in ranges),
+                bounds(r[1] for r in ranges),
+                array("d", (r[2] for r in ranges)),
+                array("d", (r[3] for r in ranges)),
+            )
+        return tables
+
+    def tables(self):
+        """The range arrays per IP version, loaded on first use"""
+        if self._tables is None:
+            with self._lock:
+                if self._tables is None:
+                    self._tables = self._load()
+        return self._tables
+
+    def lookup(self, address):
+        starts, ends, lats, lngs = self.tables()[address.version]
+        i = bisect_right(starts, int(address)) - 1
+        if i >= 0 and int(address) <= ends[i]:
+            return lats[i], lngs[i]
+        return None
+
+
+class RemoteAPI:
+    """
+    The freeipapi.com lookup service. Answers are kept in the Django cache
+    for GEOIP_REMOTE_CACHE_TTL, and calls beyond GEOIP_REMOTE_RATE a minute
+    (counted in the cache, so across workers) are skipped.
+    """
+
+    def _allowed(self):
+        key = f"geoip_remote_calls_{int(time.time() // 60)}"
+        if cache.add(key, 1, 120):
+            return True
+        try:
+            return cache.incr(key) <= settings.GEOIP_REMOTE_RATE
+        except ValueError:
+            # The counter expired in between
+            return cache.add(key, 1, 120)
+
+    def lookup(self, address):
+        if not address.is_global:
+            return None
+        cache_key = f"ip_location_{address}"
+        cached = cache.get(cache_key)
+        if cached:
+            return cached
+        if not self._allowed():
+            return None
+
+        try:
+            response = outbound.get(settings.GEOIP_REMOTE_URL.format(ip=address))
+            response.raise_for_status()
+            data = response.json()
+            result = (float(data["latitude"]), float(data["longitude"]))
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError):
+            return None
+
+        cache.set(cache_key, result, settings.GEOIP_REMOTE_CACHE_TTL)
+        return result
+
+
+# ----------------------------
+# Lookups
+# ----------------------------
+
+_providers = None
+_providers_lock = threading.Lock()
+
+# Misses are kept too (as False), for a shorter time
+_locations = TTLCache(settings.GEOIP_CACHE_SIZE, settings.GEOIP_CACHE_TTL)
+
+def get_providers():
+    """The GEOIP_PROVIDERS instances, created on first use"""
+    global _providers
+    if _providers is None:
+        with _providers_lock:
+            if _providers is None:
+                _providers = [import_string(path)() for path in settings.GEOIP_PROVIDERS]
+    return _providers
+
+def locate(ip):
+    """
+    (latitude, longitude) of an IP address, or None for invalid, private and
+    unknown addresses
+    """
+    # Keyed by the string as given, so a hit costs no parsing
+    location = _locations.get(ip)
+    metrics.count_cache("geoip", location is not None)
+    if location is not None:
+        return location or None
+
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+
+    for provider in get_providers():
+        location = provider.lookup(address)
+        if location is not None:
+            _locations.set(ip, location)
+            return location
+
+    _locations.set(ip, False, ttl=settings.GEOIP_FAILURE_TTL)
+    return None
@@ -0,0 +1,180 @@
+"""
+Bulk pin import, for `manage.py import_pins`.
+
+Rows are validated like links posted to create_pin and short links are
+resolved on a thread pool. Each batch is then written with a few bulk
+INSERTs (pins, platform rows, change log) in one transaction, rather than
+several single-row INSERTs per pin.
+"""
+import csv
+import json
+import logging
+import math
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.db import connection, transaction
+
+from .geo import geohash_encode
+from .links import LinkResolutionError, classify_link, resolve_link, validate_and_sanitize_url
+from .models import PLATFORM_MODELS, Pin, PinChange
+from .tiles import invalidate_all_tiles
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+
+class InvalidRow(ValueError):
+    """An input row that cannot become a pin; the message is the reason"""
+
+
+def read_rows(stream, fmt):
+    """
+    Input rows (dicts with link, latitude and longitude) from a JSONL or CSV
+    text stream. Lines that are not JSON objects come through as None.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+        return
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield row if isinstance(row, dict) else None
+
+def parse_row(row):
+    """
+    (latitude, longitude, link, (platform, canonical_url, content_id)) of an
+    input row; raises InvalidRow
+    """
+    if row is None:
+        raise InvalidRow("Invalid row")
+
+    link = (row.get("link") or "").strip()
+    if not link:
+        raise InvalidRow("Link is required")
+    if not validate_and_sanitize_url(link):
+        raise InvalidRow("Invalid URL format")
+    try:
+        link_info = classify_link(link)
+    except LinkResolutionError as e:
+        raise InvalidRow(str(e))
+    if link_info is None:
+        raise InvalidRow("This platform is not allowed.")
+
+    try:
+        lat, lon = float(row.get("latitude")), float(row.get("longitude"))
+    except (TypeError, ValueError):
+        raise InvalidRow("Location coordinates are required")
+    if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+        raise InvalidRow("Location out of range")
+    platform, url, content_id = link_info
+    if url is not None:
+        check_lengths(platform, url, content_id)
+    return lat, lon, link, link_info
+
+def check_lengths(platform, url, content_id):
+    """
+    Raise InvalidRow if the URL or content ID would not fit their columns,
+    in Pin or in the platform table, so one long value cannot abort the
+    INSERT of its whole batch
+    """
+    model, content_field = PLATFORM_MODELS[platform]
+    limits = (
+        (url, Pin._meta.get_field("url").max_length, "URL"),
+        (url, model._meta.get_field("url").max_length, "URL"),
+        (content_id, Pin._meta.get_field("content_id").max_length, "Content ID"),
+    )
+    if content_field:
+        limits += ((content_id, model._meta.get_field(content_field).max_length, "Content ID"),)
+    for value, max_length, name in limits:
+        if len(value) > max_length:
+            raise InvalidRow(f"{name} too long")
+
+def _resolve_in_thread(platform, link):
+    try:
+        return resolve_link(platform, link)
+    finally:
+        # Pool threads open their own connection for the ResolvedLink cache
+        connection.close()
+
+def _build_pins(batch, executor, errors):
+    """Unsaved pins for the valid rows of a batch; rejected rows are counted in `errors`"""
+    parsed = []
+    for row in batch:
+        try:
+            lat, lon, link, (platform, url, content_id) = parse_row(row)
+        except InvalidRow as e:
+            errors[str(e)] += 1
+            continue
+        # Only links needing an outbound request go to the pool
+        future = executor.submit(_resolve_in_thread, platform, link) if url is None else None
+        parsed.append((lat, lon, platform, link, url, content_id, future))
+
+    pins = []
+    for lat, lon, platform, link, url, content_id, future in parsed:
+        try:
+            if future:
+                url, content_id = future.result()
+                check_lengths(platform, url, content_id)
+        except (LinkResolutionError, InvalidRow) as e:
+            errors[str(e)] += 1
+            continue
+        except Exception:
+            logger.exception("Resolving %s failed", link)
+            errors["Could not resolve link"] += 1
+            continue
+        pins.append(Pin(
+            latitude=lat,
+            longitude=lon,
+            # bulk_create skips Pin.save(), which normally sets the key
+            geohash=geohash_encode(lat, lon),
+            platform=platform,
+            url=url,
+            content_id=content_id,
+        ))
+    return pins
+
+def _write_pins(pins):
+    """Insert pins with their platform rows and change log entries in one transaction"""
+    with transaction.atomic():
+        Pin.objects.bulk_create(pins)
+
+        platform_pins = defaultdict(list)
+        for pin in pins:
+            platform_pin = pin.platform_pin()
+            platform_pins[type(platform_pin)].append(platform_pin)
+        for model, rows in platform_pins.items():
+            model.objects.bulk_create(rows)
+
+        # What the post_save signal does per pin: log the change and invalidate tiles.
+        # A batch touches tiles at every zoom, far too many to bump one by one
+        PinChange.objects.bulk_create(
+            PinChange(pin_id=pin.id, latitude=pin.latitude, longitude=pin.longitude)
+            for pin in pins
+        )
+        transaction.on_commit(invalidate_all_tiles)
+
+def import_pins(rows, batch_size=1000, workers=8, progress=None):
+    """
+    Import pins from an iterable of input rows. Returns (imported, errors),
+    where errors counts rejected rows by reason. `progress` is called with
+    the same pair after every batch.
+    """
+    imported, errors = 0, Counter()
+    rows = iter(rows)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pin-import") as executor:
+        while batch := list(islice(rows, batch_size)):
+            pins = _build_pins(batch, executor, errors)
+            if pins:
+                _write_pins(pins)
+            imported += len(pins)
+            if progress:
+                progress(imported, errors)
+    return imported, errors
@@ -0,0 +1,234 @@
+import re
+import threading
+
+import requests
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import IntegrityError
+from django.utils import timezone
+
+from . import metrics, outbound
+from .lru import TTLCache
+from .models import ResolvedLink
+
+
+# PRAW is slow to import and only Reddit share links need it, so the client
+# is built on first use (normally on a background resolver thread) rather
+# than when the app loads
+_reddit = None
+_reddit_lock = threading.Lock()
+
+def get_reddit():
+    """The shared PRAW client, created on first use"""
+    global _reddit
+    if _reddit is None:
+        with _reddit_lock:
+            if _reddit is None:
+                import praw
+
+                _reddit = praw.Reddit(
+                    client_id=settings.REDDIT_CLIENT_ID,
+                    client_secret=settings.REDDIT_CLIENT_SECRET,
+                    user_agent=settings.REDDIT_USER_AGENT,
+                    # The update check is a blocking request to PyPI
+                    check_for_updates=False,
+                    # Reuse the shared keep-alive pool for Reddit API calls
+                    requestor_kwargs={
+                        "session": outbound.new_session(),
+                        "timeout": outbound.timeout_for("https://oauth.reddit.com/"),
+                    }
+                )
+    return _reddit
+
+# Every supported link in one compiled pattern, tried once per link. Each
+# alternative is anchored at the host, so a platform domain elsewhere in a
+# URL (in the query string, or the path of another site) does not count.
+# Content IDs are captured on the way; short links that must be resolved
+# first (TikTok vm./vt. links, Reddit share links) match without one.
+LINK_PATTERN = re.compile(r"""
+    ^https?://(?:[\w-]+\.)*(?:
+        (?P<tiktok>tiktok\.com/(?:@[^/?#]+/(?:video|photo)/(?P<tiktok_id>\d+))?)
+      | (?P<youtube_shorts>youtube\.com/shorts/)
+      | (?P<instagram>instagram\.com/(?:p|reel)/(?P<instagram_id>[^/?#;]*)[^?#;]*)
+      | (?P<reddit>reddit\.com/r/[^/?#]+/(?:comments/(?P<reddit_id>[^/?#]+)|s/(?P<reddit_share_id>[^/?#]+)))
+    )
+""", re.IGNORECASE | re.VERBOSE)
+
+
+# ----------------------------
+# Utilities
+# ----------------------------
+
+def resolve_tiktok_url(url):
+    """
+    Resolve shortened TikTok URLs to their full URLs
+    Returns the full URL or the original URL if resolution fails
+    """
+    return cached_resolution(url, _fetch_tiktok_url)
+
+def _fetch_tiktok_url(url):
+    try:
+        # Make a HEAD request to follow redirects
+        response = outbound.get(url, allow_redirects=True)
+        final_url = response.url
+        
+        # Verify it's a TikTok URL
+        if 'tiktok.com' in final_url:
+            return final_url
+        return url
+    except requests.exceptions.RequestException:
+        return url
+
+def resolve_reddit_url(url):
+    """
+    Resolve shortened Reddit URLs to their full URLs using PRAW
+    Returns the full URL or the original URL if resolution fails
+    """
+    return cached_resolution(url, _fetch_reddit_url)
+
+def _fetch_reddit_url(url):
+    from prawcore.exceptions import ResponseException, ServerError
+
+    try:
+        # Extract submission info
+        submission = get_reddit().submission(url=url)
+        full_url = f"https://www.reddit.com/r/{submission.subreddit.display_name}/comments/{submission.id}/"
+        return full_url
+
+    except (ResponseException, ServerError) as e:
+        return url
+    except Exception as e:
+        return url
+
+# Built once: URLValidator compiles its patterns per instance
+_url_validator = URLValidator()
+
+def validate_and_sanitize_url(url):
+    """Validate and sanitize URL to prevent security issues"""
+    try:
+        _url_validator(url)
+    except ValidationError:
+        return False
+    
+    # Additional security checks
+    if not url.startswith(('http://', 'https://')):
+        return False
+    
+    return True
+
+def classify_link(link):
+    """
+    Classify a link in one pass: (platform, canonical_url, content_id), or
+    None if it is not on a supported platform. The URL and content ID are
+    None for short links that need an outbound request to resolve (see
+    resolve_link), which create_pin leaves to the background.
+    Raises LinkResolutionError for a supported link without a content ID.
+    """
+    match = LINK_PATTERN.match(link)
+    if match is None:
+        return None
+
+    if match["tiktok"] is not None:
+        if match["tiktok_id"] is None:
+            return "tiktok", None, None
+        return "tiktok", link, match["tiktok_id"]
+
+    if match["youtube_shorts"] is not None:
+        return "youtube_shorts", link, ""
+
+    if match["instagram"] is not None:
+        if not match["instagram_id"]:
+            raise LinkResolutionError("Could not extract Instagram shortcode")
+        # Without the query string and fragment (share tracking)
+        return "instagram", link[:match.end("instagram")], match["instagram_id"]
+
+    if match["reddit_id"] is not None:
+        return "reddit", link, match["reddit_id"]
+    return "reddit", None, None
+
+
+# ----------------------------
+# Resolved link cache
+# ----------------------------
+
+# Hot links are answered in-process; everything else falls back to the
+# ResolvedLink table, shared by all workers and kept across restarts
+_resolved_links = TTLCache(settings.RESOLVED_LINK_CACHE_SIZE, settings.RESOLVED_LINK_TTL)
+
+def cached_resolution(url, fetch):
+    """
+    Resolve a short link through the in-process LRU, then the ResolvedLink
+    table, and only then `fetch` (which returns the original URL on failure).
+    Failures are cached for RESOLVED_LINK_FAILURE_TTL so a dead link posted
+    repeatedly does not cost a round-trip each time.
+    """
+    canonical_url = _resolved_links.get(url)
+    metrics.count_cache("resolved_links", canonical_url is not None)
+    if canonical_url is not None:
+        return canonical_url or url
+
+    entry = ResolvedLink.objects.filter(short_url=url).first()
+    if entry is not None:
+        ttl = settings.RESOLVED_LINK_FAILURE_TTL if entry.failed else settings.RESOLVED_LINK_TTL
+        remaining = ttl - (timezone.now() - entry.resolved_at).total_seconds()
+        if remaining > 0:
+            metrics.count_cache("resolved_links_table", True)
+            _resolved_links.set(url, entry.canonical_url, ttl=remaining)
+            return entry.canonical_url or url
+    metrics.count_cache("resolved_links_table", False)
+
+    resolved = fetch(url)
+    canonical_url = "" if resolved == url else resolved
+
+    try:
+        ResolvedLink.objects.update_or_create(short_url=url, defaults={"canonical_url": canonical_url})
+    except IntegrityError:
+        # Another worker stored the same link first
+        pass
+    _resolved_links.set(
+        url,
+        canonical_url,
+        ttl=settings.RESOLVED_LINK_TTL if canonical_url else settings.RESOLVED_LINK_FAILURE_TTL,
+    )
+    return resolved
+
+
+# ----------------------------
+# Resolution
+# ----------------------------
+
+class LinkResolutionError(Exception):
+    """A submitted link could not be turned into a canonical URL and content ID"""
+
+def resolve_link(platform, link):
+    """
+    Return (canonical_url, content_id) for a link on a supported platform.
+    Raises LinkResolutionError with a user-facing message on failure.
+    """
+    link_info = classify_link(link)
+    if link_info is None or link_info[0] != platform:
+        raise LinkResolutionError("Platform not supported yet")
+    _, url, content_id = link_info
+    if url is not None:
+        return url, content_id
+
+    if platform == "tiktok":
+        # Resolve short TikTok URLs to the full URL
+        resolved = classify_link(resolve_tiktok_url(link))
+        if resolved is None or resolved[0] != "tiktok" or resolved[2] is None:
+            raise LinkResolutionError("Could not extract TikTok content ID")
+        return resolved[1], resolved[2]
+
+    # Reddit share link
+    resolved_url = resolve_reddit_url(link)
+    if resolved_url == link:
+        # Resolution failed - URL is still the same
+        raise LinkResolutionError(
+            "Could not resolve shortened Reddit URL. Please use the full URL."
+        )
+    resolved = classify_link(resolved_url)
+    if resolved is not None and resolved[0] == "reddit" and resolved[2] is not None:
+        return resolved_url, resolved[2]
+    # If we couldn't extract from the resolved URL, use the share ID
+    return resolved_url, LINK_PATTERN.match(link)["reddit_share_id"]
@@ -0,0 +1,219 @@
+"""
+Load testing by replaying recorded traffic.
+
+With REQUEST_LOG_PATH set, RequestLogMiddleware appends every API request
+to a JSONL log. `manage.py replay` sends such a log to a running server at
+its recorded pace (or faster) from a fixed number of concurrent clients, and
+reports throughput and latency per endpoint. `manage.py upstream_stubs`
+stands in for TikTok, Reddit and freeipapi, so a server started with
+OUTBOUND_HTTP_STUB_URL pointing at it makes no real outbound calls.
+"""
+import json
+import queue
+import re
+import threading
+import time
+import zlib
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+from .ratelimit import client_ip
+
+
+# ----------------------------
+# Recording
+# ----------------------------
+
+class RequestLogMiddleware:
+    """Appends API requests to REQUEST_LOG_PATH, one JSON object per line"""
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_LOG_PATH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        # Line buffered, so a killed server loses at most the current line
+        self.log = open(settings.REQUEST_LOG_PATH, "a", buffering=1, encoding="utf-8")
+
+    def __call__(self, request):
+        if request.path.startswith("/api/"):
+            entry = {
+                "time": round(time.time(), 3),
+                "method": request.method,
+                "path": request.get_full_path(),
+                "ip": client_ip(request),
+            }
+            if request.method == "POST":
+                entry["content_type"] = request.content_type
+                entry["body"] = request.body.decode("utf-8", "replace")
+            line = json.dumps(entry) + "\n"
+            with self.lock:
+                self.log.write(line)
+        return self.get_response(request)
+
+
+# ----------------------------
+# Replay
+# ----------------------------
+
+def read_log(stream):
+    """Recorded requests from a JSONL stream, in time order; bad lines are skipped"""
+    entries = []
+    for line in stream:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(entry, dict) and "path" in entry:
+            entries.append(entry)
+    entries.sort(key=lambda entry: entry.get("time", 0))
+    return entries
+
+def endpoint_name(path):
+    """The URL name a request path resolves to, as in the request metrics"""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return "unmatched"
+    return match.url_name or match.view_name
+
+def replay(entries, base_url, concurrency=8, speedup=1.0, timeout=30):
+    """
+    Send recorded requests to `base_url` from `concurrency` client threads,
+    each at its recorded offset from the first divided by `speedup` (0 sends
+    them as fast as the clients go). Returns the per-endpoint results: a
+    dict of endpoint name -> {"latencies", "statuses", "lag"}, where lag is
+    how late requests were sent because every client was busy.
+    """
+    base_url = base_url.rstrip("/")
+    pending = queue.Queue()
+    results = defaultdict(lambda: {"latencies": [], "statuses": Counter(), "lag": []})
+    results_lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        while (item := pending.get()) is not None:
+            due, entry = item
+            headers = {}
+            if entry.get("ip"):
+                headers["X-Forwarded-For"] = entry["ip"]
+            if entry.get("content_type"):
+                headers["Content-Type"] = entry["content_type"]
+            start = time.perf_counter()
+            try:
+                response = session.request(
+                    entry.get("method", "GET"),
+                    base_url + entry["path"],
+                    data=entry.get("body", "").encode("utf-8"),
+                    headers=headers,
+                    timeout=timeout,
+                    allow_redirects=False,
+                )
+                status = response.status_code
+            except requests.exceptions.RequestException as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - start) * 1000
+            with results_lock:
+                result = results[endpoint_name(entry["path"])]
+                result["latencies"].append(elapsed)
+                result["statuses"][status] += 1
+                result["lag"].append(max(0.0, (start - due) * 1000))
+        session.close()
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    first = entries[0].get("time", 0) if entries else 0
+    start = time.perf_counter()
+    for entry in entries:
+        due = start + (entry.get("time", first) - first) / speedup if speedup else time.perf_counter()
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((due, entry))
+    for _ in threads:
+        pending.put(None)
+    for thread in threads:
+        thread.join()
+    return dict(results)
+
+
+# ----------------------------
+# Upstream stubs
+# ----------------------------
+
+REDDIT_SHARE_PATH = re.compile(r"/r/([^/]+)/s/([^/?]+)")
+
+class UpstreamStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers outbound calls sent through OUTBOUND_HTTP_STUB_URL, whose path
+    starts with the upstream host: TikTok short links redirect to a video,
+    Reddit share links to a post, freeipapi returns coordinates. Answers are
+    derived from the path, so replays are repeatable. Every answer waits
+    `latency` seconds first, like a remote server.
+    """
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def do_GET(self):
+        self.answer()
+
+    def do_HEAD(self):
+        self.answer()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.answer()
+
+    def answer(self):
+        time.sleep(self.latency)
+        host, _, path = self.path.lstrip("/").partition("/")
+        path = "/" + path
+        key = zlib.crc32(path.encode())
+
+        if host in ("vm.tiktok.com", "vt.tiktok.com"):
+            return self.redirect(f"https://www.tiktok.com/@stub/video/7{key:018d}")
+        share = REDDIT_SHARE_PATH.match(path)
+        if host.endswith("reddit.com") and share:
+            return self.redirect(f"https://www.reddit.com/r/{share[1]}/comments/{key:x}/stub/")
+        if host.endswith("reddit.com") and path.startswith("/api/v1/access_token"):
+            return self.json({"access_token": "stub", "token_type": "bearer", "expires_in": 3600, "scope": "*"})
+        if host.endswith("freeipapi.com"):
+            return self.json({
+                "ipAddress": path.rsplit("/", 1)[-1],
+                "latitude": key % 12000 / 100 - 60,
+                "longitude": key // 12000 % 36000 / 100 - 180,
+            })
+        self.send(200, b"", "text/html")
+
+    def redirect(self, location):
+        self.send_response(301)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def json(self, data):
+        self.send(200, json.dumps(data).encode(), "application/json")
+
+    def send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def upstream_stub_server(host="127.0.0.1", port=0, latency=0.0):
+    """A threaded server of UpstreamStubHandler; call serve_forever() to run it"""
+    handler = type("UpstreamStubHandler", (UpstreamStubHandler,), {"latency": latency})
+    return ThreadingHTTPServer((host, port), handler)
@@ -0,0 +1,88 @@
+import inspect
+import json
+import platform
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from myapp.benchmarks import DISTRIBUTIONS, SCENARIOS
+
+
+def current_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = "Run a pin API benchmark scenario against a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=sorted(SCENARIOS))
+        parser.add_argument(
+            "--pins", type=int, nargs="+", default=[10000, 100000],
+            help="Table sizes to measure, seeded in increasing order",
+        )
+        parser.add_argument("--repeat", type=int, default=50, help="Measurements per case")
+        parser.add_argument(
+            "--distribution", choices=DISTRIBUTIONS, default=None,
+            help="How seeded pins are spread over the map (default: uniform)",
+        )
+        parser.add_argument("--json", metavar="PATH", help="Also write the results to PATH as JSON")
+        parser.add_argument("--compare", metavar="PATH", help="Compare with the JSON results of an earlier run")
+
+    def handle(self, *args, **options):
+        scenario = SCENARIOS[options["scenario"]]
+        parameters = inspect.signature(scenario).parameters
+        kwargs = {}
+        if options["distribution"]:
+            if "distribution" not in parameters:
+                raise CommandError(f"The {options['scenario']} scenario always seeds uniformly")
+            kwargs["distribution"] = options["distribution"]
+        if options["json"] or options["compare"]:
+            if "results" not in parameters:
+                raise CommandError(f"The {options['scenario']} scenario has no JSON results")
+            kwargs["results"] = results = []
+
+        # Never touch the real database: seed and measure in a test database
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            scenario(self.stdout, sizes=sorted(options["pins"]), repeat=options["repeat"], **kwargs)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options["json"]:
+            report = {
+                "scenario": options["scenario"],
+                "commit": current_commit(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "backend": connection.vendor,
+                "distribution": options["distribution"] or "uniform",
+                "repeat": options["repeat"],
+                "results": results,
+            }
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def compare(self, path, results):
+        """Print the change in p50 and p99 latency of every case in both runs"""
+        with open(path) as f:
+            baseline = json.load(f)
+        earlier = {(row["pins"], row["case"]): row for row in baseline["results"]}
+        self.stdout.write(f"Compared with {baseline.get('commit') or path}:")
+        for row in results:
+            old = earlier.get((row["pins"], row["case"]))
+            if old is None:
+                continue
+            changes = " ".join(
+                f"{key}={old[key]}->{row[key]} ({(row[key] - old[key]) / old[key]:+.0%})" if old[key] else f"{key}={old[key]}->{row[key]}"
+                for key in ("p50_ms", "p99_ms")
+            )
+            self.stdout.write(f"pins={row['pins']} {row['case']}: {changes}")
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.imports import IMPORT_FORMATS, import_pins, read_rows
+
+
+class Command(BaseCommand):
+    help = "Import pins from a JSONL or CSV file of links with coordinates"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin")
+        parser.add_argument("--format", choices=IMPORT_FORMATS, default=None, help="Input format (default: from the file extension, else jsonl)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Pins written per transaction")
+        parser.add_argument("--workers", type=int, default=8, help="Short links resolved concurrently")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        start = time.perf_counter()
+
+        def progress(imported, errors):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"Imported {imported} pin(s), skipped {sum(errors.values())} "
+                f"in {elapsed:.1f}s ({imported / elapsed:.0f} pins/s)"
+            )
+
+        if path == "-":
+            imported, errors = self.run(sys.stdin, fmt, options, progress)
+        else:
+            if not os.path.exists(path):
+                raise CommandError(f"No such file: {path}")
+            with open(path, newline="", encoding="utf-8") as stream:
+                imported, errors = self.run(stream, fmt, options, progress)
+
+        for reason, count in errors.most_common():
+            self.stdout.write(f"Skipped {count} row(s): {reason}")
+        self.stdout.write(f"Imported {imported} pin(s)")
+
+    def run(self, stream, fmt, options, progress):
+        return import_pins(
+            read_rows(stream, fmt),
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            progress=progress,
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from myapp.sync import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete old delta sync log entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Keep this many days (default PIN_SYNC_RETENTION_DAYS)")
+
+    def handle(self, *args, **options):
+        deleted = prune_changes(options["days"])
+        self.stdout.write(f"Deleted {deleted} change(s)")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from myapp.ratelimit import prune_counters
+
+
+class Command(BaseCommand):
+    help = "Delete expired rate limit counters from the database"
+
+    def handle(self, *args, **options):
+        deleted = prune_counters()
+        self.stdout.write(f"Deleted {deleted} counter(s)")
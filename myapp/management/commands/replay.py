@@ -0,0 +1,59 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.benchmarks import summarize
+from myapp.loadtest import read_log, replay
+
+
+class Command(BaseCommand):
+    help = "Replay a recorded request log (REQUEST_LOG_PATH) against a running server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Request log, or - for stdin")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server to send the requests to")
+        parser.add_argument("--concurrency", type=int, default=8, help="Clients sending requests at once")
+        parser.add_argument(
+            "--speedup", type=float, default=1.0,
+            help="Replay this many times faster than recorded (0: as fast as the clients go)",
+        )
+        parser.add_argument("--json", metavar="PATH", help="Also write the report to PATH as JSON")
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            entries = read_log(sys.stdin)
+        else:
+            try:
+                with open(options["path"], encoding="utf-8") as stream:
+                    entries = read_log(stream)
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['path']}: {e}")
+        if not entries:
+            raise CommandError("No requests in the log")
+
+        start = time.perf_counter()
+        results = replay(entries, options["base_url"], options["concurrency"], options["speedup"])
+        wall = time.perf_counter() - start
+
+        report = {"requests": len(entries), "seconds": round(wall, 3), "endpoints": {}}
+        self.stdout.write(
+            f"{len(entries)} requests in {wall:.1f}s ({len(entries) / wall:.1f} req/s) "
+            f"with {options['concurrency']} clients at {options['speedup']:g}x"
+        )
+        for name, result in sorted(results.items(), key=lambda item: -len(item[1]["latencies"])):
+            count = len(result["latencies"])
+            row = {
+                "requests": count,
+                "req_per_s": round(count / wall, 2),
+                **summarize(result["latencies"]),
+                "max_lag_ms": round(max(result["lag"]), 3),
+                "statuses": {str(status): n for status, n in sorted(result["statuses"].items(), key=str)},
+            }
+            report["endpoints"][name] = row
+            self.stdout.write(f"{name}: {row}")
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(report, f, indent=2)
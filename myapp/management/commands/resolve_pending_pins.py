@@ -0,0 +1,39 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myapp.models import Pin, PinStatus
+from myapp.resolution import resolve_pending_pin
+
+
+class Command(BaseCommand):
+    help = "Resolve pins whose links are still pending"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Links resolved concurrently")
+        parser.add_argument("--loop", action="store_true", help="Keep polling for new pending pins")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                pin_ids = list(
+                    Pin.objects.filter(status=PinStatus.PENDING)
+                    .order_by("id")
+                    .values_list("id", flat=True)[:500]
+                )
+                if pin_ids:
+                    list(executor.map(self.resolve, pin_ids))
+                    self.stdout.write(f"Resolved {len(pin_ids)} pending pin(s)")
+                elif not options["loop"]:
+                    break
+                else:
+                    time.sleep(options["interval"])
+
+    def resolve(self, pin_id):
+        try:
+            resolve_pending_pin(pin_id)
+        finally:
+            connection.close()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from myapp.loadtest import upstream_stub_server
+
+
+class Command(BaseCommand):
+    help = "Serve stand-ins for TikTok, Reddit and freeipapi, for servers run with OUTBOUND_HTTP_STUB_URL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8099)
+        parser.add_argument("--latency", type=float, default=0.2, help="Seconds every answer waits, like a remote server")
+
+    def handle(self, *args, **options):
+        server = upstream_stub_server(options["host"], options["port"], options["latency"])
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Upstream stubs on http://{host}:{port}/ (set OUTBOUND_HTTP_STUB_URL to this)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
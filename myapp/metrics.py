@@ -0,0 +1,187 @@
+"""
+Request metrics in Prometheus text format.
+
+MetricsMiddleware times every request and, through a database execute
+wrapper, the queries it runs; outbound HTTP calls and the in-process caches
+report here too. The registry is per process: with several Gunicorn workers
+each one is scraped separately (or sees only its own share of requests).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# Upper bounds in seconds, as in the Prometheus client libraries
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+# (name, labels) -> value, and (name, labels) -> [bucket counts..., sum]
+_counters = {}
+_histograms = {}
+
+HELP = {
+    "foryoupage_http_request_duration_seconds": ("histogram", "Time spent serving requests, by view"),
+    "foryoupage_http_requests_total": ("counter", "Requests served, by view and status"),
+    "foryoupage_db_queries_total": ("counter", "Database queries run by requests, by view"),
+    "foryoupage_db_query_duration_seconds_total": ("counter", "Time requests spent in database queries, by view"),
+    "foryoupage_cache_requests_total": ("counter", "In-process cache lookups, by cache and result"),
+    "foryoupage_rate_limited_total": ("counter", "Requests rejected by a rate limit, by group"),
+    "foryoupage_tile_cache_requests_total": ("counter", "Tile response cache lookups across workers, by result"),
+    "foryoupage_outbound_request_duration_seconds": ("histogram", "Time to the response headers of outbound HTTP calls, by host"),
+}
+
+
+# ----------------------------
+# Registry
+# ----------------------------
+
+def _inc(key, value):
+    _counters[key] = _counters.get(key, 0) + value
+
+def _observe(key, seconds):
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+    histogram[bisect_left(BUCKETS, seconds)] += 1
+    histogram[-1] += seconds
+
+def inc(name, labels=(), value=1):
+    """Add to a counter; `labels` is a tuple of (label, value) pairs"""
+    with _lock:
+        _inc((name, labels), value)
+
+def observe(name, labels, seconds):
+    """Record one observation in a histogram"""
+    with _lock:
+        _observe((name, labels), seconds)
+
+def count_cache(cache, hit):
+    inc("foryoupage_cache_requests_total", (("cache", cache), ("result", "hit" if hit else "miss")))
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    from .tiles import tile_cache_stats
+
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+    tiles = tile_cache_stats()
+    for result, count in (("hit", tiles["hits"]), ("miss", tiles["misses"])):
+        counters[("foryoupage_tile_cache_requests_total", (("result", result),))] = count
+
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels((*labels, ('le', bound)))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------
+# Request instrumentation
+# ----------------------------
+
+class RequestStats:
+    __slots__ = ("queries", "query_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+# Stats of the request being served; context variables follow a request into
+# sync_to_async threads, where the async views run their queries
+_current = ContextVar("request_stats", default=None)
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Connection execute wrapper counting and timing each request's queries"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_time += time.perf_counter() - start
+        stats.queries += 1
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """connection_created receiver adding db_execute_wrapper to every connection"""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+def _record(request, response, elapsed, stats):
+    match = request.resolver_match
+    view = (match.url_name or match.view_name) if match else "unmatched"
+    labels = (("view", view),)
+    # One lock round for the whole request
+    with _lock:
+        _observe(("foryoupage_http_request_duration_seconds", labels), elapsed)
+        _inc(("foryoupage_http_requests_total", (*labels, ("status", response.status_code))), 1)
+        if stats.queries:
+            _inc(("foryoupage_db_queries_total", labels), stats.queries)
+            _inc(("foryoupage_db_query_duration_seconds_total", labels), stats.query_time)
+
+class MetricsMiddleware:
+    """Records latency, status and database use of every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        _record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        _record(request, response, time.perf_counter() - start, stats)
+        return response
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+from myapp.geo import geohash_encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Pin = apps.get_model('myapp', 'Pin')
+    batch = []
+    for pin in Pin.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        pin.geohash = geohash_encode(pin.latitude, pin.longitude)
+        batch.append(pin)
+        if len(batch) >= 2000:
+            Pin.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Pin.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_redditpin'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='pin',
+            name='myapp_pin_latitud_8ea149_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pin',
+            name='myapp_pin_longitu_d2347d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='pin',
+            name='myapp_pin_latitud_7b70f3_idx',
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['geohash'], name='myapp_pin_geohash_8d5e72_idx'),
+        ),
+    ]
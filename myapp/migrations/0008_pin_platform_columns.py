@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+# Reverse of the serializer's lookup order, so that the first platform it
+# would pick is the one written last if a pin somehow has several
+BACKFILL_ORDER = (
+    ('RedditPin', 'reddit', 'post_id'),
+    ('InstagramPin', 'instagram', 'shortcode'),
+    ('TikTokPin', 'tiktok', 'video_id'),
+    ('YouTubePin', 'youtube_shorts', None),
+)
+
+
+def backfill_platform_columns(apps, schema_editor):
+    Pin = apps.get_model('myapp', 'Pin')
+    for model_name, platform, content_field in BACKFILL_ORDER:
+        model = apps.get_model('myapp', model_name)
+        fields = ['pin_id', 'url'] + ([content_field] if content_field else [])
+        batch = []
+        for row in model.objects.values(*fields).iterator(chunk_size=2000):
+            batch.append(Pin(
+                id=row['pin_id'],
+                platform=platform,
+                url=row['url'],
+                content_id=row[content_field] if content_field else '',
+            ))
+            if len(batch) >= 2000:
+                Pin.objects.bulk_update(batch, ['platform', 'url', 'content_id'])
+                batch = []
+        if batch:
+            Pin.objects.bulk_update(batch, ['platform', 'url', 'content_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_pin_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='content_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='platform',
+            field=models.CharField(blank=True, choices=[('youtube_shorts', 'YouTube Shorts'), ('tiktok', 'TikTok'), ('instagram', 'Instagram'), ('reddit', 'Reddit')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='url',
+            field=models.URLField(blank=True, default=''),
+        ),
+        migrations.RunPython(backfill_platform_columns, migrations.RunPython.noop),
+    ]
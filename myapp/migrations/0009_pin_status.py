@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0008_pin_platform_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pin',
+            name='resolution_error',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='pin',
+            name='status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('pending', 'Pending'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['status'], name='myapp_pin_status_84ab27_idx'),
+        ),
+    ]
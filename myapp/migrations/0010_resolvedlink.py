@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_pin_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResolvedLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('short_url', models.URLField(max_length=500, unique=True)),
+                ('canonical_url', models.URLField(blank=True, default='', max_length=500)),
+                ('resolved_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0012_ratelimitcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pin',
+            index=models.Index(fields=['latitude', 'longitude'], name='myapp_pin_latitud_7b70f3_idx'),
+        ),
+    ]
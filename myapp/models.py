@@ -1,21 +1,116 @@
-from django.db import models
+import random
+
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .geo import geohash_encode
+from .tiles import bump_tile_versions
+
+# Reverse one-to-one names of the platform-specific tables
+PLATFORM_RELATIONS = ('youtube_pin', 'tiktok_pin', 'instagram_pin', 'reddit_pin')
+
+class PinQuerySet(models.QuerySet):
+    def with_platform(self):
+        """Join every platform table so serializing pins needs no extra queries"""
+        return self.select_related(*PLATFORM_RELATIONS)
+
+    def random(self, probes=5):
+        """
+        Return a random pin from this queryset without ORDER BY RANDOM()
+        (a dict for a .values() queryset).
+        Random ids between the table's smallest and largest id are looked up
+        by primary key, which is uniform over the matching pins. If every
+        probe lands on a gap or a filtered-out pin, fall back to the nearest
+        matching id, so the cost stays a handful of index lookups.
+        """
+        # Separate queries: SQLite only reads MIN/MAX straight off the index
+        # when the statement has a single aggregate
+        ids = self.model.objects.values_list('id', flat=True)
+        low = ids.order_by('id').first()
+        high = ids.order_by('-id').first()
+        if low is None:
+            return None
+
+        for _ in range(probes):
+            pin = self.filter(id=random.randint(low, high)).first()
+            if pin is not None:
+                return pin
+
+        start = random.randint(low, high)
+        return (
+            self.filter(id__gte=start).order_by('id').first()
+            or self.filter(id__lt=start).order_by('-id').first()
+        )
+
+class Platform(models.TextChoices):
+    YOUTUBE_SHORTS = 'youtube_shorts', 'YouTube Shorts'
+    TIKTOK = 'tiktok', 'TikTok'
+    INSTAGRAM = 'instagram', 'Instagram'
+    REDDIT = 'reddit', 'Reddit'
+
+class PinStatus(models.TextChoices):
+    READY = 'ready', 'Ready'
+    PENDING = 'pending', 'Pending'  # Waiting for its link to be resolved
+    FAILED = 'failed', 'Failed'
 
 class Pin(models.Model):
     latitude = models.FloatField()
     longitude = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    geohash = models.CharField(max_length=12, blank=True, default='')  # Spatial key for bounds queries
+
+    # Denormalized copy of the platform row so reads never need a join
+    platform = models.CharField(max_length=20, choices=Platform.choices, blank=True, default='')
+    url = models.URLField(blank=True, default='')
+    content_id = models.CharField(max_length=255, blank=True, default='')  # video_id / shortcode / post_id
+
+    # Pins whose link needs a network round-trip are created pending (and
+    # inactive) and resolved in the background
+    status = models.CharField(max_length=10, choices=PinStatus.choices, default=PinStatus.READY)
+    resolution_error = models.CharField(max_length=255, blank=True, default='')
+
+    objects = PinQuerySet.as_manager()
 
     class Meta:
         indexes = [
-            models.Index(fields=['latitude']),
-            models.Index(fields=['longitude']),
-            models.Index(fields=['latitude', 'longitude']),  # Composite index for bounds queries
             models.Index(fields=['is_active']), 
+            # Bounds queries filter on both the geohash ranges and the exact
+            # coordinates, so the planner can walk whichever index is tighter
+            models.Index(fields=['latitude', 'longitude']),
+            models.Index(fields=['geohash']),
+            models.Index(fields=['status']),  # Pending pins form the resolution queue
         ]
 
     def __str__(self):
         return f"({self.latitude}, {self.longitude})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pin = super().from_db(db, field_names, values)
+        # Where the row is stored, so a move can also be logged at the old place
+        pin._stored_location = (pin.__dict__.get('latitude'), pin.__dict__.get('longitude'))
+        return pin
+
+    def save(self, *args, **kwargs):
+        # Keep the spatial key in sync with the coordinates
+        self.geohash = geohash_encode(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
+
+    def platform_pin(self):
+        """The (unsaved) platform-specific row, built from the denormalized columns"""
+        model, content_field = PLATFORM_MODELS[self.platform]
+        fields = {'pin': self, 'url': self.url}
+        if content_field:
+            fields[content_field] = self.content_id
+        return model(**fields)
+
+    def create_platform_pin(self):
+        """Create the platform-specific row from the denormalized columns"""
+        platform_pin = self.platform_pin()
+        platform_pin.save(force_insert=True)
+        return platform_pin
     
 class YouTubePin(models.Model):
     pin = models.OneToOneField(Pin, on_delete=models.CASCADE, related_name='youtube_pin')
@@ -47,4 +142,98 @@ class RedditPin(models.Model):
 
     def __str__(self):
         return f"Reddit pin: {self.url}"
-    
\ No newline at end of file
+
+
+# Platform-specific table and the field mirrored by Pin.content_id
+PLATFORM_MODELS = {
+    Platform.YOUTUBE_SHORTS: (YouTubePin, None),
+    Platform.TIKTOK: (TikTokPin, 'video_id'),
+    Platform.INSTAGRAM: (InstagramPin, 'shortcode'),
+    Platform.REDDIT: (RedditPin, 'post_id'),
+}
+
+
+class ResolvedLink(models.Model):
+    """Persistent cache of short link -> canonical URL, including failed lookups"""
+    short_url = models.URLField(max_length=500, unique=True)
+    canonical_url = models.URLField(max_length=500, blank=True, default='')  # Empty when resolution failed
+    resolved_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def failed(self):
+        return not self.canonical_url
+
+    def __str__(self):
+        return f"{self.short_url} -> {self.canonical_url or 'failed'}"
+
+
+class PinChange(models.Model):
+    """
+    Append-only log of pin saves and deletes. Its ids are the cursors of
+    delta sync: a client that synced a region up to id N asks for the pins
+    changed there since N and gets their current state.
+    """
+    pin_id = models.BigIntegerField()  # Not a foreign key: deleted pins stay logged
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Pin {self.pin_id} changed at {self.created_at}"
+
+
+class RateLimitCounter(models.Model):
+    """
+    Requests of one client in one fixed window of a rate limit, for
+    deployments whose cache is not shared between workers (see ratelimit)
+    """
+    key = models.CharField(max_length=200)  # "<group>:<client ip>"
+    window = models.BigIntegerField()  # Start of the window // its length
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'window'], name='ratelimit_key_window'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} window {self.window}: {self.count}"
+
+
+# ----------------------------
+# Change log
+# ----------------------------
+
+def record_pin_change(pin_id, lat, lng):
+    """
+    Log a pin change at (lat, lng) for delta sync and invalidate the cached
+    tiles there once the change is visible to other requests. Saves and
+    deletes (including queryset and cascading deletes) do this through the
+    signals below; queryset.update() and bulk_create() must call it (or do
+    the same in bulk) themselves.
+    """
+    PinChange.objects.create(pin_id=pin_id, latitude=lat, longitude=lng)
+    transaction.on_commit(lambda: bump_tile_versions(lat, lng))
+
+def _changed_locations(pin):
+    """Where a change to `pin` shows: its location, and the one it was stored at if it moved"""
+    location = (pin.latitude, pin.longitude)
+    stored = getattr(pin, '_stored_location', None)
+    if stored is None or None in stored or stored == location:
+        return [location]
+    # Moved: clients syncing the old area must hear it is gone from there
+    return [stored, location]
+
+@receiver(post_save, sender=Pin)
+def _pin_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for lat, lng in _changed_locations(instance):
+        record_pin_change(instance.id, lat, lng)
+    instance._stored_location = (instance.latitude, instance.longitude)
+
+@receiver(post_delete, sender=Pin)
+def _pin_deleted(sender, instance, **kwargs):
+    for lat, lng in _changed_locations(instance):
+        record_pin_change(instance.id, lat, lng)
@@ -0,0 +1,102 @@
+"""
+Shared HTTP client for every outbound call (TikTok redirects, PRAW,
+IP geolocation). One connection pool per process keeps TCP/TLS connections
+alive between requests instead of opening a new one per call.
+"""
+import threading
+from urllib.parse import urlparse, urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+
+_adapter = None
+_session = None
+_lock = threading.Lock()
+
+
+class StubAdapter(HTTPAdapter):
+    """
+    Sends every request to OUTBOUND_HTTP_STUB_URL instead, with the upstream
+    host as the first path segment, for load tests (see loadtest)
+    """
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        stubbed = request.copy()
+        stubbed.url = f"{settings.OUTBOUND_HTTP_STUB_URL.rstrip('/')}/{parts.netloc}{parts.path or '/'}"
+        if parts.query:
+            stubbed.url += f"?{parts.query}"
+        response = super().send(stubbed, **kwargs)
+        # Callers and redirects see the upstream URL
+        response.request = request
+        response.url = request.url
+        return response
+
+
+def _get_adapter():
+    """The process-wide connection pool, created on first use"""
+    global _adapter
+    if _adapter is None:
+        with _lock:
+            if _adapter is None:
+                retry = Retry(
+                    total=settings.OUTBOUND_HTTP_RETRIES,
+                    backoff_factor=0.2,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=("GET", "HEAD"),
+                    raise_on_status=False,
+                )
+                adapter_class = StubAdapter if settings.OUTBOUND_HTTP_STUB_URL else HTTPAdapter
+                # pool_block bounds the connections per host: extra threads
+                # wait for a free connection instead of opening more
+                _adapter = adapter_class(
+                    pool_connections=settings.OUTBOUND_HTTP_POOL_HOSTS,
+                    pool_maxsize=settings.OUTBOUND_HTTP_POOL_SIZE,
+                    pool_block=True,
+                    max_retries=retry,
+                )
+    return _adapter
+
+def _record_response(response, *args, **kwargs):
+    # Each hop of a redirect chain is recorded under its own host
+    host = urlparse(response.request.url).hostname or ""
+    metrics.observe(
+        "foryoupage_outbound_request_duration_seconds",
+        (("host", host),),
+        response.elapsed.total_seconds(),
+    )
+
+def new_session():
+    """
+    A separate session backed by the shared pool, for clients such as PRAW
+    that set their own headers on the session they are given
+    """
+    session = requests.Session()
+    session.mount("http://", _get_adapter())
+    session.mount("https://", _get_adapter())
+    session.hooks["response"].append(_record_response)
+    return session
+
+def get_session():
+    """The process-wide pooled session used by get()"""
+    global _session
+    if _session is None:
+        session = new_session()
+        with _lock:
+            if _session is None:
+                _session = session
+    return _session
+
+def timeout_for(url):
+    """Timeout in seconds for a URL, from OUTBOUND_HTTP_TIMEOUTS by host"""
+    host = urlparse(url).hostname or ""
+    return settings.OUTBOUND_HTTP_TIMEOUTS.get(host, settings.OUTBOUND_HTTP_TIMEOUT)
+
+def get(url, **kwargs):
+    """requests.get through the shared pool, with the host's timeout by default"""
+    kwargs.setdefault("timeout", timeout_for(url))
+    return get_session().get(url, **kwargs)
@@ -0,0 +1,202 @@
+"""
+Per-client rate limits shared by every worker.
+
+Each limit is a sliding window: the count of the current fixed window plus
+the previous window's count, weighted by how much of that window still
+falls within the last `period` seconds. Counters live in the Django cache
+when it is shared and increments are atomic (Redis), else in the
+RateLimitCounter table, so a limit holds across Gunicorn workers and
+restarts either way. A client found over its limit is also remembered
+in-process until it may retry, so a flood of rejected requests costs no
+round trips to the counter store.
+"""
+import math
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import metrics
+from .lru import TTLCache
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """(requests, period in seconds) of a rate such as "10/m" or "100/5m" """
+    count, _, period = rate.partition("/")
+    multiplier = period[:-1] or "1"
+    return int(count), int(multiplier) * PERIODS[period[-1]]
+
+def client_ip(request):
+    """The client address, from X-Forwarded-For behind the proxy"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0]
+    return request.META.get('REMOTE_ADDR')
+
+
+# ----------------------------
+# Counter stores
+# ----------------------------
+
+class CacheCounters:
+    """Counters in the Django cache; only shared and atomic with Redis or Memcached"""
+
+    def hit(self, key, window, period):
+        """Count one request in `window`; returns (current, previous) window counts"""
+        current_key = f"ratelimit:{key}:{window}"
+        if cache.add(current_key, 1, period * 2):
+            current = 1
+        else:
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                # Expired in between
+                cache.add(current_key, 1, period * 2)
+                current = 1
+        return current, cache.get(f"ratelimit:{key}:{window - 1}", 0)
+
+
+class DatabaseCounters:
+    """
+    Counters in the RateLimitCounter table: one upsert counting the request
+    and returning the new count (INSERT ... ON CONFLICT ... RETURNING), then
+    one read of the previous window. Both are plain SQL, since building ORM
+    queries would cost more than running them. Expired rows are deleted by
+    prune_counters().
+    """
+
+    def hit(self, key, window, period):
+        from .models import RateLimitCounter
+
+        qn = connection.ops.quote_name
+        table = qn(RateLimitCounter._meta.db_table)
+        expires_at = timezone.now() + timedelta(seconds=period * 2)
+        with connection.cursor() as cursor:
+            if connection.features.can_return_columns_from_insert:
+                cursor.execute(
+                    f"INSERT INTO {table} ({qn('key')}, {qn('window')}, {qn('count')}, {qn('expires_at')}) "
+                    f"VALUES (%s, %s, 1, %s) "
+                    f"ON CONFLICT ({qn('key')}, {qn('window')}) "
+                    f"DO UPDATE SET {qn('count')} = {table}.{qn('count')} + 1 "
+                    f"RETURNING {qn('count')}",
+                    [key, window, connection.ops.adapt_datetimefield_value(expires_at)],
+                )
+                current = cursor.fetchone()[0]
+            else:
+                current = self._update_or_insert(RateLimitCounter, key, window, expires_at)
+            cursor.execute(
+                f"SELECT {qn('count')} FROM {table} WHERE {qn('key')} = %s AND {qn('window')} = %s",
+                [key, window - 1],
+            )
+            previous = cursor.fetchone()
+        return current, previous[0] if previous else 0
+
+    def _update_or_insert(self, model, key, window, expires_at):
+        # Backends without RETURNING: an atomic UPDATE, else an INSERT
+        counters = model.objects.filter(key=key, window=window)
+        if not counters.update(count=F("count") + 1):
+            try:
+                with transaction.atomic():
+                    model.objects.create(key=key, window=window, count=1, expires_at=expires_at)
+                return 1
+            except IntegrityError:
+                # Another worker created it first
+                counters.update(count=F("count") + 1)
+        return counters.values_list("count", flat=True).first()
+
+def prune_counters():
+    """Delete database counters no limit looks at any more; returns how many"""
+    from .models import RateLimitCounter
+
+    deleted, _ = RateLimitCounter.objects.filter(expires_at__lt=timezone.now()).delete()
+    return deleted
+
+
+# ----------------------------
+# Limits
+# ----------------------------
+
+_counters = None
+_counters_lock = threading.Lock()
+
+# "<group>:<ip>" of clients over a limit -> when they may retry
+_blocked = TTLCache(10000, 60)
+
+def get_counters():
+    """The RATE_LIMIT_COUNTERS store, created on first use"""
+    global _counters
+    if _counters is None:
+        with _counters_lock:
+            if _counters is None:
+                _counters = import_string(settings.RATE_LIMIT_COUNTERS)()
+    return _counters
+
+def check(group, ident, rate):
+    """
+    Count one request from `ident` against `rate` in `group`. Returns
+    (limited, seconds until the client may retry).
+    """
+    key = f"{group}:{ident}"
+    now = time.time()
+    blocked_until = _blocked.get(key)
+    if blocked_until is not None:
+        metrics.inc("foryoupage_rate_limited_total", (("group", group),))
+        return True, max(0, blocked_until - now)
+
+    limit, period = parse_rate(rate)
+    window, offset = divmod(now, period)
+    current, previous = get_counters().hit(key, int(window), period)
+    if current + previous * (1 - offset / period) <= limit:
+        return False, 0
+
+    # The previous window's weight only falls from here: by the end of the
+    # current one the client is back under the limit unless it kept going
+    retry_after = period - offset
+    _blocked.set(key, now + retry_after, ttl=retry_after)
+    metrics.inc("foryoupage_rate_limited_total", (("group", group),))
+    return True, retry_after
+
+def rate_limited(group, message="Too many requests. Please try again later."):
+    """
+    Decorator for sync and async views rejecting clients over
+    RATE_LIMITS[group] with a 429 before the view does any work. Groups
+    whose rate is None are not limited.
+    """
+    def rejection(retry_after):
+        response = JsonResponse({"error": message}, status=429)
+        response["Retry-After"] = str(math.ceil(retry_after))
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                rate = settings.RATE_LIMITS.get(group)
+                if rate:
+                    limited, retry_after = await sync_to_async(check)(group, client_ip(request), rate)
+                    if limited:
+                        return rejection(retry_after)
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATE_LIMITS.get(group)
+            if rate:
+                limited, retry_after = check(group, client_ip(request), rate)
+                if limited:
+                    return rejection(retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
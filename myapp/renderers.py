@@ -0,0 +1,11 @@
+from rest_framework.renderers import JSONRenderer
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """
+    The columnar pin format (see serializers.compact_pin_values), selected
+    with `?format=compact` or by accepting its media type. Views check
+    `request.accepted_renderer.format` to build the compact body.
+    """
+    media_type = 'application/vnd.foryoupage.compact+json'
+    format = 'compact'
@@ -0,0 +1,85 @@
+"""
+Background resolution of pending pins.
+
+Pins whose link needs an outbound request are stored with status "pending".
+The pending rows are the job queue: a per-process thread pool picks them up
+as soon as they are committed, and `manage.py resolve_pending_pins` drains
+whatever is left (after a restart, or when PIN_RESOLVER_WORKERS is 0).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .links import LinkResolutionError, resolve_link
+from .models import Pin, PinStatus, record_pin_change
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PIN_RESOLVER_WORKERS,
+            thread_name_prefix="pin-resolver",
+        )
+    return _executor
+
+def enqueue_pin(pin_id):
+    """Resolve a pending pin in the background once the current transaction commits"""
+    if settings.PIN_RESOLVER_WORKERS > 0:
+        transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, pin_id))
+
+def _run_in_thread(pin_id):
+    # Worker threads get their own connection; never leave it open between jobs
+    close_old_connections()
+    try:
+        resolve_pending_pin(pin_id)
+    finally:
+        connection.close()
+
+def resolve_pending_pin(pin_id):
+    """
+    Resolve one pending pin: on success it gets its canonical URL, content ID
+    and platform row and becomes visible; on failure it is marked failed with
+    the reason. Safe to call twice for the same pin.
+    """
+    pin = Pin.objects.filter(id=pin_id, status=PinStatus.PENDING).first()
+    if pin is None:
+        return
+
+    try:
+        url, content_id = resolve_link(pin.platform, pin.url)
+    except LinkResolutionError as e:
+        _mark_failed(pin_id, str(e))
+        return
+    except Exception:
+        # Never leave a pin pending forever because of an unexpected error
+        logger.exception("Resolving pin %s failed", pin_id)
+        _mark_failed(pin_id, "Could not resolve link")
+        return
+
+    with transaction.atomic():
+        # Another worker may have finished this pin while we were resolving
+        pin = Pin.objects.select_for_update().filter(id=pin_id, status=PinStatus.PENDING).first()
+        if pin is None:
+            return
+        pin.url = url
+        pin.content_id = content_id
+        pin.status = PinStatus.READY
+        pin.is_active = True
+        pin.save()
+        pin.create_platform_pin()
+
+def _mark_failed(pin_id, error):
+    with transaction.atomic():
+        pins = Pin.objects.select_for_update().filter(id=pin_id, status=PinStatus.PENDING)
+        locations = list(pins.values_list('id', 'latitude', 'longitude'))
+        pins.update(status=PinStatus.FAILED, resolution_error=error)
+        # update() sends no signals
+        for changed_id, lat, lng in locations:
+            record_pin_change(changed_id, lat, lng)
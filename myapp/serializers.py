@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Pin, YouTubePin, TikTokPin, InstagramPin, RedditPin
+from rest_framework.utils.encoders import JSONEncoder
+from .models import Pin, YouTubePin, TikTokPin, InstagramPin, RedditPin, Platform, PLATFORM_MODELS
 
 class YouTubePinSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,42 +22,161 @@ class RedditPinSerializer(serializers.ModelSerializer):
         model = RedditPin
         fields = ['url', 'post_id']
 
+# (relation, platform name, serializer) in the order platforms are checked
+PLATFORM_SERIALIZERS = (
+    ('youtube_pin', "YouTube Shorts", YouTubePinSerializer),
+    ('tiktok_pin', "TikTok", TikTokPinSerializer),
+    ('instagram_pin', "Instagram", InstagramPinSerializer),
+    ('reddit_pin', "Reddit", RedditPinSerializer),
+)
+
 class PinSerializer(serializers.ModelSerializer):
+    """
+    Serialize pins with their platform data. Querysets should come from
+    Pin.objects.with_platform() so the platform rows are already joined;
+    otherwise every missing relation costs a query per pin.
+    """
     platform_data = serializers.SerializerMethodField()
     platform = serializers.SerializerMethodField()
     
     class Meta:
         model = Pin
         fields = ['id', 'latitude', 'longitude', 'created_at', 'is_active', 'platform', 'platform_data']
+
+    def get_platform_child(self, obj):
+        """Return (name, child, serializer class) for the pin's platform row"""
+        for relation, name, serializer_class in PLATFORM_SERIALIZERS:
+            # Missing relations raise an AttributeError subclass, which getattr
+            # swallows; with select_related this never reaches the database
+            child = getattr(obj, relation, None)
+            if child is not None:
+                return name, child, serializer_class
+        return None, None, None
     
     def get_platform(self, obj):
-        # Check if this pin has a YouTubePin
-        if hasattr(obj, 'youtube_pin'):
-            return "YouTube Shorts"
-        # Check if this pin has a TikTokPin
-        elif hasattr(obj, 'tiktok_pin'):
-            return "TikTok"
-        # Check if this pin has an InstagramPin
-        elif hasattr(obj, 'instagram_pin'):
-            return "Instagram"
-        # Check if this pin has a RedditPin
-        elif hasattr(obj, 'reddit_pin'):
-            return "Reddit"
-        return "Unknown"
+        name, _, _ = self.get_platform_child(obj)
+        return name or "Unknown"
     
     def get_platform_data(self, obj):
         # Return platform-specific data
-        if hasattr(obj, 'youtube_pin'):
-            serializer = YouTubePinSerializer(obj.youtube_pin)
-            return serializer.data
-        elif hasattr(obj, 'tiktok_pin'):
-            serializer = TikTokPinSerializer(obj.tiktok_pin)
-            return serializer.data
-        elif hasattr(obj, 'instagram_pin'):
-            serializer = InstagramPinSerializer(obj.instagram_pin)
-            return serializer.data
-        elif hasattr(obj, 'reddit_pin'):
-            serializer = RedditPinSerializer(obj.reddit_pin)
-            return serializer.data
-        return {}
-        
\ No newline at end of file
+        _, child, serializer_class = self.get_platform_child(obj)
+        if child is None:
+            return {}
+        return serializer_class(child).data
+
+
+# ----------------------------
+# Single-table fast path
+# ----------------------------
+
+# Columns needed to render a pin from Pin alone, for use with .values()
+PIN_VALUE_FIELDS = ('id', 'latitude', 'longitude', 'created_at', 'is_active', 'platform', 'url', 'content_id')
+
+_created_at_field = serializers.DateTimeField()
+
+def serialize_pin_values(row):
+    """
+    Render a Pin.values(*PIN_VALUE_FIELDS) row in the same shape as
+    PinSerializer, using the denormalized platform columns instead of
+    instantiating models and nested serializers.
+    """
+    platform = row['platform']
+    if platform:
+        platform_data = {'url': row['url']}
+        _, content_field = PLATFORM_MODELS[platform]
+        if content_field:
+            platform_data[content_field] = row['content_id']
+    else:
+        platform_data = {}
+
+    return {
+        'id': row['id'],
+        'latitude': row['latitude'],
+        'longitude': row['longitude'],
+        'created_at': _created_at_field.to_representation(row['created_at']),
+        'is_active': row['is_active'],
+        'platform': Platform(platform).label if platform else "Unknown",
+        'platform_data': platform_data,
+    }
+
+
+# Same options as DRF's default (compact, strict) JSONRenderer
+_stream_encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+
+def _encode_pin_value(row):
+    # JSONRenderer also escapes these, as they end lines in JavaScript
+    return _stream_encoder.encode(serialize_pin_values(row)).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+
+def stream_pin_values(rows, chunk_size):
+    """
+    Yield a JSON array of serialize_pin_values() rows piece by piece, reading
+    the queryset `chunk_size` rows at a time. The output is byte-for-byte
+    what JSONRenderer produces for the whole list, but only one chunk is
+    ever held in memory.
+    """
+    separator = '['
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(separator + _encode_pin_value(row))
+        separator = ','
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk).encode()
+            chunk = []
+    if separator == '[':
+        chunk.append(separator)
+    chunk.append(']')
+    yield ''.join(chunk).encode()
+
+async def astream_pin_values(rows, chunk_size):
+    """stream_pin_values() for async views, reading with the async ORM"""
+    separator = '['
+    chunk = []
+    async for row in rows.aiterator(chunk_size=chunk_size):
+        chunk.append(separator + _encode_pin_value(row))
+        separator = ','
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk).encode()
+            chunk = []
+    if separator == '[':
+        chunk.append(separator)
+    chunk.append(']')
+    yield ''.join(chunk).encode()
+
+
+# ----------------------------
+# Compact wire format
+# ----------------------------
+
+# Columns needed for a map marker; the popup fetches the rest by id
+COMPACT_PIN_FIELDS = ('id', 'latitude', 'longitude', 'platform')
+
+# Coordinates are sent as integers in units of 1e-5 degrees (about 1 m)
+COMPACT_SCALE = 100000
+
+# Platform codes used in the compact format; 0 is a pin without a platform
+COMPACT_PLATFORMS = ["Unknown"] + [label for _, label in Platform.choices]
+_platform_codes = {value: code for code, value in enumerate([''] + Platform.values)}
+
+def compact_pin_values(rows):
+    """
+    Encode Pin.values(*COMPACT_PIN_FIELDS) rows as columns instead of one
+    object per pin: ids as deltas from the previous id (rows are sorted by
+    id), scaled integer coordinates and platform codes.
+    """
+    ids, lats, lngs, platforms = [], [], [], []
+    previous = 0
+    for row in sorted(rows, key=lambda row: row['id']):
+        ids.append(row['id'] - previous)
+        previous = row['id']
+        lats.append(round(row['latitude'] * COMPACT_SCALE))
+        lngs.append(round(row['longitude'] * COMPACT_SCALE))
+        platforms.append(_platform_codes.get(row['platform'], 0))
+    return {'id': ids, 'lat': lats, 'lng': lngs, 'platform': platforms}
+
+def compact_clusters(clusters):
+    """Encode cluster_pins() output as scaled integer columns"""
+    return {
+        'lat': [round(cluster['latitude'] * COMPACT_SCALE) for cluster in clusters],
+        'lng': [round(cluster['longitude'] * COMPACT_SCALE) for cluster in clusters],
+        'count': [cluster['count'] for cluster in clusters],
+    }
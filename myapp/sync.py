@@ -0,0 +1,70 @@
+"""
+Delta sync for map regions.
+
+Every Pin save and delete appends a PinChange row (two for a move: the old
+and the new location). A client that loaded a
+region remembers the newest change id it has seen (its cursor) and later
+asks only for the pins changed there since; the answer is the current
+state of those pins, so replaying a change twice is harmless.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .geo import coordinates_in_bbox, pins_in_bbox
+from .models import Pin, PinChange
+
+
+def latest_change_id():
+    """Cursor covering every change committed so far"""
+    return PinChange.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+def pin_changes(bounds, since):
+    """
+    Pins changed inside `bounds` after cursor `since`. Returns
+    (cursor, reset, active pin queryset, removed pin ids). `reset` means
+    the log no longer reaches back to `since`, or more than
+    PIN_BOUNDS_MAX_ROWS pins changed there since, and the client must
+    reload the region in full.
+    """
+    # Take the cursor first, so a change committed while we read is sent
+    # again next time rather than skipped
+    cursor = latest_change_id()
+
+    oldest = PinChange.objects.order_by('id').values_list('id', flat=True).first()
+    if oldest is not None and since < oldest - 1:
+        return cursor, True, Pin.objects.none(), []
+
+    # Ids are handed out before commit, so a slow transaction can land
+    # behind a cursor that was already returned; re-reading a few changes
+    # before the cursor picks those up
+    changes = coordinates_in_bbox(
+        PinChange.objects.filter(id__gt=since - settings.PIN_SYNC_OVERLAP),
+        *bounds
+    )
+    changed = changes.order_by().values('pin_id').distinct()
+    limit = settings.PIN_BOUNDS_MAX_ROWS
+    pin_ids = {row['pin_id'] for row in changed[:limit + 1]}
+    if len(pin_ids) > limit:
+        # Cheaper to reload the tiles than to send a delta this large
+        return cursor, True, Pin.objects.none(), []
+
+    # Pins that moved out of the box count as removed from it. The changed
+    # ids stay a subquery, so no query binds one parameter per pin
+    active = pins_in_bbox(Pin.objects.filter(id__in=changed, is_active=True), *bounds)
+    removed = pin_ids - set(active.values_list('id', flat=True))
+    return cursor, False, active, sorted(removed)
+
+def prune_changes(days=None):
+    """Drop log entries older than PIN_SYNC_RETENTION_DAYS; returns the number removed"""
+    days = settings.PIN_SYNC_RETENTION_DAYS if days is None else days
+    # The newest entry always stays, so cursors never go backwards and old
+    # cursors can still be told apart from an empty log
+    deleted, _ = (
+        PinChange.objects
+        .filter(created_at__lt=timezone.now() - timedelta(days=days))
+        .exclude(id=latest_change_id())
+        .delete()
+    )
+    return deleted
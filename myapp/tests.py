@@ -1,3 +1,1111 @@
-from django.test import TestCase
+import io
+import ipaddress
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import benchmarks, geoip, links, loadtest, metrics, outbound, ratelimit
+from .geo import cluster_pins, geohash_encode, geohash_ranges, normalize_bounds, pins_in_bbox
+from .models import InstagramPin, Pin, PinChange, PinStatus, RateLimitCounter, ResolvedLink, TikTokPin, YouTubePin
+from .renderers import CompactJSONRenderer
+from .resolution import _mark_failed, resolve_pending_pin
+from .serializers import PIN_VALUE_FIELDS, PinSerializer, serialize_pin_values
+from .sync import prune_changes
+from .tiles import get_tile_version, tile_bounds, tile_cache_stats, tile_for, tiles_containing
+
+
+PLATFORM_SAMPLES = (
+    ("youtube_shorts", "https://www.youtube.com/shorts/abc{i}", ""),
+    ("tiktok", "https://www.tiktok.com/@user/video/{i}", "{i}"),
+    ("instagram", "https://www.instagram.com/reel/sc{i}/", "sc{i}"),
+    ("reddit", "https://www.reddit.com/r/pics/comments/p{i}/", "p{i}"),
+)
+
+
+def make_pins(count, latitude=51.5, longitude=-0.12):
+    """Create `count` active pins cycling through every platform"""
+    pins = []
+    for i in range(count):
+        platform, url, content_id = PLATFORM_SAMPLES[i % 4]
+        pin = Pin.objects.create(
+            latitude=latitude + i * 0.001,
+            longitude=longitude,
+            platform=platform,
+            url=url.format(i=i),
+            content_id=content_id.format(i=i),
+        )
+        pin.create_platform_pin()
+        pins.append(pin)
+    return pins
+
+
+class GeohashTests(TestCase):
+    def test_reference_vectors(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+        self.assertTrue(geohash_encode(57.64911, 10.40744).startswith("u4pruydqqvj"))
+        self.assertEqual(geohash_encode(-90, -180, 4), "0000")
+        self.assertEqual(geohash_encode(90, 180, 4), "zzzz")
+
+    def test_ranges_cover_every_point_in_the_box(self):
+        rng = random.Random(7)
+        boxes = [
+            (0, 0, 45, 90),  # Edges on cell boundaries
+            (-11.25, 22.5, 11.25, 45),
+            (80, -180, 90, 180),  # The poles
+            (-90, -180, -85, 180),
+            (51.4, -0.2, 51.6, 0.1),
+        ]
+        for _ in range(30):
+            lat, lng = rng.uniform(-90, 89), rng.uniform(-180, 179)
+            boxes.append((lat, lng, min(90, lat + rng.uniform(0, 20)), min(180, lng + rng.uniform(0, 40))))
+
+        for box in boxes:
+            sw_lat, sw_lng, ne_lat, ne_lng = box
+            for max_cells in (1, 4, 32):
+                ranges = geohash_ranges(*box, max_cells=max_cells)
+                points = [(sw_lat, sw_lng), (ne_lat, ne_lng), (sw_lat, ne_lng), (ne_lat, sw_lng)]
+                points += [(rng.uniform(sw_lat, ne_lat), rng.uniform(sw_lng, ne_lng)) for _ in range(50)]
+                for lat, lng in points:
+                    key = geohash_encode(lat, lng)
+                    self.assertTrue(
+                        any(lower <= key and (upper is None or key < upper) for lower, upper in ranges),
+                        (box, max_cells, lat, lng),
+                    )
+
+    def test_matches_the_latitude_longitude_filter(self):
+        rng = random.Random(8)
+        points = [(rng.uniform(40, 60), rng.uniform(-10, 10)) for _ in range(300)]
+        # Pins exactly on the edges of the first box
+        points += [(45, 0), (50, -5), (45, -5), (50, 0)]
+        Pin.objects.bulk_create(
+            Pin(latitude=lat, longitude=lng, geohash=geohash_encode(lat, lng)) for lat, lng in points
+        )
+
+        boxes = [(45, -5, 50, 0)] + [
+            (lat, lng, lat + rng.uniform(0.1, 8), lng + rng.uniform(0.1, 8))
+            for lat, lng in ((rng.uniform(40, 55), rng.uniform(-10, 5)) for _ in range(20))
+        ]
+        for sw_lat, sw_lng, ne_lat, ne_lng in boxes:
+            legacy = Pin.objects.filter(
+                latitude__gte=sw_lat, latitude__lte=ne_lat,
+                longitude__gte=sw_lng, longitude__lte=ne_lng,
+            )
+            for use_geohash in (False, True):
+                with self.settings(PIN_BOUNDS_GEOHASH=use_geohash):
+                    self.assertEqual(
+                        set(pins_in_bbox(Pin.objects.all(), sw_lat, sw_lng, ne_lat, ne_lng).values_list("id", flat=True)),
+                        set(legacy.values_list("id", flat=True)),
+                    )
+
+
+class PinQueryCountTests(TestCase):
+    """Reading pins must cost a constant number of queries, whatever the result size"""
+
+    bounds = {"sw_lat": 50, "sw_lng": -1, "ne_lat": 53, "ne_lng": 1}
+
+    def assert_in_bounds_queries(self, count):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("pins-in-bounds"), self.bounds)
+        self.assertEqual(len(response.json()), count)
+
+    def test_in_bounds_small_result(self):
+        make_pins(4)
+        self.assert_in_bounds_queries(4)
+
+    def test_in_bounds_large_result(self):
+        make_pins(60)
+        self.assert_in_bounds_queries(60)
+
+    def test_in_bounds_resolves_every_platform(self):
+        make_pins(4)
+        response = self.client.get(reverse("pins-in-bounds"), self.bounds)
+        platforms = {pin["platform"] for pin in response.json()}
+        self.assertEqual(platforms, {"YouTube Shorts", "TikTok", "Instagram", "Reddit"})
+
+    def test_random_pin(self):
+        make_pins(8)
+        # Two queries for the id range, one primary key probe
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("random-pin"))
+        self.assertIn(response.json()["platform"], {"YouTube Shorts", "TikTok", "Instagram", "Reddit"})
+
+    def test_pin_by_id(self):
+        pin = make_pins(4)[3]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("get-pin-by-id", args=[pin.id]))
+        self.assertEqual(response.json()["platform_data"]["post_id"], "p3")
+
+
+class FastPathParityTests(TestCase):
+    """The values() fast path must render exactly what PinSerializer does"""
+
+    def test_rows_render_like_pin_serializer(self):
+        make_pins(8)
+        # Pins made through the API, including one without a platform row
+        self.client.post(reverse("pin-create"), {"link": "https://www.instagram.com/p/xyz/?a=1", "latitude": 1, "longitude": 2})
+        Pin.objects.create(latitude=3, longitude=4)
+
+        renderer = JSONRenderer()
+        for pin in Pin.objects.with_platform():
+            row = Pin.objects.values(*PIN_VALUE_FIELDS).get(id=pin.id)
+            self.assertEqual(renderer.render(serialize_pin_values(row)), renderer.render(PinSerializer(pin).data))
+
+    def test_endpoints_render_like_pin_serializer(self):
+        pin = make_pins(2)[1]
+        expected = JSONRenderer().render(PinSerializer(Pin.objects.with_platform().get(id=pin.id)).data)
+        self.assertEqual(self.client.get(reverse("get-pin-by-id", args=[pin.id])).content, expected)
+
+        Pin.objects.exclude(id=pin.id).update(is_active=False)
+        self.assertEqual(self.client.get(reverse("random-pin")).content, expected)
+
+
+class StreamingPinsTests(TestCase):
+    bounds = {"sw_lat": 50, "sw_lng": -1, "ne_lat": 53, "ne_lng": 1}
+
+    def get_streamed(self, **params):
+        response = self.client.get(reverse("pins-in-bounds"), {**self.bounds, **params})
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_matches_buffered_response(self):
+        make_pins(9)
+        buffered = self.client.get(reverse("pins-in-bounds"), self.bounds).content
+        # Chunks smaller than the result, so several batches are joined
+        with self.settings(PIN_STREAM_CHUNK_SIZE=4):
+            self.assertEqual(self.get_streamed(stream=1), buffered)
+
+    def test_empty_result(self):
+        self.assertEqual(self.get_streamed(stream=1), b"[]")
+
+
+class AntimeridianTests(TestCase):
+    def ids_in(self, sw_lng, ne_lng, **params):
+        bounds = {"sw_lat": -30, "sw_lng": sw_lng, "ne_lat": -10, "ne_lng": ne_lng}
+        response = self.client.get(reverse("pins-in-bounds"), {**bounds, **params})
+        return {pin["id"] for pin in response.json()}
+
+    def test_normalize_bounds(self):
+        self.assertEqual(normalize_bounds(-10, 170, -30, 190), (-30, 170, -10, -170))
+        self.assertEqual(normalize_bounds(-30, 170, -10, -170), (-30, 170, -10, -170))
+        self.assertEqual(normalize_bounds(-95, -540, 95, 540), (-90, -180, 90, 180))
+        self.assertEqual(normalize_bounds(0, 530, 1, 540), (0, 170, 1, 180))
+        self.assertIsNone(normalize_bounds(0, float("nan"), 1, 2))
+
+    def test_box_across_antimeridian(self):
+        east = make_pins(2, latitude=-20, longitude=178.5)
+        west = make_pins(2, latitude=-20, longitude=-178.5)
+        make_pins(2, latitude=-20, longitude=0)
+        expected = {pin.id for pin in east + west}
+
+        # Leaflet's unwrapped form and the wrapped one select the same pins
+        self.assertEqual(self.ids_in(175, 185), expected)
+        self.assertEqual(self.ids_in(175, -175), expected)
+        self.assertEqual(self.ids_in(175, -175, sample=1), expected)
+        self.assertEqual(self.ids_in(-185, -175), expected)
+        self.assertEqual(len(self.ids_in(-900, 900)), 6)
+
+    @override_settings(PIN_BOUNDS_GEOHASH=True)
+    def test_each_side_uses_geohash_ranges(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.ids_in(175, -175)
+        sql = queries[0]["sql"]
+        # Both sides are covered by key ranges: the eastern side starts in
+        # the "r" cells, the western one in the "2" cells
+        self.assertIn("\"geohash\" >= 'r", sql)
+        self.assertIn("\"geohash\" >= '2", sql)
+
+
+class ClusteringTests(TestCase):
+    bounds = {"sw_lat": -60, "sw_lng": -90, "ne_lat": 80, "ne_lng": 150}
+
+    def setUp(self):
+        # At zoom 2 a cell is 22.5 degrees: three pins around London, two
+        # near the Gulf of Guinea and one alone in the Indian Ocean
+        self.london = make_pins(3)
+        self.guinea = make_pins(2, latitude=4, longitude=5)
+        self.lone = make_pins(1, latitude=-30, longitude=100)[0]
+
+    def test_cells_count_and_average_their_pins(self):
+        clusters = sorted(cluster_pins(Pin.objects.all(), 2), key=lambda cluster: -cluster["count"])
+        self.assertEqual([cluster["count"] for cluster in clusters], [3, 2, 1])
+        for cluster, pins in zip(clusters, (self.london, self.guinea, [self.lone])):
+            self.assertAlmostEqual(cluster["latitude"], sum(pin.latitude for pin in pins) / len(pins))
+            self.assertAlmostEqual(cluster["longitude"], sum(pin.longitude for pin in pins) / len(pins))
+        self.assertEqual([cluster["pin_id"] for cluster in clusters], [None, None, self.lone.id])
+
+    def test_clustered_below_the_max_zoom(self):
+        url = reverse("pins-in-bounds")
+        with self.settings(PIN_CLUSTER_MAX_ZOOM=4):
+            clustered = self.client.get(url, {**self.bounds, "zoom": 3}).json()
+            unclustered = self.client.get(url, {**self.bounds, "zoom": 4}).json()
+        self.assertTrue(clustered["clustered"])
+        self.assertEqual(sorted(cluster["count"] for cluster in clustered["clusters"]), [2, 3])
+        self.assertFalse(unclustered["clustered"])
+        self.assertEqual(unclustered["clusters"], [])
+        self.assertEqual(len(unclustered["pins"]), 6)
+
+    def test_lone_pins_are_sent_in_full(self):
+        body = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "zoom": 2}).json()
+        self.assertTrue(body["clustered"])
+        self.assertEqual(body["pins"], [serialize_pin_values(Pin.objects.values(*PIN_VALUE_FIELDS).get(id=self.lone.id))])
+        self.assertEqual(body["pins"][0]["id"], self.lone.id)
+
+        compact = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "zoom": 2, "format": "compact"}).json()
+        self.assertEqual(compact["pins"]["id"], [self.lone.id])
+        self.assertEqual(sorted(compact["clusters"]["count"]), [2, 3])
+
+    def test_invalid_zoom_is_rejected(self):
+        for zoom in ("abc", "-1", "23", "2.5"):
+            response = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "zoom": zoom})
+            self.assertEqual(response.status_code, 400, zoom)
+
+
+class ResultLimitTests(TestCase):
+    bounds = {"sw_lat": 50, "sw_lng": -1, "ne_lat": 53, "ne_lng": 1}
+
+    def test_pages_follow_link_header(self):
+        pins = make_pins(7)
+        seen, params = [], {**self.bounds, "limit": 3}
+        url = reverse("pins-in-bounds")
+        while url:
+            response = self.client.get(url, params)
+            seen += [pin["id"] for pin in response.json()]
+            link = response.get("Link")
+            url, params = (link[1:link.index(">")], {}) if link else (None, None)
+        self.assertEqual(seen, [pin.id for pin in pins])
+
+    def test_limit_is_capped(self):
+        make_pins(5)
+        with self.settings(PIN_BOUNDS_MAX_ROWS=2):
+            response = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "limit": 100})
+        self.assertEqual(len(response.json()), 2)
+        self.assertIn('rel="next"', response["Link"])
+        bad = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "after": "x"})
+        self.assertEqual(bad.status_code, 400)
+
+    @override_settings(PIN_SAMPLE_GRID=2)
+    def test_sample_spreads_over_cells(self):
+        # Ten pins in one cell and one in each of two others; with a 2x2 grid
+        # and a limit of 8, each cell keeps at most its 2 newest pins
+        dense = make_pins(10, latitude=51.6, longitude=-0.5)
+        sparse = make_pins(1, latitude=50.2, longitude=0.5) + make_pins(1, latitude=52.5, longitude=0.5)
+
+        response = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "sample": 1, "limit": 8})
+        ids = {pin["id"] for pin in response.json()}
+        self.assertEqual(ids, {dense[-1].id, dense[-2].id} | {pin.id for pin in sparse})
+
+    def test_sample_never_exceeds_a_small_limit(self):
+        # A pin in each of the 64 cells, and a limit below one per cell
+        for i in range(64):
+            make_pins(1, latitude=50.1 + i // 8 * 0.375, longitude=-0.9 + i % 8 * 0.25)
+        params = {**self.bounds, "sample": 1, "limit": 5}
+        self.assertEqual(len(self.client.get(reverse("pins-in-bounds"), params).json()), 5)
+        response = async_to_sync(self.async_client.get)(reverse("async-pins-in-bounds"), params)
+        self.assertEqual(len(response.json()), 5)
+
+    def test_zoomed_results_fall_back_to_sample(self):
+        make_pins(6)
+        with self.settings(PIN_BOUNDS_MAX_ROWS=4, PIN_SAMPLE_GRID=1):
+            body = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "zoom": 18}).json()
+        self.assertFalse(body["clustered"])
+        self.assertEqual(len(body["pins"]), 4)
+
+
+class CompactFormatTests(TestCase):
+    bounds = {"sw_lat": 50, "sw_lng": -1, "ne_lat": 53, "ne_lng": 1}
+
+    def decode(self, body):
+        """Rebuild (id, latitude, longitude, platform) tuples from a compact body"""
+        pins, ids, last_id = body["pins"], [], 0
+        for delta in pins["id"]:
+            last_id += delta
+            ids.append(last_id)
+        return [
+            (pin_id, lat / body["scale"], lng / body["scale"], body["platforms"][code])
+            for pin_id, lat, lng, code in zip(ids, pins["lat"], pins["lng"], pins["platform"])
+        ]
+
+    def test_matches_full_format(self):
+        make_pins(8)
+        full = self.client.get(reverse("pins-in-bounds"), self.bounds).json()
+        expected = sorted((pin["id"], pin["latitude"], pin["longitude"], pin["platform"]) for pin in full)
+
+        for extra, headers in (({"format": "compact"}, {}), ({}, {"HTTP_ACCEPT": CompactJSONRenderer.media_type})):
+            response = self.client.get(reverse("pins-in-bounds"), {**self.bounds, **extra}, **headers)
+            self.assertEqual(response["Content-Type"], CompactJSONRenderer.media_type)
+            decoded = self.decode(response.json())
+            self.assertEqual([pin[0] for pin in decoded], [pin[0] for pin in expected])
+            self.assertEqual([pin[3] for pin in decoded], [pin[3] for pin in expected])
+            for got, want in zip(decoded, expected):
+                self.assertAlmostEqual(got[1], want[1], places=5)
+                self.assertAlmostEqual(got[2], want[2], places=5)
+
+    @override_settings(PIN_TILE_CACHE_SHARED=True)
+    def test_tile_formats_are_cached_separately(self):
+        make_pins(3)
+        cache.clear()
+        url = reverse("pins-in-tile", args=[8, *tile_for(51.5, -0.12, 8)])
+        full = self.client.get(url)
+        compact = self.client.get(url, {"format": "compact"})
+        self.assertNotEqual(full["ETag"], compact["ETag"])
+        self.assertEqual(len(self.decode(compact.json())), len(full.json()["pins"]))
+        # A cached compact body is never served as JSON, or the other way round
+        self.assertEqual(self.client.get(url).content, full.content)
+        self.assertEqual(self.client.get(url, {"format": "compact"}).content, compact.content)
+
+
+@override_settings(PIN_SYNC_OVERLAP=0)
+class DeltaSyncTests(TestCase):
+    bounds = {"sw_lat": 50, "sw_lng": -1, "ne_lat": 53, "ne_lng": 1}
+
+    def sync(self, since):
+        return self.client.get(reverse("pins-in-bounds"), {**self.bounds, "since": since}).json()
+
+    def test_returns_only_changes_in_box(self):
+        pins = make_pins(3)
+        cursor = self.client.get(reverse("pins-in-bounds"), {**self.bounds, "format": "compact"}).json()["cursor"]
+        self.assertEqual(self.sync(cursor), {"cursor": cursor, "reset": False, "removed": [], "pins": []})
+
+        added = make_pins(1, latitude=52)[0]
+        make_pins(1, latitude=10)  # Outside the box
+        pins[0].is_active = False
+        pins[0].save()
+        deleted_id = pins[1].id
+        pins[1].delete()
+
+        delta = self.sync(cursor)
+        self.assertFalse(delta["reset"])
+        self.assertEqual([pin["id"] for pin in delta["pins"]], [added.id])
+        self.assertEqual(delta["removed"], sorted([pins[0].id, deleted_id]))
+        self.assertEqual(self.sync(delta["cursor"])["pins"], [])
+
+    def test_bulk_deletes_and_moves_are_logged(self):
+        pins = make_pins(3)
+        cursor = self.sync(0)["cursor"]
+
+        with mock.patch("myapp.models.bump_tile_versions") as bump, \
+                self.captureOnCommitCallbacks(execute=True):
+            # As the admin's "delete selected" action does
+            Pin.objects.filter(id=pins[0].id).delete()
+            moved = Pin.objects.get(id=pins[1].id)
+            moved.latitude = 10
+            moved.save()
+        bumped = {call.args for call in bump.call_args_list}
+        self.assertIn((pins[0].latitude, pins[0].longitude), bumped)
+        # Both the old and the new tiles of the moved pin
+        self.assertIn((pins[1].latitude, pins[1].longitude), bumped)
+        self.assertIn((10, pins[1].longitude), bumped)
+
+        delta = self.sync(cursor)
+        self.assertEqual(delta["removed"], sorted([pins[0].id, pins[1].id]))
+
+    def test_failed_resolution_is_logged(self):
+        pin = Pin.objects.create(latitude=51.5, longitude=0, status=PinStatus.PENDING, is_active=False)
+        cursor = self.sync(0)["cursor"]
+        _mark_failed(pin.id, "Could not resolve link")
+        self.assertEqual(self.sync(cursor)["removed"], [pin.id])
+
+    def test_large_delta_forces_reload(self):
+        cursor = self.sync(0)["cursor"]
+        make_pins(4)
+        with self.settings(PIN_BOUNDS_MAX_ROWS=3):
+            self.assertTrue(self.sync(cursor)["reset"])
+        with self.settings(PIN_BOUNDS_MAX_ROWS=4):
+            delta = self.sync(cursor)
+        self.assertFalse(delta["reset"])
+        self.assertEqual(len(delta["pins"]), 4)
+
+    def test_pruned_log_forces_reload(self):
+        make_pins(2)
+        cursor = self.sync(0)["cursor"]
+        make_pins(2)
+        prune_changes(days=0)
+        self.assertEqual(PinChange.objects.count(), 1)
+        self.assertTrue(self.sync(cursor)["reset"])
+
+
+class RandomPinTests(TestCase):
+    def test_only_returns_active_pins(self):
+        pins = make_pins(20)
+        Pin.objects.exclude(id__in=[pins[3].id, pins[17].id]).update(is_active=False)
+
+        seen = {Pin.objects.filter(is_active=True).random().id for _ in range(50)}
+        self.assertEqual(seen, {pins[3].id, pins[17].id})
+
+    def test_empty_table(self):
+        self.assertIsNone(Pin.objects.random())
+
+    def test_no_active_pins(self):
+        make_pins(3)
+        Pin.objects.update(is_active=False)
+        self.assertIsNone(Pin.objects.filter(is_active=True).random())
+
+
+@override_settings(PIN_TILE_CACHE_SHARED=True)
+class PinTileTests(TestCase):
+    def setUp(self):
+        # Tile versions and bodies live in the cache, which outlives each test
+        cache.clear()
+
+    def tile_url(self, lat=51.5, lng=-0.12, z=8):
+        x, y = tile_for(lat, lng, z)
+        return reverse("pins-in-tile", args=[z, x, y])
+
+    def test_tile_bounds_contain_their_points(self):
+        for z in (0, 3, 10, 16):
+            x, y = tile_for(51.5, -0.12, z)
+            sw_lat, sw_lng, ne_lat, ne_lng = tile_bounds(z, x, y)
+            self.assertTrue(sw_lat <= 51.5 <= ne_lat and sw_lng <= -0.12 <= ne_lng)
+
+    def test_revalidation_returns_304_without_queries(self):
+        make_pins(3)
+        response = self.client.get(self.tile_url())
+        self.assertEqual(len(response.json()["pins"]), 3)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.tile_url(), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_new_pin_changes_etag(self):
+        make_pins(1)
+        etag = self.client.get(self.tile_url())["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_pins(1, latitude=51.51)
+        response = self.client.get(self.tile_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["pins"]), 2)
+
+    def test_repeat_request_served_from_cache(self):
+        make_pins(2)
+        first = self.client.get(self.tile_url())
+        hits = tile_cache_stats()["hits"]
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.tile_url())
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(tile_cache_stats()["hits"], hits + 1)
+
+    def test_deactivation_invalidates_cached_tile(self):
+        pin = make_pins(2)[0]
+        self.client.get(self.tile_url())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pin.is_active = False
+            pin.save()
+        response = self.client.get(self.tile_url())
+        self.assertEqual(len(response.json()["pins"]), 1)
+
+    def test_compact_tile_cursor_is_current(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_pins(1)
+        first = self.client.get(self.tile_url(), {"format": "compact"})
+        self.assertNotIn("cursor", first.json())
+
+        # A change elsewhere leaves the cached tile alone but moves the cursor
+        with self.captureOnCommitCallbacks(execute=True):
+            make_pins(1, latitude=-33.9, longitude=151.2)
+        cached = self.client.get(self.tile_url(), {"format": "compact"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(int(cached["X-Pin-Cursor"]), PinChange.objects.latest("id").id)
+        self.assertGreater(int(cached["X-Pin-Cursor"]), int(first["X-Pin-Cursor"]))
+
+    def test_pin_on_a_tile_edge_invalidates_every_tile_serving_it(self):
+        # The corner shared by four tiles at zoom 8
+        z, x, y = 8, *tile_for(51.5, -0.12, 8)
+        sw_lat, sw_lng, _, _ = tile_bounds(z, x, y)
+        corner = [(z, tx, ty) for tx in (x - 1, x) for ty in (y, y + 1)]
+        self.assertEqual(sorted(tiles_containing(sw_lat, sw_lng, z)), sorted((tx, ty) for _, tx, ty in corner))
+
+        urls = [reverse("pins-in-tile", args=tile) for tile in corner]
+        etags = [self.client.get(url)["ETag"] for url in urls]
+        with self.captureOnCommitCallbacks(execute=True):
+            make_pins(1, latitude=sw_lat, longitude=sw_lng)
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["pins"]), 1)
+
+    @override_settings(PIN_TILE_CACHE_SHARED=False)
+    def test_unshared_cache_renders_every_request(self):
+        make_pins(2)
+        first = self.client.get(self.tile_url())
+        self.assertEqual(self.client.get(self.tile_url(), HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+        # Another worker's write bumps nothing here, so the ETag must come
+        # from the body rather than from this process's tile versions
+        cache.clear()
+        make_pins(1, latitude=51.51)
+        response = self.client.get(self.tile_url(), HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["pins"]), 3)
+        self.assertEqual(tile_cache_stats(), {"hits": 0, "misses": 0})
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_version_survives_a_cache_that_keeps_nothing(self):
+        z, x, y = 8, *tile_for(51.5, -0.12, 8)
+        self.assertIsInstance(get_tile_version(z, x, y), int)
+
+    def test_invalid_tile(self):
+        response = self.client.get(reverse("pins-in-tile", args=[3, 8, 0]))
+        self.assertEqual(response.status_code, 400)
+
+
+class CreatePinTests(TestCase):
+    def test_denormalized_columns_match_platform_row(self):
+        response = self.client.post(reverse("pin-create"), {
+            "link": "https://www.youtube.com/shorts/xyz",
+            "latitude": 10,
+            "longitude": 20,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["platform"], "YouTube Shorts")
+
+        pin = Pin.objects.get(id=response.json()["id"])
+        self.assertEqual(pin.platform, "youtube_shorts")
+        self.assertEqual(pin.url, "https://www.youtube.com/shorts/xyz")
+        self.assertEqual(YouTubePin.objects.get(pin=pin).url, pin.url)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        ratelimit._blocked.clear()
+        self.addCleanup(ratelimit._blocked.clear)
+
+    def test_clients_are_limited_before_validation(self):
+        for _ in range(10):
+            self.assertEqual(self.client.post(reverse("pin-create"), {"link": "nonsense"}).status_code, 400)
+        response = self.client.post(reverse("pin-create"), {"link": "nonsense"})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+        # Known offenders cost no queries; the async endpoint shares the budget
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(reverse("async-pin-create"), {"link": "nonsense"}).status_code, 429)
+        # Other clients are unaffected
+        response = self.client.post(reverse("pin-create"), {"link": "nonsense"}, HTTP_X_FORWARDED_FOR="10.0.0.2")
+        self.assertEqual(response.status_code, 400)
+
+    def test_sliding_window(self):
+        # 8 requests late in one window, then the first half of the next one
+        # still carries half of their weight
+        with mock.patch.object(ratelimit.time, "time", return_value=6000 + 59):
+            for _ in range(8):
+                self.assertEqual(ratelimit.check("test", "ip", "10/m"), (False, 0))
+        with mock.patch.object(ratelimit.time, "time", return_value=6060 + 30):
+            results = [ratelimit.check("test", "ip", "10/m")[0] for _ in range(7)]
+        self.assertEqual(results, [False] * 6 + [True])
+        self.assertEqual(ratelimit.parse_rate("100/5m"), (100, 300))
+
+    def test_counter_stores(self):
+        for counters in (ratelimit.DatabaseCounters(), ratelimit.CacheCounters()):
+            cache.clear()
+            counters.hit("test:ip", 99, 60)
+            counters.hit("test:ip", 100, 60)
+            self.assertEqual(counters.hit("test:ip", 100, 60), (2, 1))
+
+        with mock.patch.object(ratelimit.timezone, "now", return_value=timezone.now() + timedelta(hours=1)):
+            self.assertEqual(ratelimit.prune_counters(), 2)
+        self.assertFalse(RateLimitCounter.objects.exists())
+
+    def test_database_counters_without_returning(self):
+        counters = ratelimit.DatabaseCounters()
+        with mock.patch.object(connection.features, "can_return_columns_from_insert", False):
+            counters.hit("test:old", 99, 60)
+            self.assertEqual(counters.hit("test:old", 100, 60), (1, 1))
+        # Both paths count the same rows
+        self.assertEqual(counters.hit("test:old", 100, 60), (2, 1))
+
+    def test_read_limits(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("random-pin")).status_code, 404)
+        with self.settings(RATE_LIMITS={"read": "2/m"}):
+            statuses = [self.client.get(reverse("random-pin")).status_code for _ in range(3)]
+        self.assertEqual(statuses, [404, 404, 429])
+
+
+class LinkClassifierTests(TestCase):
+    # (link path after the host, platform, content ID); None marks short
+    # links that are only resolved later
+    paths = (
+        ("tiktok.com/@some.user/video/7400000000000000001", "tiktok", "7400000000000000001"),
+        ("tiktok.com/@user/photo/7400000000000000002", "tiktok", "7400000000000000002"),
+        ("tiktok.com/t/ZTabc/", "tiktok", None),
+        ("youtube.com/shorts/dQw4w9WgXcQ", "youtube_shorts", ""),
+        ("instagram.com/reel/C1a2B3/", "instagram", "C1a2B3"),
+        ("instagram.com/p/C1a2B3", "instagram", "C1a2B3"),
+        ("reddit.com/r/pics/comments/1abc2d/a_title/", "reddit", "1abc2d"),
+        ("reddit.com/r/pics/s/Xy9Zw", "reddit", None),
+    )
+    hosts = ("", "www.", "WWW.", "m.", "vm.", "old.")
+    suffixes = ("", "?utm_source=share&igsh=MTc4", "#comments", "?a=1#b")
+
+    def test_corpus(self):
+        for (path, platform, content_id), host, suffix, scheme in itertools.product(
+            self.paths, self.hosts, self.suffixes, ("https://", "http://", "HTTPS://")
+        ):
+            link = f"{scheme}{host}{path}{suffix}"
+            with self.subTest(link=link):
+                got_platform, url, got_id = links.classify_link(link)
+                self.assertEqual(got_platform, platform)
+                if content_id is None:
+                    self.assertEqual((url, got_id), (None, None))
+                    continue
+                self.assertEqual(got_id, content_id)
+                # Instagram links lose their share tracking; the rest are kept whole
+                expected_url = link[:len(link) - len(suffix)] if platform == "instagram" else link
+                self.assertEqual(url, expected_url)
+                self.assertEqual(links.resolve_link(platform, link), (url, got_id))
+
+    def test_rejects_platform_names_outside_the_host(self):
+        for link in (
+            "https://example.com/?next=https://www.tiktok.com/@a/video/1",
+            "https://example.com/www.youtube.com/shorts/abc",
+            "https://nottiktok.com/@a/video/1",
+            "https://instagram.com.example.com/p/abc/",
+            "https://www.youtube.com/watch?v=abc",
+            "https://www.reddit.com/r/pics/",
+            "ftp://www.tiktok.com/@a/video/1",
+        ):
+            with self.subTest(link=link):
+                self.assertIsNone(links.classify_link(link))
+
+    def test_missing_content_id(self):
+        with self.assertRaises(links.LinkResolutionError):
+            links.classify_link("https://www.instagram.com/p/?igsh=1")
+        response = self.client.post(reverse("pin-create"), {"link": "https://www.instagram.com/reel/", "check_only": True})
+        self.assertEqual(response.json(), {"error": "Could not extract Instagram shortcode"})
+
+    def test_resolved_short_links(self):
+        with mock.patch("myapp.links.resolve_tiktok_url", return_value="https://www.tiktok.com/@a/video/42?x=1"):
+            self.assertEqual(links.resolve_link("tiktok", "https://vm.tiktok.com/ZMa/"), ("https://www.tiktok.com/@a/video/42?x=1", "42"))
+        with mock.patch("myapp.links.resolve_reddit_url", return_value="https://www.reddit.com/r/pics/comments/9z/"):
+            self.assertEqual(links.resolve_link("reddit", "https://www.reddit.com/r/pics/s/Ab"), ("https://www.reddit.com/r/pics/comments/9z/", "9z"))
+
+
+class ImportPinsTests(TestCase):
+    def import_file(self, suffix, content):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        with mock.patch("myapp.links.resolve_tiktok_url", return_value="https://www.tiktok.com/@a/video/42"), \
+                self.captureOnCommitCallbacks(execute=True):
+            call_command("import_pins", f.name, "--batch-size", "2", stdout=out)
+        return out.getvalue()
+
+    def test_jsonl_import(self):
+        cache.clear()
+        tile_url = reverse("pins-in-tile", args=[8, *tile_for(51.5, -0.12, 8)])
+        self.client.get(tile_url)
+
+        rows = [
+            {"link": "https://www.youtube.com/shorts/abc", "latitude": 51.5, "longitude": -0.12},
+            {"link": "https://vm.tiktok.com/ZMabc123/", "latitude": 51.51, "longitude": -0.12},
+            {"link": "https://www.instagram.com/reel/xyz/", "latitude": 10, "longitude": 20},
+            {"link": "https://example.com/video", "latitude": 10, "longitude": 20},
+            {"link": "https://www.youtube.com/shorts/abc", "latitude": 95, "longitude": 20},
+        ]
+        output = self.import_file(".jsonl", "\n".join(map(json.dumps, rows)) + "\nnot json\n")
+        self.assertIn("Imported 3 pin(s)", output)
+        self.assertIn("Skipped 1 row(s): This platform is not allowed.", output)
+        self.assertIn("Skipped 1 row(s): Invalid row", output)
+
+        tiktok = Pin.objects.get(platform="tiktok")
+        self.assertEqual((tiktok.content_id, tiktok.tiktok_pin.video_id), ("42", "42"))
+        self.assertEqual(InstagramPin.objects.get().shortcode, "xyz")
+        self.assertEqual(PinChange.objects.count(), 3)
+        # Imported pins are found by bounds queries, and stale tiles were dropped
+        self.assertEqual(len(self.client.get(tile_url).json()["pins"]), 2)
+
+    def test_values_too_long_for_their_columns_are_skipped(self):
+        rows = [
+            {"link": "https://www.youtube.com/shorts/ok", "latitude": 1, "longitude": 2},
+            {"link": "https://www.youtube.com/shorts/long?si=" + "x" * 200, "latitude": 1, "longitude": 2},
+            {"link": f"https://www.tiktok.com/@a/video/{'1' * 60}", "latitude": 1, "longitude": 2},
+        ]
+        output = self.import_file(".jsonl", "\n".join(map(json.dumps, rows)))
+        self.assertIn("Imported 1 pin(s)", output)
+        self.assertIn("Skipped 1 row(s): URL too long", output)
+        self.assertIn("Skipped 1 row(s): Content ID too long", output)
+
+    def test_csv_import(self):
+        output = self.import_file(".csv", "link,latitude,longitude\nhttps://www.youtube.com/shorts/a,1,2\n")
+        self.assertIn("Imported 1 pin(s)", output)
+        self.assertEqual(YouTubePin.objects.get().pin.geohash, geohash_encode(1, 2))
+
+
+class PendingPinTests(TestCase):
+    short_link = "https://vm.tiktok.com/ZMabc123/"
+
+    def create(self):
+        return self.client.post(reverse("pin-create"), {
+            "link": self.short_link,
+            "latitude": 10,
+            "longitude": 20,
+        })
+
+    def test_short_link_is_accepted_without_resolving(self):
+        with mock.patch("myapp.links.resolve_tiktok_url") as resolve:
+            response = self.create()
+        resolve.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertFalse(Pin.objects.get(id=response.json()["id"]).is_active)
+
+    def test_resolved_pin_becomes_visible(self):
+        pin_id = self.create().json()["id"]
+        with mock.patch("myapp.links.resolve_tiktok_url", return_value="https://www.tiktok.com/@a/video/42"):
+            resolve_pending_pin(pin_id)
+
+        pin = Pin.objects.get(id=pin_id)
+        self.assertEqual((pin.status, pin.is_active, pin.content_id), (PinStatus.READY, True, "42"))
+        self.assertEqual(TikTokPin.objects.get(pin=pin).video_id, "42")
+
+        # The platform row comes in the same query as the pin
+        with self.assertNumQueries(1):
+            status = self.client.get(reverse("pin-status", args=[pin_id])).json()
+        self.assertEqual(status["pin"]["platform_data"]["video_id"], "42")
+
+    def test_unresolvable_pin_is_marked_failed(self):
+        pin_id = self.create().json()["id"]
+        with mock.patch("myapp.links.resolve_tiktok_url", side_effect=lambda url: url):
+            resolve_pending_pin(pin_id)
+
+        status = self.client.get(reverse("pin-status", args=[pin_id])).json()
+        self.assertEqual(status["status"], "failed")
+        self.assertEqual(status["error"], "Could not extract TikTok content ID")
+        self.assertFalse(Pin.objects.get(id=pin_id).is_active)
+
+
+class AsyncPinApiTests(TestCase):
+    def test_reads_match_sync_views(self):
+        pins = make_pins(4)
+        bounds = {"sw_lat": 51, "sw_lng": -1, "ne_lat": 52, "ne_lng": 1}
+        pairs = [
+            (reverse("pins-in-bounds"), reverse("async-pins-in-bounds"), bounds),
+            (reverse("pins-in-bounds"), reverse("async-pins-in-bounds"), {**bounds, "zoom": 3}),
+            (reverse("get-pin-by-id", args=[pins[3].id]), reverse("async-get-pin-by-id", args=[pins[3].id]), {}),
+        ]
+        for sync_url, async_url, params in pairs:
+            expected = self.client.get(sync_url, params).json()
+            response = async_to_sync(self.async_client.get)(async_url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected)
+
+        response = async_to_sync(self.async_client.get)(reverse("async-random-pin"))
+        self.assertIn(response.json()["id"], [pin.id for pin in pins])
+
+    def test_compact_delta_and_stream_match_sync_views(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_pins(5)
+        bounds = {"sw_lat": 51, "sw_lng": -1, "ne_lat": 52, "ne_lng": 1}
+        get = async_to_sync(self.async_client.get)
+        for params in (
+            {**bounds, "format": "compact"},
+            {**bounds, "format": "compact", "zoom": 3},
+            {**bounds, "since": 0},
+            {**bounds, "since": 0, "format": "compact"},
+        ):
+            expected = self.client.get(reverse("pins-in-bounds"), params)
+            response = get(reverse("async-pins-in-bounds"), params)
+            self.assertEqual(response["Content-Type"], expected["Content-Type"], params)
+            self.assertEqual(response.json(), expected.json(), params)
+        self.assertEqual(get(reverse("async-pins-in-bounds"), {**bounds, "since": "x"}).status_code, 400)
+
+        async def read_stream():
+            response = await self.async_client.get(reverse("async-pins-in-bounds"), {**bounds, "stream": 1, "limit": 3})
+            return response, b"".join([chunk async for chunk in response.streaming_content])
+
+        with self.settings(PIN_STREAM_CHUNK_SIZE=2):
+            response, body = async_to_sync(read_stream)()
+            expected = self.client.get(reverse("pins-in-bounds"), {**bounds, "stream": 1, "limit": 3})
+            self.assertEqual(body, b"".join(expected.streaming_content))
+        self.assertEqual(response["Link"], expected["Link"].replace("/api/pins/", "/api/async/pins/"))
+
+    def test_create_pin_checks_csrf(self):
+        client = self.async_client_class(enforce_csrf_checks=True)
+        response = async_to_sync(client.post)(reverse("async-pin-create"), {"link": "https://example.com/x"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_create_pin(self):
+        post = async_to_sync(self.async_client.post)
+        response = post(reverse("async-pin-create"), {
+            "link": "https://www.instagram.com/reel/abc/?igsh=1",
+            "latitude": 10,
+            "longitude": 20,
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["shortcode"], "abc")
+        self.assertTrue(Pin.objects.filter(id=response.json()["id"], content_id="abc").exists())
+
+        with mock.patch("myapp.links.resolve_tiktok_url") as resolve:
+            response = post(reverse("async-pin-create"), {
+                "link": "https://vm.tiktok.com/ZMasync/",
+                "latitude": 10,
+                "longitude": 20,
+            })
+        resolve.assert_not_called()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+
+        response = post(reverse("async-pin-create"), {"link": "https://example.com/x"})
+        self.assertEqual(response.json(), {"error": "This platform is not allowed."})
+
+
+class ResolvedLinkCacheTests(TestCase):
+    short_link = "https://vm.tiktok.com/ZMcache/"
+    full_link = "https://www.tiktok.com/@a/video/7"
+
+    def setUp(self):
+        links._resolved_links.clear()
+
+    def test_resolves_each_link_once(self):
+        with mock.patch("myapp.links._fetch_tiktok_url", return_value=self.full_link) as fetch:
+            self.assertEqual(links.resolve_tiktok_url(self.short_link), self.full_link)
+            self.assertEqual(links.resolve_tiktok_url(self.short_link), self.full_link)
+        fetch.assert_called_once()
+
+    def test_database_entry_survives_process_cache(self):
+        with mock.patch("myapp.links._fetch_tiktok_url", return_value=self.full_link):
+            links.resolve_tiktok_url(self.short_link)
+        links._resolved_links.clear()
+
+        with mock.patch("myapp.links._fetch_tiktok_url") as fetch:
+            self.assertEqual(links.resolve_tiktok_url(self.short_link), self.full_link)
+        fetch.assert_not_called()
+
+    def test_failures_are_cached_then_retried(self):
+        with mock.patch("myapp.links._fetch_tiktok_url", side_effect=lambda url: url) as fetch:
+            with self.assertRaises(links.LinkResolutionError):
+                links.resolve_link("tiktok", self.short_link)
+            self.assertEqual(links.resolve_tiktok_url(self.short_link), self.short_link)
+        fetch.assert_called_once()
+        self.assertTrue(ResolvedLink.objects.get(short_url=self.short_link).failed)
+
+        # Once the failure TTL has passed, the link is tried again
+        links._resolved_links.clear()
+        with self.settings(RESOLVED_LINK_FAILURE_TTL=0):
+            with mock.patch("myapp.links._fetch_tiktok_url", return_value=self.full_link) as fetch:
+                self.assertEqual(links.resolve_tiktok_url(self.short_link), self.full_link)
+        fetch.assert_called_once()
+
+
+class GeoIPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        geoip._locations.clear()
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write(
+                "network,geoname_id,latitude,longitude\n"
+                "81.2.69.0/24,1,51.5,-0.1\n"
+                "81.2.70.0/23,2,52.0,1.0\n"
+                "89.160.20.0/24,3,,\n"
+                "2001:db8:1::/48,4,10.0,20.0\n"
+            )
+        self.addCleanup(os.remove, f.name)
+        self.database = geoip.CIDRDatabase([f.name])
+
+    def remote_response(self, lat=1.0, lng=2.0):
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"latitude": lat, "longitude": lng}
+        return response
+
+    def test_database_ranges(self):
+        lookup = lambda ip: self.database.lookup(ipaddress.ip_address(ip))
+        self.assertEqual(lookup("81.2.69.0"), (51.5, -0.1))
+        self.assertEqual(lookup("81.2.69.255"), (51.5, -0.1))
+        self.assertEqual(lookup("81.2.71.255"), (52.0, 1.0))
+        self.assertIsNone(lookup("81.2.68.255"))
+        self.assertIsNone(lookup("81.2.72.0"))
+        self.assertIsNone(lookup("89.160.20.1"))  # Listed without coordinates
+        self.assertEqual(lookup("2001:db8:1:ffff::1"), (10.0, 20.0))
+        self.assertIsNone(lookup("2001:db8:2::1"))
+
+    def test_remote_is_only_a_rate_limited_fallback(self):
+        providers = [self.database, geoip.RemoteAPI()]
+        with mock.patch.object(geoip, "_providers", providers), \
+                mock.patch.object(outbound, "get", return_value=self.remote_response()) as get, \
+                self.settings(GEOIP_REMOTE_RATE=2):
+            self.assertEqual(geoip.locate("81.2.69.7"), (51.5, -0.1))
+            self.assertEqual(geoip.locate("8.8.8.8"), (1.0, 2.0))
+            self.assertEqual(geoip.locate("8.8.4.4"), (1.0, 2.0))
+            self.assertIsNone(geoip.locate("1.1.1.1"))
+            self.assertEqual(get.call_count, 2)
+
+            # Remote answers are shared through the Django cache
+            geoip._locations.clear()
+            self.assertEqual(geoip.locate("8.8.8.8"), (1.0, 2.0))
+            self.assertEqual(get.call_count, 2)
+
+    def test_private_and_invalid_addresses(self):
+        with mock.patch.object(outbound, "get") as get:
+            for ip in ("127.0.0.1", "::1", "10.1.2.3", "192.168.0.1", "not an ip", None):
+                self.assertIsNone(geoip.locate(ip))
+        get.assert_not_called()
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.staff = get_user_model().objects.create_user("ops", password="secret", is_staff=True)
+
+    def test_only_staff_can_read(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+    def test_requests_are_timed_and_counted(self):
+        Pin.objects.create(latitude=51.5, longitude=-0.1, platform="tiktok", url="https://www.tiktok.com/@a/video/1")
+        bounds = {"sw_lat": 50, "sw_lng": -1, "ne_lat": 52, "ne_lng": 1}
+        self.client.get(reverse("pins-in-bounds"), bounds)
+        self.client.get(reverse("async-pins-in-bounds"), bounds)
+        self.client.get(reverse("get-pin-by-id", args=[0]))
+
+        self.client.force_login(self.staff)
+        text = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('foryoupage_http_requests_total{view="pins-in-bounds",status="200"} 1', text)
+        self.assertIn('foryoupage_http_requests_total{view="async-pins-in-bounds",status="200"} 1', text)
+        self.assertIn('foryoupage_http_requests_total{view="get-pin-by-id",status="404"} 1', text)
+        self.assertIn('foryoupage_http_request_duration_seconds_count{view="pins-in-bounds"} 1', text)
+        self.assertIn('foryoupage_http_request_duration_seconds_bucket{view="pins-in-bounds",le="+Inf"} 1', text)
+        # One query each, including the one the async view runs in a thread
+        self.assertIn('foryoupage_db_queries_total{view="pins-in-bounds"} 1', text)
+        self.assertIn('foryoupage_db_queries_total{view="async-pins-in-bounds"} 1', text)
+
+    def test_cache_lookups_are_counted(self):
+        geoip._locations.clear()
+        with mock.patch.object(geoip, "_providers", []):
+            geoip.locate("81.2.69.7")
+            geoip.locate("81.2.69.7")
+        text = metrics.render()
+        self.assertIn('foryoupage_cache_requests_total{cache="geoip",result="hit"} 1', text)
+        self.assertIn('foryoupage_cache_requests_total{cache="geoip",result="miss"} 1', text)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_case_is_measured(self):
+        results = benchmarks.bench_suite(io.StringIO(), [60], 3, distribution="clustered")
+        self.assertEqual(len(results), 10)
+        for row in results:
+            self.assertEqual(row["errors"], 0, row["case"])
+            self.assertEqual(row.get("upstream_calls", 0), 0, row["case"])
+            self.assertLessEqual(row["p50_ms"], row["p95_ms"])
+            self.assertLessEqual(row["p95_ms"], row["p99_ms"])
+        json.dumps(results)
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep the connection open between requests
+    client_ports = []
+
+    def do_GET(self):
+        self.client_ports.append(self.client_address[1])
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class OutboundHttpTests(TestCase):
+    def setUp(self):
+        KeepAliveHandler.client_ports = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def test_connections_are_reused(self):
+        for _ in range(5):
+            self.assertEqual(outbound.get(self.url).status_code, 200)
+        # Every request arrived over the same client socket
+        self.assertEqual(len(KeepAliveHandler.client_ports), 5)
+        self.assertEqual(len(set(KeepAliveHandler.client_ports)), 1)
+
+    def test_calls_are_timed_by_host(self):
+        metrics.reset()
+        outbound.get(self.url)
+        self.assertIn('foryoupage_outbound_request_duration_seconds_count{host="127.0.0.1"} 1', metrics.render())
+
+    def test_per_host_timeouts(self):
+        with self.settings(OUTBOUND_HTTP_TIMEOUTS={"freeipapi.com": 1.5}, OUTBOUND_HTTP_TIMEOUT=4):
+            self.assertEqual(outbound.timeout_for("https://freeipapi.com/api/json/1.2.3.4"), 1.5)
+            self.assertEqual(outbound.timeout_for("https://vm.tiktok.com/x/"), 4)
+
+
+
+class LoadTestTests(TestCase):
+    def setUp(self):
+        self.stubs = loadtest.upstream_stub_server()
+        threading.Thread(target=self.stubs.serve_forever, daemon=True).start()
+        self.addCleanup(self.stubs.server_close)
+        self.addCleanup(self.stubs.shutdown)
+        self.stub_url = f"http://127.0.0.1:{self.stubs.server_port}"
+
+    def test_outbound_calls_go_to_the_stubs(self):
+        with self.settings(OUTBOUND_HTTP_STUB_URL=self.stub_url), \
+                mock.patch.object(outbound, "_adapter", None), mock.patch.object(outbound, "_session", None):
+            resolved = links._fetch_tiktok_url("https://vm.tiktok.com/ZMabc/")
+            self.assertEqual(links.classify_link(resolved)[0], "tiktok")
+            self.assertTrue(resolved.startswith("https://www.tiktok.com/@stub/video/"))
+            self.assertIn("latitude", outbound.get("https://freeipapi.com/api/json/8.8.8.8").json())
+
+    def test_record_and_replay(self):
+        with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as f:
+            self.addCleanup(os.remove, f.name)
+        with self.settings(REQUEST_LOG_PATH=f.name):
+            self.client.get(reverse("random-pin"))
+            self.client.post(reverse("pin-create"), {"link": "https://www.youtube.com/shorts/abc", "latitude": 1, "longitude": 2})
+            self.client.get(reverse("map"))
+        with open(f.name) as stream:
+            entries = loadtest.read_log(stream)
+        self.assertEqual([entry["method"] for entry in entries], ["GET", "POST"])
+        self.assertIn("shorts", entries[1]["body"])
+
+        # The stub server answers any path, so it can stand in for the app
+        results = loadtest.replay(entries * 5, self.stub_url, concurrency=3, speedup=0)
+        self.assertEqual(sorted(results), ["pin-create", "random-pin"])
+        self.assertEqual(results["pin-create"]["statuses"], {200: 5})
+        self.assertEqual(len(results["random-pin"]["latencies"]), 5)
+
+
+class StartupTests(TestCase):
+    def test_read_path_does_not_import_praw(self):
+        # A fresh interpreter, since this test process may already have PRAW loaded
+        probe = (
+            "import sys, django; django.setup(); "
+            "import myapp.views, myapp.urls; "
+            "print('praw' in sys.modules or 'prawcore' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+    def test_reddit_client_is_built_once(self):
+        self.assertIs(links.get_reddit(), links.get_reddit())
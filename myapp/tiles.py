@@ -0,0 +1,165 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Web Mercator stops short of the poles; the edge tiles absorb the rest
+MERCATOR_MAX_LAT = 85.0511287798
+
+
+# ----------------------------
+# Tile geometry
+# ----------------------------
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= settings.PIN_TILE_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+def _tile_lat(y, n):
+    """Latitude of the northern edge of tile row `y` out of `n`"""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+def tile_bounds(z, x, y):
+    """Return (sw_lat, sw_lng, ne_lat, ne_lng) of a slippy-map tile"""
+    n = 2 ** z
+    ne_lat = 90.0 if y == 0 else _tile_lat(y, n)
+    sw_lat = -90.0 if y == n - 1 else _tile_lat(y + 1, n)
+    sw_lng = x / n * 360.0 - 180.0
+    ne_lng = (x + 1) / n * 360.0 - 180.0
+    return sw_lat, sw_lng, ne_lat, ne_lng
+
+def tile_for(lat, lng, z):
+    """Return the (x, y) of the tile containing a coordinate at zoom `z`"""
+    n = 2 ** z
+    lat = max(-MERCATOR_MAX_LAT, min(MERCATOR_MAX_LAT, lat))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_containing(lat, lng, z):
+    """
+    Every tile at zoom `z` whose bounds contain a coordinate: the tile_for()
+    tile, plus its neighbours when the coordinate lies on a shared edge. Tile
+    queries include their edges, so such a pin is served by all of them.
+    """
+    n = 2 ** z
+    x, y = tile_for(lat, lng, z)
+    tiles = []
+    for tx in range(max(x - 1, 0), min(x + 2, n)):
+        for ty in range(max(y - 1, 0), min(y + 2, n)):
+            sw_lat, sw_lng, ne_lat, ne_lng = tile_bounds(z, tx, ty)
+            if (tx, ty) == (x, y) or (sw_lat <= lat <= ne_lat and sw_lng <= lng <= ne_lng):
+                tiles.append((tx, ty))
+    return tiles
+
+
+# ----------------------------
+# Tile versions
+# ----------------------------
+
+def versions_shared():
+    """
+    Whether tile versions and cached bodies are seen by every worker. A
+    write bumps versions only in the cache of the worker that handled it,
+    so a per-process cache would leave the others serving stale tiles.
+    """
+    return settings.PIN_TILE_CACHE_SHARED
+
+# Lower bound for every tile version, raised to expire all tiles at once
+VERSION_FLOOR_KEY = "pin_tile_version_floor"
+
+def _version_key(z, x, y):
+    return f"pin_tile_version_{z}_{x}_{y}"
+
+def _new_version():
+    # Microseconds since the epoch: a version that also serves as Last-Modified
+    # and never repeats after a cache eviction or restart
+    return time.time_ns() // 1000
+
+def get_tile_version(z, x, y):
+    """
+    Current version of a tile. A tile with no recorded version (never
+    written, or evicted from the cache) is treated as modified now, and no
+    tile is older than the last invalidate_all_tiles().
+    """
+    key = _version_key(z, x, y)
+    found = cache.get_many([key, VERSION_FLOOR_KEY])
+    version = found.get(key)
+    if version is None:
+        new_version = _new_version()
+        cache.add(key, new_version, None)
+        # Evicted straight away, or a cache that keeps nothing
+        version = cache.get(key) or new_version
+    return max(version, found.get(VERSION_FLOOR_KEY, 0))
+
+def bump_tile_versions(lat, lng):
+    """
+    Give every tile containing the coordinate a new version and drop the
+    cached responses rendered for the old ones.
+    """
+    tiles = [
+        (z, *tile)
+        for z in range(settings.PIN_TILE_MAX_ZOOM + 1)
+        for tile in tiles_containing(lat, lng, z)
+    ]
+    old_versions = cache.get_many([_version_key(*tile) for tile in tiles])
+
+    cache.delete_many([
+        _body_key(*tile, old_versions[_version_key(*tile)], fmt)
+        for tile in tiles
+        if _version_key(*tile) in old_versions
+        for fmt in TILE_FORMATS
+    ])
+
+    version = _new_version()
+    cache.set_many({_version_key(*tile): version for tile in tiles}, None)
+
+def invalidate_all_tiles():
+    """
+    Give every tile a new version with one cache write, for bulk changes
+    that touch too many tiles to bump one by one. Bodies rendered before
+    are no longer served and expire with PIN_TILE_CACHE_TIMEOUT.
+    """
+    cache.set(VERSION_FLOOR_KEY, _new_version(), None)
+
+
+# ----------------------------
+# Tile response cache
+# ----------------------------
+
+# Every representation a tile is rendered in (see views.requested_format)
+TILE_FORMATS = ("json", "compact")
+
+HITS_KEY = "pin_tile_cache_hits"
+MISSES_KEY = "pin_tile_cache_misses"
+
+def _body_key(z, x, y, version, fmt):
+    # The version is part of the key, so a bumped tile can never be served
+    # from a body rendered before the change
+    return f"pin_tile_body_{fmt}_{z}_{x}_{y}_{version}"
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First event since the counter was created or evicted
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+def get_cached_tile(z, x, y, version, fmt="json"):
+    """Return the pre-rendered body for a tile version in a format, or None"""
+    if not settings.PIN_TILE_CACHE_TIMEOUT or not versions_shared():
+        return None
+    body = cache.get(_body_key(z, x, y, version, fmt))
+    _count(MISSES_KEY if body is None else HITS_KEY)
+    return body
+
+def cache_tile(z, x, y, version, body, fmt="json"):
+    if settings.PIN_TILE_CACHE_TIMEOUT and versions_shared():
+        cache.set(_body_key(z, x, y, version, fmt), body, settings.PIN_TILE_CACHE_TIMEOUT)
+
+def tile_cache_stats():
+    """Hit/miss counters of the tile response cache"""
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": counts.get(HITS_KEY, 0), "misses": counts.get(MISSES_KEY, 0)}
@@ -1,13 +1,22 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('', views.map_view, name='map'),
     path('api/pins/create/', views.create_pin, name='pin-create'),
     path('api/pins/in_bounds/', views.pins_in_bounds, name='pins-in-bounds'),
+    path('api/pins/tiles/<int:z>/<int:x>/<int:y>/', views.pins_in_tile, name='pins-in-tile'),
     path('privacy-policy/', views.privacy_policy, name='privacy_policy'),
     path('terms-and-conditions/', views.terms_and_conditions, name='terms_and_conditions'),
     path('api/pins/random/', views.random_pin, name='random-pin'),
     path('reddit/auth/callback', views.reddit_auth_callback, name='reddit_auth_callback'),
     path('api/pins/<int:pin_id>/', views.get_pin_by_id, name='get-pin-by-id'),
+    path('api/pins/<int:pin_id>/status/', views.pin_status, name='pin-status'),
+    path('metrics/', views.metrics_view, name='metrics'),
+
+    # Async variants of the pin API, for ASGI deployments
+    path('api/async/pins/create/', async_views.create_pin, name='async-pin-create'),
+    path('api/async/pins/in_bounds/', async_views.pins_in_bounds, name='async-pins-in-bounds'),
+    path('api/async/pins/random/', async_views.random_pin, name='async-random-pin'),
+    path('api/async/pins/<int:pin_id>/', async_views.get_pin_by_id, name='async-get-pin-by-id'),
 ]
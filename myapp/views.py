@@ -1,180 +1,195 @@
 from django.shortcuts import render
-from django.contrib.auth.decorators import login_required
-from .models import Pin, YouTubePin, TikTokPin, InstagramPin, RedditPin
-import re
-import random, requests
-from rest_framework import generics
+from django.contrib.admin.views.decorators import staff_member_required
+from .models import Pin, PinStatus, PLATFORM_MODELS
+import random
+from functools import wraps
+from django.db import transaction
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from .serializers import PinSerializer
-from django.core.cache import cache
-from django_ratelimit.decorators import ratelimit
-from datetime import datetime
-from django.core.validators import URLValidator
-from django.core.exceptions import ValidationError
-from urllib.parse import urlparse, urlunparse
-import praw
-from prawcore.exceptions import ResponseException, ServerError
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from django.http import HttpResponse, StreamingHttpResponse
+from .renderers import CompactJSONRenderer
+from .serializers import (
+    COMPACT_PIN_FIELDS,
+    COMPACT_PLATFORMS,
+    COMPACT_SCALE,
+    PIN_VALUE_FIELDS,
+    PinSerializer,
+    compact_clusters,
+    compact_pin_values,
+    serialize_pin_values,
+    stream_pin_values,
+)
+from .geo import cluster_pins, normalize_bounds, pins_in_bbox, sample_pins, should_cluster
+from .tiles import cache_tile, get_cached_tile, get_tile_version, is_valid_tile, tile_bounds, versions_shared
+from datetime import datetime, timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, set_response_etag
+from django.views.decorators.http import condition
 from django.conf import settings
-
-
-reddit = praw.Reddit(
-    client_id=settings.REDDIT_CLIENT_ID,
-    client_secret=settings.REDDIT_CLIENT_SECRET,
-    user_agent=settings.REDDIT_USER_AGENT
+from .links import (
+    LinkResolutionError,
+    classify_link,
+    validate_and_sanitize_url,
 )
-
-ALLOWED_PLATFORMS = {
-    "tiktok": r"(?:www\.|vm\.|vt\.)?tiktok\.com/",
-    "youtube_shorts": r"(?:www\.|m\.)?youtube\.com/shorts/",
-    "instagram": r"(?:www\.)?instagram\.com/(p|reel)/",
-    "reddit": r"(?:www\.)?reddit\.com/r/[^/]+/(comments|s)/[^/]+/?",
-}
+from .ratelimit import rate_limited
+from .resolution import enqueue_pin
+from .sync import latest_change_id, pin_changes
+from . import metrics
 
 
 # ----------------------------
 # Utilities
 # ----------------------------
 
-def clean_instagram_url(url):
-    """Remove query parameters from Instagram URL to get the base URL"""
-    
-    # Parse the URL
-    parsed_url = urlparse(url)
-    
-    # Reconstruct the URL without query parameters and fragment
-    clean_url = urlunparse((
-        parsed_url.scheme,  # scheme
-        parsed_url.netloc,  # netloc
-        parsed_url.path,    # path
-        '',                 # params
-        '',                 # query
-        ''                  # fragment
-    ))
-    
-    return clean_url
-
-def extract_instagram_shortcode(url):
-    """Extract Instagram shortcode from URL"""
-    # First clean the URL to remove query parameters
-    clean_url = clean_instagram_url(url)
-    
-    # Now extract the shortcode
-    match = re.search(r'instagram\.com/(p|reel)/([^/?]+)', clean_url)
-    if match:
-        return match.group(2)  # Return the shortcode
-    return None
-
-def resolve_tiktok_url(url):
+def parse_bounds(params):
     """
-    Resolve shortened TikTok URLs to their full URLs
-    Returns the full URL or the original URL if resolution fails
+    Normalized (sw_lat, sw_lng, ne_lat, ne_lng) from query parameters, or
+    None if invalid. sw_lng > ne_lng means the box crosses the antimeridian.
     """
     try:
-        # Make a HEAD request to follow redirects
-        response = requests.get(url, allow_redirects=True, timeout=5)
-        final_url = response.url
-        
-        # Verify it's a TikTok URL
-        if 'tiktok.com' in final_url:
-            return final_url
-        return url
-    except requests.exceptions.RequestException:
-        return url
-
-def resolve_reddit_url(url):
+        bounds = (float(params.get(key)) for key in ("sw_lat", "sw_lng", "ne_lat", "ne_lng"))
+        return normalize_bounds(*bounds)
+    except (TypeError, ValueError):
+        return None
+
+def parse_zoom(value):
+    """A map zoom level from a query parameter, or None if invalid"""
+    try:
+        zoom = int(value)
+    except ValueError:
+        return None
+    return zoom if 0 <= zoom <= 22 else None
+
+# Pin list endpoints can also answer in the compact columnar format
+PIN_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, CompactJSONRenderer]
+
+def requested_format(request):
     """
-    Resolve shortened Reddit URLs to their full URLs using PRAW
-    Returns the full URL or the original URL if resolution fails
+    "compact" when the client asked for the compact pin format (by query
+    parameter or Accept header), else "json". Unlike DRF's negotiation this
+    also works before the view runs, for ETags.
     """
-    try:
-        # Extract submission info
-        submission = reddit.submission(url=url)
-        full_url = f"https://www.reddit.com/r/{submission.subreddit.display_name}/comments/{submission.id}/"
-        return full_url
-
-    except (ResponseException, ServerError) as e:
-        return url
-    except Exception as e:
-        return url
-
-def extract_tiktok_video_id(url):
-    """Extract TikTok video/photo ID from URL"""
-    # If it's a shortened URL, resolve it first
-    if 'vm.tiktok.com' in url or 'vt.tiktok.com' in url:
-        url = resolve_tiktok_url(url)
-    
-    # Extract content ID from both video and photo URL formats
-    match = re.search(r'tiktok\.com/@[^/]+/(video|photo)/(\d+)', url)
-    if match:
-        return match.group(2)  # Return the ID part
-    
-    return None
+    accept = request.META.get("HTTP_ACCEPT", "")
+    if request.GET.get("format") == CompactJSONRenderer.format or CompactJSONRenderer.media_type in accept:
+        return CompactJSONRenderer.format
+    return "json"
 
-def validate_and_sanitize_url(url):
-    """Validate and sanitize URL to prevent security issues"""
-    validator = URLValidator()
+def parse_page(params):
+    """(after, limit) keyset paging parameters, or None if invalid"""
     try:
-        validator(url)
-    except ValidationError:
-        return False
-    
-    # Additional security checks
-    if not url.startswith(('http://', 'https://')):
-        return False
-    
-    return True
+        after = int(params.get("after", 0))
+        limit = int(params.get("limit", settings.PIN_BOUNDS_MAX_ROWS))
+    except ValueError:
+        return None
+    if limit < 1:
+        return None
+    return after, min(limit, settings.PIN_BOUNDS_MAX_ROWS)
+
+def next_page_link(request, after):
+    """RFC 8288 Link header value pointing at the page after pin id `after`"""
+    params = request.GET.copy()
+    params["after"] = after
+    return f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+
+def limited_rows(pins, bounds, fields):
+    """
+    Pin rows for a map view, at most PIN_BOUNDS_MAX_ROWS of them: when the
+    box holds more, an even spatial sample (see sample_pins)
+    """
+    limit = settings.PIN_BOUNDS_MAX_ROWS
+    rows = list(pins.values(*fields)[:limit + 1])
+    if len(rows) > limit:
+        rows = list(sample_pins(pins, *bounds, limit).values(*fields))
+    return rows
+
+def compact_pins_data(rows):
+    """Compact body for Pin.values(*COMPACT_PIN_FIELDS) rows"""
+    return {
+        "scale": COMPACT_SCALE,
+        "platforms": COMPACT_PLATFORMS,
+        "pins": compact_pin_values(rows),
+    }
 
-def get_link_platform(link):
-    platform_detected = None
-    for name, pattern in ALLOWED_PLATFORMS.items():
-        if re.search(pattern, link, re.IGNORECASE):
-            platform_detected = name
-            break
-    
-    return platform_detected
+def split_clusters(pins, zoom, fields):
+    """
+    cluster_pins() cells of more than one pin, and Pin.values(*fields) rows
+    of the pins alone in their cell, which are shown as they are
+    """
+    clusters, lone_ids = [], []
+    for cluster in cluster_pins(pins, zoom):
+        pin_id = cluster.pop("pin_id")
+        if pin_id is None:
+            clusters.append(cluster)
+        else:
+            lone_ids.append(pin_id)
+    rows = list(pins.filter(id__in=lone_ids).values(*fields)) if lone_ids else []
+    return clusters, rows
+
+def zoomed_pins_data(pins, zoom, bounds, compact=False):
+    """Response body for a zoom-aware request: clusters when zoomed out, else pins"""
+    clustered = should_cluster(zoom)
+    if compact:
+        if clustered:
+            clusters, rows = split_clusters(pins, zoom, COMPACT_PIN_FIELDS)
+        else:
+            clusters, rows = [], limited_rows(pins, bounds, COMPACT_PIN_FIELDS)
+        return {
+            "clustered": clustered,
+            "zoom": zoom,
+            "clusters": compact_clusters(clusters),
+            **compact_pins_data(rows),
+        }
 
-def get_client_ip(_, request):
-    """Get client IP"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
+    if clustered:
+        clusters, rows = split_clusters(pins, zoom, PIN_VALUE_FIELDS)
     else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+        # Pins are answered from the Pin table alone, without building model instances
+        clusters, rows = [], limited_rows(pins, bounds, PIN_VALUE_FIELDS)
+    return {
+        "clustered": clustered,
+        "zoom": zoom,
+        "clusters": clusters,
+        "pins": [serialize_pin_values(row) for row in rows],
+    }
 
-def ip_to_location(ip):
-    london_lat, london_lon = 51.5074, -0.1278
+def pin_changes_data(bounds, since, compact=False):
+    """Response body for a delta sync: pins added or changed, and ids removed"""
+    cursor, reset, active, removed = pin_changes(bounds, since)
+    data = {"cursor": cursor, "reset": reset, "removed": removed}
+    if compact:
+        data.update(compact_pins_data(active.values(*COMPACT_PIN_FIELDS)))
+    else:
+        data["pins"] = [serialize_pin_values(row) for row in active.values(*PIN_VALUE_FIELDS)]
+    return data
 
-    if ip in ("127.0.0.1", "::1"):
-        return london_lat, london_lon
-    
-    # Check cache first
-    cache_key = f"ip_location_{ip}"
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        return cached_result
+def tile_etag(request, z, x, y):
+    if not is_valid_tile(z, x, y) or not versions_shared():
+        return None
+    return f'"{z}-{x}-{y}-{get_tile_version(z, x, y)}-{requested_format(request)}"'
 
-    # 60 requests/minute (~2.59M/month)
-    url = f"https://freeipapi.com/api/json/{ip}"
+def tile_last_modified(request, z, x, y):
+    if not is_valid_tile(z, x, y) or not versions_shared():
+        return None
+    return datetime.fromtimestamp(get_tile_version(z, x, y) / 1_000_000, tz=timezone.utc)
 
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-
-        if 'latitude' in data and 'longitude' in data:
-            result = (float(data['latitude']), float(data['longitude']))
-             # Cache for 24 hours
-            cache.set(cache_key, result, 86400)
-            return result
-        
-    except requests.exceptions.RequestException:
-        pass
-    except Exception:
-        pass
-
-    return london_lat, london_lon
+def with_sync_cursor(view):
+    """
+    Send the current change log cursor with compact responses, on 304s too,
+    in an X-Pin-Cursor header. Cached tile bodies outlive any cursor written
+    into them, so the cursor is never part of the body.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if requested_format(request) != CompactJSONRenderer.format:
+            return view(request, *args, **kwargs)
+        # Read before the tile version and pins, so a delta from this cursor
+        # misses nothing the response lacks
+        cursor = latest_change_id()
+        response = view(request, *args, **kwargs)
+        response["X-Pin-Cursor"] = str(cursor)
+        return response
+    return wrapper
 
 def jitter_coordinate(lat, lon, max_offset=0.02):
     """Scatter pins slightly so they don't overlap exactly"""
@@ -183,251 +198,314 @@ def jitter_coordinate(lat, lon, max_offset=0.02):
     return jitter_lat, jitter_lon
 
 
+PLATFORM_NAMES = {
+    "youtube_shorts": "YouTube Shorts",
+    "tiktok": "TikTok",
+    "instagram": "Instagram",
+    "reddit": "Reddit"
+}
+
+LOCATION_REGIONS = [
+    {"name": "North America", "weight": 7, "min_lat": 15, "max_lat": 75, "min_lon": -170, "max_lon": -50},
+    {"name": "Europe", "weight": 6, "min_lat": 35, "max_lat": 70, "min_lon": -10, "max_lon": 40},
+    {"name": "Asia", "weight": 10, "min_lat": -10, "max_lat": 55, "min_lon": 40, "max_lon": 150},
+    {"name": "Africa", "weight": 4, "min_lat": -35, "max_lat": 35, "min_lon": -20, "max_lon": 50},
+    {"name": "South America", "weight": 3, "min_lat": -55, "max_lat": 15, "min_lon": -90, "max_lon": -35},
+    {"name": "Oceania", "weight": 2, "min_lat": -50, "max_lat": 0, "min_lon": 110, "max_lon": 180},
+]
+
+def random_location():
+    """A random point, with regions weighted roughly by population"""
+    total_weight = sum(region["weight"] for region in LOCATION_REGIONS)
+    r = random.uniform(0, total_weight)
+    cumulative_weight = 0
+    selected_region = None
+    
+    for region in LOCATION_REGIONS:
+        cumulative_weight += region["weight"]
+        if r <= cumulative_weight:
+            selected_region = region
+            break
+    
+    lat = random.uniform(selected_region["min_lat"], selected_region["max_lat"])
+    lon = random.uniform(selected_region["min_lon"], selected_region["max_lon"])
+    return lat, lon
+
+def check_pin_link(link):
+    """
+    Return ((platform, canonical_url, content_id), None) for a valid link (see
+    links.classify_link), or (None, error message)
+    """
+    if not link:
+        return None, "Link is required"
+    
+    # Validate URL format
+    if not validate_and_sanitize_url(link):
+        return None, "Invalid URL format"
+
+    try:
+        link_info = classify_link(link)
+    except LinkResolutionError as e:
+        return None, str(e)
+    if link_info is None:
+        return None, "This platform is not allowed."
+    return link_info, None
+
+def requested_location(data):
+    """The (lat, lon) a pin was submitted for, or None if it is missing"""
+    location_type = data.get("location_type", "selected")
+    
+    if location_type == "random":
+        return random_location()
+
+    # Use provided coordinates
+    client_lat = data.get("latitude")
+    client_lon = data.get("longitude")
+    
+    if not client_lat or not client_lon:
+        return None
+    
+    return float(client_lat), float(client_lon)
+
+def pending_pin_data(pin):
+    return {
+        "id": pin.id,
+        "latitude": pin.latitude,
+        "longitude": pin.longitude,
+        "created_at": pin.created_at,
+        "status": pin.status,
+        "platform": pin.get_platform_display()
+    }
+
+def created_pin_data(pin):
+    serializer_data = {
+        "id": pin.id,
+        "latitude": pin.latitude,
+        "longitude": pin.longitude,
+        "created_at": pin.created_at,
+        "is_active": pin.is_active,
+        "platform": pin.get_platform_display(),
+        "url": pin.url
+    }
+    _, content_field = PLATFORM_MODELS[pin.platform]
+    if content_field:
+        serializer_data[content_field] = pin.content_id
+    return serializer_data
+
+def create_resolved_pin(lat, lon, platform, url, content_id):
+    """Create the generic Pin with its denormalized platform columns, then the platform-specific pin"""
+    with transaction.atomic():
+        pin = Pin.objects.create(
+            latitude=lat,
+            longitude=lon,
+            platform=platform,
+            url=url,
+            content_id=content_id
+        )
+        pin.create_platform_pin()
+    return pin
+
 # ----------------------------
 # API Endpoints
 # ----------------------------
 
 @api_view(['GET'])
+@renderer_classes(PIN_RENDERERS)
+@rate_limited("read")
 def pins_in_bounds(request):
-    try:
-        sw_lat = float(request.GET.get("sw_lat"))
-        sw_lng = float(request.GET.get("sw_lng"))
-        ne_lat = float(request.GET.get("ne_lat"))
-        ne_lng = float(request.GET.get("ne_lng"))
-    except (TypeError, ValueError):
+    bounds = parse_bounds(request.GET)
+    if bounds is None:
         return Response({"error": "Invalid bounds"}, status=400)
 
-    pins = Pin.objects.filter(
-        latitude__gte=sw_lat,
-        latitude__lte=ne_lat,
-        longitude__gte=sw_lng,
-        longitude__lte=ne_lng,
-        is_active=True
-    )
+    pins = pins_in_bbox(Pin.objects.filter(is_active=True), *bounds)
+
+    compact = request.accepted_renderer.format == CompactJSONRenderer.format
+
+    # With a cursor, only what changed in the box since then
+    since = request.GET.get("since")
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return Response({"error": "Invalid cursor"}, status=400)
+        return Response(pin_changes_data(bounds, since, compact))
+
+    # Without a zoom level, keep the original flat list of pins, in pages
+    # of at most PIN_BOUNDS_MAX_ROWS ordered by id (the next page is linked
+    # in the Link header), or as one even sample with sample=1
+    zoom = request.GET.get("zoom")
+    if zoom is None:
+        page = parse_page(request.GET)
+        if page is None:
+            return Response({"error": "Invalid page"}, status=400)
+        after, limit = page
+        fields = COMPACT_PIN_FIELDS if compact else PIN_VALUE_FIELDS
+        cursor = latest_change_id() if compact else None
+        stream = request.GET.get("stream") and not compact
+
+        if request.GET.get("sample"):
+            rows, next_after = sample_pins(pins, *bounds, limit).values(*fields), None
+        elif stream:
+            rows = pins.filter(id__gt=after).order_by("id").values(*fields)
+            # The id closing this page, and whether another row follows it,
+            # without reading the page itself before streaming it
+            edge = list(rows.values_list("id", flat=True)[limit - 1:limit + 1])
+            next_after = edge[0] if len(edge) == 2 else None
+            rows = rows[:limit]
+        else:
+            # One row past the page tells whether there is a next one
+            rows = list(pins.filter(id__gt=after).order_by("id").values(*fields)[:limit + 1])
+            next_after = rows[limit - 1]["id"] if len(rows) > limit else None
+            rows = rows[:limit]
+
+        if compact:
+            response = Response({"cursor": cursor, **compact_pins_data(rows)})
+        elif stream:
+            # Same body, written as the rows are read so memory stays flat
+            # however large the page
+            response = StreamingHttpResponse(
+                stream_pin_values(rows, settings.PIN_STREAM_CHUNK_SIZE),
+                content_type="application/json",
+            )
+        else:
+            response = Response([serialize_pin_values(row) for row in rows])
+
+        if next_after is not None:
+            response["Link"] = next_page_link(request, next_after)
+        return response
 
-    serializer = PinSerializer(pins, many=True)
-    return Response(serializer.data)
+    zoom = parse_zoom(zoom)
+    if zoom is None:
+        return Response({"error": "Invalid zoom"}, status=400)
+
+    return Response(zoomed_pins_data(pins, zoom, bounds, compact))
+
+@with_sync_cursor
+@condition(etag_func=tile_etag, last_modified_func=tile_last_modified)
+@api_view(['GET'])
+@renderer_classes(PIN_RENDERERS)
+@rate_limited("read")
+def pins_in_tile(request, z, x, y):
+    """
+    Pins (or clusters) inside a slippy-map tile. Tiles are fixed, so responses
+    can be cached and revalidated; the ETag changes whenever a pin in the
+    tile is created, changed or removed. Without a shared cache, the tile is
+    rendered every time and its ETag is a hash of the body.
+    """
+    if not is_valid_tile(z, x, y):
+        return Response({"error": "Invalid tile"}, status=400)
+
+    # Read the version before querying, so a concurrent change can only make
+    # the cached body newer than its key, never older
+    shared = versions_shared()
+    version = get_tile_version(z, x, y) if shared else None
+    fmt = requested_format(request)
+    body = get_cached_tile(z, x, y, version, fmt)
+    if body is None:
+        pins = pins_in_bbox(
+            Pin.objects.filter(is_active=True),
+            *tile_bounds(z, x, y)
+        )
+
+        # One tile covers several screen tiles, so cluster for the map zoom
+        data = zoomed_pins_data(
+            pins,
+            z + settings.PIN_TILE_ZOOM_OFFSET,
+            tile_bounds(z, x, y),
+            compact=fmt == CompactJSONRenderer.format,
+        )
+        body = JSONRenderer().render(data)
+        cache_tile(z, x, y, version, body, fmt)
+
+    content_type = CompactJSONRenderer.media_type if fmt == CompactJSONRenderer.format else "application/json"
+    response = HttpResponse(body, content_type=content_type)
+    patch_cache_control(response, public=True, max_age=settings.PIN_TILE_MAX_AGE)
+    patch_vary_headers(response, ["Accept"])
+    if not shared:
+        set_response_etag(response)
+        return get_conditional_response(request, etag=response["ETag"], response=response)
+    return response
 
 @api_view(['POST'])
-@ratelimit(key=get_client_ip, rate='10/m', block=False) 
+# Counted before the body is parsed or the link looked at
+@rate_limited("create_pin", "Too many posts. Please try again later.")
 def create_pin(request):
-    if getattr(request, 'limited', False):
-        return Response({"error": "Too many posts. Please try again later."}, status=429)
-    
     link = request.data.get("link")
     check_only = request.data.get("check_only", False)
 
-    if not link:
-        return Response({"error": "Link is required"}, status=400)
-    
-    # Validate URL format
-    if not validate_and_sanitize_url(link):
-        return Response({"error": "Invalid URL format"}, status=400)
-
-    link_platform = get_link_platform(link)
-    if not link_platform:
-        return Response({"error": "This platform is not allowed."}, status=400)
+    link_info, error = check_pin_link(link)
+    if error:
+        return Response({"error": error}, status=400)
+    link_platform, url, content_id = link_info
 
     if check_only:
-        platform_display = {
-            "youtube_shorts": "YouTube Shorts",
-            "tiktok": "TikTok",
-            "instagram": "Instagram",
-            "reddit": "Reddit"
-        }.get(link_platform, "Unknown")
+        platform_display = PLATFORM_NAMES.get(link_platform, "Unknown")
         return Response({"message": "Valid link", "platform": platform_display})
 
     # Get location from request
-    location_type = request.data.get("location_type", "selected")
-    
-    if location_type == "random":
-        # Generate random location (same logic as in create_secret_pin)
-        regions = [
-            {"name": "North America", "weight": 7, "min_lat": 15, "max_lat": 75, "min_lon": -170, "max_lon": -50},
-            {"name": "Europe", "weight": 6, "min_lat": 35, "max_lat": 70, "min_lon": -10, "max_lon": 40},
-            {"name": "Asia", "weight": 10, "min_lat": -10, "max_lat": 55, "min_lon": 40, "max_lon": 150},
-            {"name": "Africa", "weight": 4, "min_lat": -35, "max_lat": 35, "min_lon": -20, "max_lon": 50},
-            {"name": "South America", "weight": 3, "min_lat": -55, "max_lat": 15, "min_lon": -90, "max_lon": -35},
-            {"name": "Oceania", "weight": 2, "min_lat": -50, "max_lat": 0, "min_lon": 110, "max_lon": 180},
-        ]
-        
-        total_weight = sum(region["weight"] for region in regions)
-        r = random.uniform(0, total_weight)
-        cumulative_weight = 0
-        selected_region = None
-        
-        for region in regions:
-            cumulative_weight += region["weight"]
-            if r <= cumulative_weight:
-                selected_region = region
-                break
-        
-        lat = random.uniform(selected_region["min_lat"], selected_region["max_lat"])
-        lon = random.uniform(selected_region["min_lon"], selected_region["max_lon"])
-    else:
-        # Use provided coordinates
-        client_lat = request.data.get("latitude")
-        client_lon = request.data.get("longitude")
-        
-        if not client_lat or not client_lon:
-            return Response({"error": "Location coordinates are required"}, status=400)
-        
-        lat, lon = float(client_lat), float(client_lon)
+    location = requested_location(request.data)
+    if location is None:
+        return Response({"error": "Location coordinates are required"}, status=400)
+    lat, lon = location
 
     jitter_lat, jitter_lon = jitter_coordinate(lat, lon)
-    
-    # Create the generic Pin first
-    pin = Pin.objects.create(
-        latitude=lat,
-        longitude=lon
-    )
-    
-    # Now create the platform-specific pin
-    if link_platform == "youtube_shorts":
-        youtube_pin = YouTubePin.objects.create(pin=pin, url=link)
-        serializer_data = {
-            "id": pin.id,
-            "latitude": pin.latitude,
-            "longitude": pin.longitude,
-            "created_at": pin.created_at,
-            "is_active": pin.is_active,
-            "platform": "YouTube Shorts",
-            "url": youtube_pin.url
-        }
-        return Response(serializer_data)
-    elif link_platform == "tiktok":
-        # Resolve TikTok URL to full URL
-        resolved_url = resolve_tiktok_url(link)
-        
-        # Extract content ID (works for both videos and photos)
-        content_id = extract_tiktok_video_id(resolved_url)
-        if not content_id:
-            pin.delete()  # Clean up the pin since we couldn't create the platform-specific part
-            return Response({"error": "Could not extract TikTok content ID"}, status=400)
-        
-        # Create TikTokPin with minimal data
-        tiktok_pin = TikTokPin.objects.create(
-            pin=pin,
-            url=resolved_url,
-            video_id=content_id
-        )
-        
-        serializer_data = {
-            "id": pin.id,
-            "latitude": pin.latitude,
-            "longitude": pin.longitude,
-            "created_at": pin.created_at,
-            "is_active": pin.is_active,
-            "platform": "TikTok",
-            "url": tiktok_pin.url,
-            "video_id": tiktok_pin.video_id
-        }
-        return Response(serializer_data)
-    elif link_platform == "instagram":
-        # Clean the URL to remove query parameters
-        clean_url = clean_instagram_url(link)
-        
-        # Extract Instagram shortcode
-        shortcode = extract_instagram_shortcode(link)
-        if not shortcode:
-            pin.delete()  # Clean up the pin since we couldn't create the platform-specific part
-            return Response({"error": "Could not extract Instagram shortcode"}, status=400)
-        
-        # Create InstagramPin with the clean URL
-        instagram_pin = InstagramPin.objects.create(
-            pin=pin,
-            url=clean_url,  # Use the clean URL
-            shortcode=shortcode
-        )
-        
-        serializer_data = {
-            "id": pin.id,
-            "latitude": pin.latitude,
-            "longitude": pin.longitude,
-            "created_at": pin.created_at,
-            "is_active": pin.is_active,
-            "platform": "Instagram",
-            "url": instagram_pin.url,
-            "shortcode": instagram_pin.shortcode
-        }
-        return Response(serializer_data)
-    elif link_platform == "reddit":
-        # Store the original URL for comparison
-        original_url = link
-        
-        # Check if it's a short URL and try to resolve it
-        if '/s/' in link:
-            resolved_url = resolve_reddit_url(link)
-            
-            # Check if resolution was successful
-            if resolved_url == link:
-                # Resolution failed - URL is still the same
-                pin.delete()
-                return Response({
-                    "error": "Could not resolve shortened Reddit URL. Please use the full URL."
-                }, status=400)
-            
-            # Resolution successful - use the resolved URL
-            link = resolved_url
-        else:
-            # It's already a full URL
-            resolved_url = link
-        
-        # Extract post ID from Reddit URL
-        match = re.search(r'reddit\.com/r/[^/]+/comments/([^/?]+)', resolved_url)
-        post_id = match.group(1) if match else None
-        
-        # If we couldn't extract from the resolved URL, try the original URL
-        if not post_id and '/s/' in original_url:
-            match = re.search(r'reddit\.com/r/[^/]+/s/([^/?]+)', original_url)
-            post_id = match.group(1) if match else None
-        
-        if not post_id:
-            pin.delete()  # Clean up the pin since we couldn't extract the post ID
-            return Response({"error": "Could not extract Reddit post ID"}, status=400)
-        
-        # Create RedditPin with the resolved URL
-        reddit_pin = RedditPin.objects.create(
-            pin=pin,
-            url=resolved_url,
-            post_id=post_id
+
+    # Links that need an outbound request (short links) are accepted straight
+    # away as pending pins and resolved in the background, so a slow upstream
+    # never holds this worker
+    if url is None:
+        pin = Pin.objects.create(
+            latitude=lat,
+            longitude=lon,
+            platform=link_platform,
+            url=link,
+            status=PinStatus.PENDING,
+            is_active=False
         )
-        
-        serializer_data = {
-            "id": pin.id,
-            "latitude": pin.latitude,
-            "longitude": pin.longitude,
-            "created_at": pin.created_at,
-            "is_active": pin.is_active,
-            "platform": "Reddit",
-            "url": reddit_pin.url,
-            "post_id": reddit_pin.post_id
-        }
-        return Response(serializer_data)
-    
-    # If we get here, the platform wasn't handled
-    pin.delete()  # Clean up the pin since we couldn't create the platform-specific part
-    return Response({"error": "Platform not supported yet"}, status=400)
+        enqueue_pin(pin.id)
+        return Response(pending_pin_data(pin), status=202)
+
+    pin = create_resolved_pin(lat, lon, link_platform, url, content_id)
+    return Response(created_pin_data(pin))
 
 
 @api_view(['GET'])
+@rate_limited("read")
 def random_pin(request):
-    # Get a random active pin
-    pin = Pin.objects.filter(is_active=True).order_by('?').first()
-    if not pin:
+    # Get a random active pin, rendered from the Pin row alone
+    row = Pin.objects.filter(is_active=True).values(*PIN_VALUE_FIELDS).random()
+    if not row:
         return Response({"error": "No pins available"}, status=404)
     
-    serializer = PinSerializer(pin)
-    return Response(serializer.data)
+    return Response(serialize_pin_values(row))
+
+@api_view(['GET'])
+def pin_status(request, pin_id):
+    """Poll a newly created pin until its link has been resolved"""
+    pin = Pin.objects.with_platform().filter(id=pin_id).first()
+    if pin is None or (pin.status == PinStatus.READY and not pin.is_active):
+        return Response({"error": "Pin not found"}, status=404)
+
+    data = {"id": pin.id, "status": pin.status}
+    if pin.status == PinStatus.FAILED:
+        data["error"] = pin.resolution_error
+    elif pin.status == PinStatus.READY:
+        data["pin"] = PinSerializer(pin).data
+    return Response(data)
 
 @api_view(['GET'])
+@rate_limited("read")
 def get_pin_by_id(request, pin_id):
-    try:
-        pin = Pin.objects.get(id=pin_id, is_active=True)
-        serializer = PinSerializer(pin)
-        return Response(serializer.data)
-    except Pin.DoesNotExist:
+    row = Pin.objects.filter(id=pin_id, is_active=True).values(*PIN_VALUE_FIELDS).first()
+    if row is None:
         return Response({"error": "Pin not found"}, status=404)
+    return Response(serialize_pin_values(row))
+
+@staff_member_required
+def metrics_view(request):
+    """Request metrics of this worker process, for Prometheus to scrape"""
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 # ----------------------------
 # Template View
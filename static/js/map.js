@@ -18,11 +18,18 @@ let isOpeningPopup = false;
 // ===== MAP AND MARKER VARIABLES =====
 let map = null;
 let markers = null;
+let clusterLayer = null; // Server-side clusters shown below MIN_ZOOM_LEVEL_FOR_PINS
 let csrftoken = null;
 
 // ===== ZOOM LEVEL CONTROL =====
 const MIN_ZOOM_LEVEL_FOR_PINS = 6; // Minimum zoom level to load pins
+const TILE_ZOOM_OFFSET = 2; // Pin tiles are fetched this many levels above the map zoom (PIN_TILE_ZOOM_OFFSET)
 let zoomLevelIndicator = null; // Will hold the indicator element
+let pinLoadGeneration = 0; // Bumped by every loadPins(); older responses are dropped
+
+// ===== PIN STORE =====
+const pinStore = new Map(); // Every pin loaded so far, by id
+const syncedTiles = new Map(); // Pin tiles ("z/x/y") already in pinStore -> delta sync cursor
 
 // ===== UTILITY FUNCTIONS =====
 function getCookie(name) {
@@ -120,6 +127,10 @@ function initializeMap() {
         zoomToBoundsOnClick: true
     });
     map.addLayer(markers);
+
+    // Layer holding the server-side clusters used when zoomed out
+    clusterLayer = L.layerGroup();
+    map.addLayer(clusterLayer);
     
     // Set up event listeners
     setupMapEventListeners();
@@ -127,8 +138,9 @@ function initializeMap() {
     // Initialize zoom level indicator
     initializeZoomLevelIndicator();
     
-    // Check initial zoom level
+    // Check initial zoom level and load the first view
     updateZoomLevelIndicator();
+    loadPins();
     
     // Check for pin parameter in URL
     const pinId = getQueryParam('pin');
@@ -178,69 +190,7 @@ function handlePopupOpen(e) {
     setTimeout(() => {
         const popupElement = e.popup.getElement();
         if (popupElement) {
-
-            // Look for TikTok embeds inside the popup
-            const tiktokEmbeds = popupElement.querySelectorAll('.tiktok-embed');
-            if (tiktokEmbeds.length > 0) {
-                // If TikTok script has already loaded, force it to re-render
-                if (window.tiktokEmbed && typeof window.tiktokEmbed.render === 'function') {
-                    window.tiktokEmbed.render();
-                } else {
-                    // If not yet loaded, load it now
-                    const script = document.createElement('script');
-                    script.src = "https://www.tiktok.com/embed.js";
-                    script.async = true;
-                    script.onload = function() {
-                        if (window.tiktokEmbed && typeof window.tiktokEmbed.render === 'function') {
-                            window.tiktokEmbed.render();
-                        }
-                    };
-                    document.body.appendChild(script);
-                }
-            }
-            
-            // Look for Instagram embeds inside the popup
-            const instagramEmbeds = popupElement.querySelectorAll('.instagram-media');
-            if (instagramEmbeds.length > 0) {
-                // If Instagram script has already loaded, force it to re-render
-                if (window.instgrm && typeof window.instgrm.Embeds.process === 'function') {
-                    window.instgrm.Embeds.process();
-                } else {
-                    // If not yet loaded, load it now
-                    const script = document.createElement('script');
-                    script.src = "https://www.instagram.com/embed.js";
-                    script.async = true;
-                    script.onload = function() {
-                        if (window.instgrm && typeof window.instgrm.Embeds.process === 'function') {
-                            window.instgrm.Embeds.process();
-                        }
-                    };
-                    document.body.appendChild(script);
-                }
-            }
-
-            // Look for Reddit embeds inside the popup
-            const redditEmbeds = popupElement.querySelectorAll('.reddit-card');
-            if (redditEmbeds.length > 0) {
-                // Check if Reddit embed script is already loaded
-                if (window.redditEmbed) {
-                    // If already loaded, process the embeds
-                    window.redditEmbed.render();
-                } else {
-                    // Load the Reddit embed script
-                    const script = document.createElement('script');
-                    script.src = "https://embed.redditmedia.com/widgets/platform.js";
-                    script.async = true;
-                    script.charset = "UTF-8";
-                    script.onload = function() {
-                        // After script loads, process the embeds
-                        if (window.redditEmbed && typeof window.redditEmbed.render === 'function') {
-                            window.redditEmbed.render();
-                        }
-                    };
-                    document.head.appendChild(script);
-                }
-            }
+            renderPopupEmbeds(popupElement);
         }
     }, 300);
 
@@ -258,6 +208,71 @@ function handlePopupOpen(e) {
     }, 10);
 }
 
+function renderPopupEmbeds(popupElement) {
+    // Look for TikTok embeds inside the popup
+    const tiktokEmbeds = popupElement.querySelectorAll('.tiktok-embed');
+    if (tiktokEmbeds.length > 0) {
+        // If TikTok script has already loaded, force it to re-render
+        if (window.tiktokEmbed && typeof window.tiktokEmbed.render === 'function') {
+            window.tiktokEmbed.render();
+        } else {
+            // If not yet loaded, load it now
+            const script = document.createElement('script');
+            script.src = "https://www.tiktok.com/embed.js";
+            script.async = true;
+            script.onload = function() {
+                if (window.tiktokEmbed && typeof window.tiktokEmbed.render === 'function') {
+                    window.tiktokEmbed.render();
+                }
+            };
+            document.body.appendChild(script);
+        }
+    }
+    
+    // Look for Instagram embeds inside the popup
+    const instagramEmbeds = popupElement.querySelectorAll('.instagram-media');
+    if (instagramEmbeds.length > 0) {
+        // If Instagram script has already loaded, force it to re-render
+        if (window.instgrm && typeof window.instgrm.Embeds.process === 'function') {
+            window.instgrm.Embeds.process();
+        } else {
+            // If not yet loaded, load it now
+            const script = document.createElement('script');
+            script.src = "https://www.instagram.com/embed.js";
+            script.async = true;
+            script.onload = function() {
+                if (window.instgrm && typeof window.instgrm.Embeds.process === 'function') {
+                    window.instgrm.Embeds.process();
+                }
+            };
+            document.body.appendChild(script);
+        }
+    }
+
+    // Look for Reddit embeds inside the popup
+    const redditEmbeds = popupElement.querySelectorAll('.reddit-card');
+    if (redditEmbeds.length > 0) {
+        // Check if Reddit embed script is already loaded
+        if (window.redditEmbed) {
+            // If already loaded, process the embeds
+            window.redditEmbed.render();
+        } else {
+            // Load the Reddit embed script
+            const script = document.createElement('script');
+            script.src = "https://embed.redditmedia.com/widgets/platform.js";
+            script.async = true;
+            script.charset = "UTF-8";
+            script.onload = function() {
+                // After script loads, process the embeds
+                if (window.redditEmbed && typeof window.redditEmbed.render === 'function') {
+                    window.redditEmbed.render();
+                }
+            };
+            document.head.appendChild(script);
+        }
+    }
+}
+
 function handlePopupClose(e) {
     if (currentPopup === e.popup) {
         currentPopup = null;
@@ -327,10 +342,9 @@ function handleMapMoveEnd() {
     // Update zoom level indicator
     updateZoomLevelIndicator();
     
-    // Only load pins if zoom level is sufficient
-    if (map.getZoom() >= MIN_ZOOM_LEVEL_FOR_PINS) {
-        loadPins();
-    }
+    // The only place pins follow the view: every zoom ends with a moveend.
+    // Clusters when zoomed out, pins otherwise
+    loadPins();
 }
 function handleMapClick(e) {
     // If we just closed a popup, don't open the modal
@@ -357,6 +371,20 @@ function handleMapClick(e) {
 function createMarkerWithPin(pin) {
     let marker = L.marker([pin.latitude, pin.longitude]);
     
+    // Compact tiles only carry what the marker needs; the popup content is
+    // fetched the first time it opens
+    if (pin.partial) {
+        marker.pinData = pin;
+        marker.bindPopup(createPopupPlaceholder(), {
+            maxWidth: 350,
+            className: 'custom-popup-container',
+            autoClose: false,
+            closeButton: false
+        });
+        marker.on('popupopen', () => loadPinDetails(marker));
+        return marker;
+    }
+
     // Ensure pin data has the correct structure
     const pinData = {
         ...pin,
@@ -376,6 +404,74 @@ function createMarkerWithPin(pin) {
     return marker;
 }
 
+function loadPinDetails(marker) {
+    if (!marker.pinData.partial || marker.isLoadingDetails) {
+        return;
+    }
+    marker.isLoadingDetails = true;
+
+    fetch(`/api/pins/${marker.pinData.id}/`)
+        .then(res => res.json())
+        .then(pin => {
+            if (pin.error) {
+                throw new Error(pin.error);
+            }
+            marker.pinData = pin;
+            pinStore.set(pin.id, pin); // Rebuilt markers reuse the details
+            marker.setPopupContent(createPopupContent(pin));
+
+            const popupElement = marker.getPopup().getElement();
+            if (popupElement && marker.isPopupOpen()) {
+                renderPopupEmbeds(popupElement);
+            }
+        })
+        .catch(error => {
+            console.error("Error loading pin:", error);
+            marker.closePopup();
+            showToast("❌ Could not load this pin", "error");
+        })
+        .finally(() => {
+            marker.isLoadingDetails = false;
+        });
+}
+
+function createPopupPlaceholder() {
+    return `
+        <div class="custom-popup">
+            <div class="popup-content">
+                <div class="popup-link"><i class="fas fa-spinner fa-spin"></i></div>
+            </div>
+            <div class="popup-actions">
+            </div>
+        </div>
+    `;
+}
+
+function createClusterMarker(cluster) {
+    // Size classes match the Leaflet.MarkerCluster default styling
+    let sizeClass = 'marker-cluster-small';
+    if (cluster.count >= 100) {
+        sizeClass = 'marker-cluster-large';
+    } else if (cluster.count >= 10) {
+        sizeClass = 'marker-cluster-medium';
+    }
+
+    const marker = L.marker([cluster.latitude, cluster.longitude], {
+        icon: L.divIcon({
+            html: `<div><span>${cluster.count}</span></div>`,
+            className: `marker-cluster ${sizeClass}`,
+            iconSize: L.point(40, 40)
+        })
+    });
+
+    // Zoom towards the cluster so it splits into smaller clusters or pins
+    marker.on('click', () => {
+        const targetZoom = Math.min(map.getZoom() + 2, MIN_ZOOM_LEVEL_FOR_PINS);
+        map.setView([cluster.latitude, cluster.longitude], targetZoom);
+    });
+    return marker;
+}
+
 function createPopupContent(pin) {
     // Determine platform classes
     let platformClass = 'default';
@@ -596,17 +692,116 @@ function zoomToPin(pinId, maxZoom = 18) {
     });
 }
 
+function visiblePinTiles() {
+    // Tile coordinates ("z/x/y") covering the current view
+    const tileZoom = Math.max(0, Math.round(map.getZoom()) - TILE_ZOOM_OFFSET);
+    const n = 2 ** tileZoom;
+    const bounds = map.getBounds();
+
+    const clampTile = value => Math.min(n - 1, Math.max(0, Math.floor(value)));
+    const tileX = lng => clampTile((lng + 180) / 360 * n);
+    const tileY = lat => {
+        const rad = Math.max(-85.0511, Math.min(85.0511, lat)) * Math.PI / 180;
+        return clampTile((1 - Math.asinh(Math.tan(rad)) / Math.PI) / 2 * n);
+    };
+
+    const tiles = [];
+    for (let x = tileX(bounds.getWest()); x <= tileX(bounds.getEast()); x++) {
+        for (let y = tileY(bounds.getNorth()); y <= tileY(bounds.getSouth()); y++) {
+            tiles.push(`${tileZoom}/${x}/${y}`);
+        }
+    }
+    return tiles;
+}
+
+function tileBounds(tile) {
+    // Inverse of visiblePinTiles for one "z/x/y" tile
+    const [z, x, y] = tile.split('/').map(Number);
+    const n = 2 ** z;
+    const tileLat = y => Math.atan(Math.sinh(Math.PI * (1 - 2 * y / n))) * 180 / Math.PI;
+    return L.latLngBounds([tileLat(y + 1), x / n * 360 - 180], [tileLat(y), (x + 1) / n * 360 - 180]);
+}
+
+function tilesBounds(tiles) {
+    const bounds = tileBounds(tiles[0]);
+    tiles.forEach(tile => bounds.extend(tileBounds(tile)));
+    return bounds;
+}
+
+function decodeCompactPins(body) {
+    // Expand compact pin columns (ids as deltas, coordinates scaled to
+    // integers, platforms as codes) into pin objects
+    const scale = body.scale;
+    let id = 0;
+    return body.pins.id.map((delta, i) => {
+        id += delta;
+        return {
+            id: id,
+            latitude: body.pins.lat[i] / scale,
+            longitude: body.pins.lng[i] / scale,
+            platform: body.platforms[body.pins.platform[i]],
+            partial: true
+        };
+    });
+}
+
+function decodeCompactTile(tile, cursor) {
+    const scale = tile.scale;
+    const pins = decodeCompactPins(tile);
+    const clusters = tile.clusters.count.map((count, i) => ({
+        latitude: tile.clusters.lat[i] / scale,
+        longitude: tile.clusters.lng[i] / scale,
+        count: count
+    }));
+    return {
+        cursor: Number(cursor),
+        clustered: tile.clustered,
+        zoom: tile.zoom,
+        clusters: clusters,
+        pins: pins
+    };
+}
+
+function syncPinTiles(tiles) {
+    // Fetch only what changed in tiles that are already in the store, with
+    // one request for all of them. Resolves to false if the server can no
+    // longer tell, and the tiles have to be loaded again.
+    const since = Math.min(...tiles.map(tile => syncedTiles.get(tile)));
+    const bounds = tilesBounds(tiles);
+    const params = new URLSearchParams({
+        sw_lat: bounds.getSouth(),
+        sw_lng: bounds.getWest(),
+        ne_lat: bounds.getNorth(),
+        ne_lng: bounds.getEast(),
+        since: since,
+        format: 'compact'
+    });
+
+    return fetch(`/api/pins/in_bounds/?${params}`)
+        .then(res => res.json())
+        .then(delta => {
+            if (delta.reset) {
+                tiles.forEach(tile => syncedTiles.delete(tile));
+                pinStore.forEach((pin, id) => {
+                    if (bounds.contains([pin.latitude, pin.longitude])) {
+                        pinStore.delete(id);
+                    }
+                });
+                return false;
+            }
+            decodeCompactPins(delta).forEach(pin => pinStore.set(pin.id, pin));
+            delta.removed.forEach(id => pinStore.delete(id));
+            tiles.forEach(tile => syncedTiles.set(tile, delta.cursor));
+            return true;
+        });
+}
+
 function loadPins() {
     // Check if map is initialized
     if (!map || !markers) {
         console.error("Map or markers not initialized");
         return;
     }
-    
-    // Check if zoom level is sufficient
-    if (map.getZoom() < MIN_ZOOM_LEVEL_FOR_PINS) {
-        return; // Don't load pins if zoom level is too low
-    }
 
     // Check if there's an open popup and remember its pin data
     let openPopupPin = null;
@@ -617,15 +812,61 @@ function loadPins() {
         }
     }
 
-    let bounds = map.getBounds();
-    let sw = bounds.getSouthWest();
-    let ne = bounds.getNorthEast();
+    // Tiles seen before only need a delta; new tiles are fetched whole.
+    // Fixed tiles give identical URLs across pans, so the browser can
+    // revalidate them with ETags instead of downloading them again
+    const tiles = visiblePinTiles();
+    const knownTiles = tiles.filter(tile => syncedTiles.has(tile));
+    const requests = tiles.filter(tile => !syncedTiles.has(tile)).map(tile =>
+        fetch(`/api/pins/tiles/${tile}/?format=compact`)
+            // The cursor comes in a header: a cached tile body may be older
+            .then(res => res.json().then(body => decodeCompactTile(body, res.headers.get('X-Pin-Cursor'))))
+            .then(data => ({ tile, data }))
+    );
+    const synced = knownTiles.length ? syncPinTiles(knownTiles) : Promise.resolve(true);
+    const generation = ++pinLoadGeneration;
+
+    Promise.all([synced, ...requests])
+        .then(([inSync, ...loaded]) => {
+            // A later load owns the map now; drawing this one would show a
+            // viewport that is no longer current
+            if (generation !== pinLoadGeneration) {
+                return;
+            }
+            if (!inSync) {
+                // The change log no longer covers these tiles: load them again
+                loadPins();
+                return;
+            }
 
-    fetch(`/api/pins/in_bounds/?sw_lat=${sw.lat}&sw_lng=${sw.lng}&ne_lat=${ne.lat}&ne_lng=${ne.lng}`)
-        .then(res => res.json())
-        .then(pins => {
-            // Clear existing markers
+            // Clear existing markers and clusters
             markers.clearLayers();
+            clusterLayer.clearLayers();
+
+            // Zoomed out: the server already aggregated pins into clusters,
+            // and sends the pins alone in their cell as they are
+            if (loaded.some(({ data }) => data.clustered)) {
+                loaded.forEach(({ data }) => {
+                    data.clusters.forEach(cluster => {
+                        clusterLayer.addLayer(createClusterMarker(cluster));
+                    });
+                    data.pins.forEach(pin => {
+                        markers.addLayer(createMarkerWithPin(pin));
+                    });
+                });
+                return;
+            }
+
+            loaded.forEach(({ tile, data }) => {
+                data.pins.forEach(pin => pinStore.set(pin.id, pin));
+                syncedTiles.set(tile, data.cursor);
+            });
+
+            // Pins on a tile edge can come from two tiles; the store keeps one
+            const visible = tilesBounds(tiles);
+            const pins = Array.from(pinStore.values()).filter(pin =>
+                visible.contains([pin.latitude, pin.longitude])
+            );
             
             // Add new markers to the cluster group
             pins.forEach(pin => {
@@ -655,6 +896,29 @@ function loadPins() {
         });
 }
 
+function waitForPinResolution(pinId, attempt = 0) {
+    // Poll a pending pin until its link has been resolved
+    if (attempt >= 20) {
+        return;
+    }
+
+    setTimeout(() => {
+        fetch(`/api/pins/${pinId}/status/`)
+            .then(res => res.json())
+            .then(data => {
+                if (data.status === "ready") {
+                    showToast("✅ Pin posted successfully!");
+                    loadPins();
+                } else if (data.status === "failed") {
+                    showToast(`❌ ${data.error || "Could not resolve link"}`, "error");
+                } else {
+                    waitForPinResolution(pinId, attempt + 1);
+                }
+            })
+            .catch(() => waitForPinResolution(pinId, attempt + 1));
+    }, 1500);
+}
+
 // ===== MODAL FUNCTIONS =====
 function initializeModal() {
     // Initialize Bootstrap modal
@@ -768,7 +1032,13 @@ async function handleFormSubmit(e) {
     .then(res => res.json())
     .then(data => {
         if (data.latitude && data.longitude) {
-            showToast("✅ Pin posted successfully!");
+            if (data.status === "pending") {
+                // Short links are resolved in the background; the pin shows up once ready
+                showToast("⏳ Pin posted! Fetching the link...");
+                waitForPinResolution(data.id);
+            } else {
+                showToast("✅ Pin posted successfully!");
+            }
             if (pinModal) {
                 pinModal.hide();
             }
@@ -894,6 +1164,9 @@ function handleRandomPinClick() {
     if (markers) {
         markers.clearLayers();
     }
+    if (clusterLayer) {
+        clusterLayer.clearLayers();
+    }
 
     // Hide the search bar when loading random pin
     const searchContainer = document.querySelector('.search-container');
@@ -1267,15 +1540,9 @@ function updateZoomLevelIndicator() {
         // Update progress bar
         const progressBar = zoomLevelIndicator.querySelector('.zoom-progress-bar');
         progressBar.style.width = `${Math.min(100, Math.max(0, progress))}%`;
-        
-        // Clear existing markers if zoom level is too low
-        if (markers) {
-            markers.clearLayers();
-        }
     } else {
-        // Hide indicator and load pins
+        // Hide indicator; pins (or clusters) are loaded on moveend
         zoomLevelIndicator.classList.add('hidden');
-        loadPins();
     }
 }
 